@@ -0,0 +1,221 @@
+"""
+Check of the cross-instance cache invalidation against the Firestore emulator. A repo with a read-through cache
+and a snapshot listener stands in for one instance, and direct writes to Firestore stand in for another instance.
+
+Start the emulator, then run from the repository root:
+
+    gcloud emulators firestore start --host-port=[::1]:8587
+    FIRESTORE_EMULATOR_HOST=[::1]:8587 python -m benchmark.cache_invalidation_check
+
+With --firestore memory, the checks run against the listeners of the in-memory fake instead, which covers
+the invalidation logic but not the delivery guarantees of real Firestore watches.
+
+Each check runs on a fresh collection. Fails with exit code 1 if any cached document is served stale
+after the listener had time to deliver the change.
+"""
+import argparse
+import sys
+import time
+import uuid
+from typing import Callable
+
+from werkzeug.exceptions import NotFound
+
+from benchmark.harness import BenchmarkOptions, FIRESTORE_EMULATOR, FIRESTORE_MEMORY, boot
+
+_ORG_ID = 'cache-check-org'
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Check the cache invalidation listeners against the emulator.')
+    parser.add_argument('--firestore', choices=(FIRESTORE_EMULATOR, FIRESTORE_MEMORY), default=FIRESTORE_EMULATOR,
+                        help='The Firestore to check against')
+    parser.add_argument('--timeout-seconds', type=float, default=10,
+                        help='Maximum time for a change to reach the listener')
+    args = parser.parse_args(argv)
+
+    boot(BenchmarkOptions(firestore=args.firestore, firestore_latency_seconds=0, install_vertex_ai=False))
+
+    checks = {
+        'initial snapshot clears entries cached before it': _check_initial_snapshot,
+        'modified documents are evicted': _check_modified,
+        'removed documents are evicted': _check_removed,
+        'resubscribing clears entries and the long TTL until the new initial snapshot': _check_resubscribe,
+        'reads in flight during an invalidation are not cached': _check_read_in_flight
+    }
+
+    failures = []
+    for name, check in checks.items():
+        error = check(args.timeout_seconds)
+        print(f'{"FAIL" if error else "ok":<5} {name}{f": {error}" if error else ""}')
+        if error:
+            failures.append(name)
+
+    return 1 if failures else 0
+
+
+def _check_initial_snapshot(timeout_seconds: float) -> str | None:
+    from shared.globals.constants import REPO_CACHE_LISTENED_TTL_SECONDS
+
+    repo, ctx = _new_repo()
+    doc_id = _write(repo, 'v1')
+    repo.get(ctx, doc_id)
+
+    # Changed by another instance before this instance's listener is current. The change arrives as ADDED.
+    _subscribe(repo)
+    _write(repo, 'v2', doc_id)
+    try:
+        if not _wait_for(lambda: repo.cache.ttl_seconds == REPO_CACHE_LISTENED_TTL_SECONDS, timeout_seconds):
+            return 'the TTL was not raised after the initial snapshot'
+
+        return _expect_context(repo, ctx, doc_id, 'v2', timeout_seconds)
+    finally:
+        _unsubscribe(repo)
+
+
+def _check_modified(timeout_seconds: float) -> str | None:
+    repo, ctx = _new_repo()
+    doc_id = _write(repo, 'v1')
+    _subscribe(repo)
+    try:
+        _wait_for_listener(repo, timeout_seconds)
+        repo.get(ctx, doc_id)
+        _write(repo, 'v2', doc_id)
+        return _expect_context(repo, ctx, doc_id, 'v2', timeout_seconds)
+    finally:
+        _unsubscribe(repo)
+
+
+def _check_removed(timeout_seconds: float) -> str | None:
+    repo, ctx = _new_repo()
+    doc_id = _write(repo, 'v1')
+    _subscribe(repo)
+    try:
+        _wait_for_listener(repo, timeout_seconds)
+        repo.get(ctx, doc_id)
+        repo.collection_ref.document(doc_id).delete()
+
+        def evicted() -> bool:
+            try:
+                repo.get(ctx, doc_id)
+                return False
+            except NotFound:
+                return True
+
+        return None if _wait_for(evicted, timeout_seconds) else 'the removed document is still served'
+    finally:
+        _unsubscribe(repo)
+
+
+def _check_resubscribe(timeout_seconds: float) -> str | None:
+    from repository import cache_invalidation
+    from shared.globals.constants import REPO_CACHE_TTL_SECONDS
+
+    repo, ctx = _new_repo()
+    doc_id = _write(repo, 'v1')
+    _subscribe(repo)
+    try:
+        _wait_for_listener(repo, timeout_seconds)
+        repo.get(ctx, doc_id)
+
+        # What the monitor does when a listener stops streaming, with a change made while no listener was active.
+        with cache_invalidation._watches_lock:
+            _, watch = cache_invalidation._watches.pop(repo.cache.name)
+        cache_invalidation._unsubscribe(repo, watch)
+        if repo.cache.ttl_seconds != REPO_CACHE_TTL_SECONDS or repo.cache.get(doc_id) is not None:
+            return 'the cache kept its entries or its long TTL without a listener'
+
+        _write(repo, 'v2', doc_id)
+        cache_invalidation._subscribe(repo)
+
+        _wait_for_listener(repo, timeout_seconds)
+        return _expect_context(repo, ctx, doc_id, 'v2', timeout_seconds)
+    finally:
+        _unsubscribe(repo)
+
+
+def _check_read_in_flight(timeout_seconds: float) -> str | None:
+    repo, ctx = _new_repo()
+    doc_id = _write(repo, 'v1')
+    _subscribe(repo)
+    try:
+        _wait_for_listener(repo, timeout_seconds)
+
+        # A cache miss whose read returned the document just before another instance changed it,
+        # put once the listener evicted the change, as GenericRepo._get_doc_snap does.
+        generation = repo.cache.generation()
+        stale_snap = repo.collection_ref.document(doc_id).get()
+        _write(repo, 'v2', doc_id)
+        if not _wait_for(lambda: repo.cache.generation() > generation, timeout_seconds):
+            return 'the listener did not deliver the change'
+
+        repo.cache.put(doc_id, stale_snap, generation)
+        return _expect_context(repo, ctx, doc_id, 'v2', timeout_seconds)
+    finally:
+        _unsubscribe(repo)
+
+
+def _new_repo():
+    from repository.base_repo import GenericRepo
+    from repository.firestore import db
+    from shared.caching import LRUTTLCache
+    from shared.globals.constants import REPO_CACHE_MAX_SIZE, REPO_CACHE_TTL_SECONDS
+    from shared.globals.enums import AccessLevels
+    from shared.models.dto.chatbot_dto import ChatbotDTOFactory
+    from shared.models.security.user_context import UserContext
+
+    name = f'cache_check_{uuid.uuid4().hex[:8]}'
+    repo = GenericRepo('Chatbot', db.collection(name), ChatbotDTOFactory,
+                       cache=LRUTTLCache(name, REPO_CACHE_MAX_SIZE, REPO_CACHE_TTL_SECONDS))
+    return repo, UserContext(user_id='cache-check-user', org_id=_ORG_ID, access_level=AccessLevels.ADMIN)
+
+
+def _write(repo, context: str, doc_id: str | None = None) -> str:
+    """Write a chatbot directly to Firestore, like another instance would."""
+    doc_ref = repo.collection_ref.document(doc_id) if doc_id else repo.collection_ref.document()
+    doc_ref.set({'org_id': _ORG_ID, 'context': context, 'temperament': 'TAME'})
+    return doc_ref.id
+
+
+def _subscribe(repo) -> None:
+    from repository.cache_invalidation import start_cache_invalidation_listeners
+
+    start_cache_invalidation_listeners([repo])
+
+
+def _unsubscribe(repo) -> None:
+    from repository import cache_invalidation
+
+    with cache_invalidation._watches_lock:
+        repo_watch = cache_invalidation._watches.pop(repo.cache.name, None)
+    if repo_watch is not None:
+        cache_invalidation._unsubscribe(*repo_watch)
+
+
+def _wait_for_listener(repo, timeout_seconds: float) -> None:
+    from shared.globals.constants import REPO_CACHE_LISTENED_TTL_SECONDS
+
+    if not _wait_for(lambda: repo.cache.ttl_seconds == REPO_CACHE_LISTENED_TTL_SECONDS, timeout_seconds):
+        raise RuntimeError(f'The listener of {repo.cache.name} did not deliver its initial snapshot')
+
+
+def _expect_context(repo, ctx, doc_id: str, context: str, timeout_seconds: float) -> str | None:
+    if _wait_for(lambda: repo.get(ctx, doc_id).context == context, timeout_seconds):
+        return None
+
+    return f"still served '{repo.get(ctx, doc_id).context}' instead of '{context}'"
+
+
+def _wait_for(condition: Callable[[], bool], timeout_seconds: float) -> bool:
+    deadline = time.monotonic() + timeout_seconds
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+
+        time.sleep(0.05)
+
+    return False
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,397 @@
+import copy
+import operator
+import queue
+import random
+import string
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterable, Iterator
+
+from google.api_core.exceptions import Conflict, FailedPrecondition, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.watch import ChangeType
+
+_AUTO_ID_CHARS = string.ascii_letters + string.digits
+_COMPARISONS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+
+class FakeFirestoreClient(object):
+    """
+    In-memory stand-in for the Firestore client, covering the calls made by the repositories:
+    document reads and writes, batched reads and writes, field filter queries with ordering and limits,
+    increments, server timestamps, last update time preconditions and collection snapshot listeners.
+    Every RPC sleeps for a fixed latency, so benchmarks see the number of round trips the code makes.
+
+    :param latency_seconds: The latency added to every RPC.
+    """
+
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.rpc_count = 0
+        self._documents: dict[str, dict[str, tuple[dict[str, Any], datetime]]] = {}
+        self._watches: list['FakeWatch'] = []
+        self._lock = threading.Lock()
+
+    def collection(self, collection_id: str) -> 'FakeCollectionReference':
+        return FakeCollectionReference(self, collection_id)
+
+    def batch(self) -> 'FakeWriteBatch':
+        return FakeWriteBatch(self)
+
+    @staticmethod
+    def write_option(last_update_time: datetime) -> 'FakeLastUpdateOption':
+        return FakeLastUpdateOption(last_update_time)
+
+    def get_all(self, references: Iterable['FakeDocumentReference'],
+                field_paths: list[str] | None = None, **_kwargs) -> Iterator['FakeDocumentSnapshot']:
+        references = list(references)
+        self._rpc()
+        with self._lock:
+            snaps = [reference.snapshot(field_paths) for reference in references]
+
+        yield from snaps
+
+    def document_count(self, collection_id: str) -> int:
+        with self._lock:
+            return len(self._documents.get(collection_id, {}))
+
+    def _rpc(self) -> None:
+        with self._lock:
+            self.rpc_count += 1
+
+        if self.latency_seconds > 0:
+            time.sleep(self.latency_seconds)
+
+    def _collection_documents(self, collection_id: str) -> dict[str, tuple[dict[str, Any], datetime]]:
+        return self._documents.setdefault(collection_id, {})
+
+    def _notify(self, collection_id: str, change: 'FakeDocumentChange') -> None:
+        """
+        Queue a document change for the listeners of its collection. The caller holds the client lock.
+        """
+        for watch in self._watches:
+            if watch.collection_id == collection_id:
+                watch._enqueue([change])
+
+
+class FakeCollectionReference(object):
+    def __init__(self, client: FakeFirestoreClient, collection_id: str):
+        self._client = client
+        self.id = collection_id
+
+    def document(self, document_id: str | None = None) -> 'FakeDocumentReference':
+        if document_id is None:
+            document_id = ''.join(random.choices(_AUTO_ID_CHARS, k=20))
+
+        return FakeDocumentReference(self._client, self.id, document_id)
+
+    def add(self, document_data: dict[str, Any]) -> tuple[datetime, 'FakeDocumentReference']:
+        reference = self.document()
+        reference.create(document_data)
+        return _now(), reference
+
+    def where(self, field_path: str | None = None, op_string: str | None = None, value: Any = None,
+              *, filter: FieldFilter | None = None) -> 'FakeQuery':
+        return FakeQuery(self._client, self.id).where(field_path, op_string, value, filter=filter)
+
+    def order_by(self, field_path: str, direction: str = 'ASCENDING') -> 'FakeQuery':
+        return FakeQuery(self._client, self.id).order_by(field_path, direction)
+
+    def limit(self, count: int) -> 'FakeQuery':
+        return FakeQuery(self._client, self.id).limit(count)
+
+    def get(self, **_kwargs) -> list['FakeDocumentSnapshot']:
+        return FakeQuery(self._client, self.id).get()
+
+    def stream(self, **_kwargs) -> Iterator['FakeDocumentSnapshot']:
+        return iter(self.get())
+
+    def on_snapshot(self, callback: Callable[[list, list, datetime], None]) -> 'FakeWatch':
+        return FakeWatch(self._client, self.id, callback)
+
+
+class FakeQuery(object):
+    def __init__(self,
+                 client: FakeFirestoreClient,
+                 collection_id: str,
+                 filters: tuple[FieldFilter, ...] = (),
+                 orders: tuple[tuple[str, str], ...] = (),
+                 limit: int | None = None):
+        self._client = client
+        self._collection_id = collection_id
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+
+    def where(self, field_path: str | None = None, op_string: str | None = None, value: Any = None,
+              *, filter: FieldFilter | None = None) -> 'FakeQuery':
+        field_filter = filter if filter is not None else FieldFilter(field_path, op_string, value)
+        return FakeQuery(self._client, self._collection_id, self._filters + (field_filter,), self._orders, self._limit)
+
+    def order_by(self, field_path: str, direction: str = 'ASCENDING') -> 'FakeQuery':
+        return FakeQuery(self._client, self._collection_id, self._filters,
+                         self._orders + ((field_path, direction),), self._limit)
+
+    def limit(self, count: int) -> 'FakeQuery':
+        return FakeQuery(self._client, self._collection_id, self._filters, self._orders, count)
+
+    def get(self, **_kwargs) -> list['FakeDocumentSnapshot']:
+        self._client._rpc()
+        with self._client._lock:
+            documents = self._client._collection_documents(self._collection_id)
+            # Like Firestore, documents without an ordered field are left out.
+            matches = [
+                (document_id, data, update_time)
+                for document_id, (data, update_time) in documents.items()
+                if all(_matches(data, field_filter) for field_filter in self._filters)
+                and all(field_path in data for field_path, _ in self._orders)
+            ]
+            for field_path, direction in reversed(self._orders):
+                matches.sort(key=lambda match: match[1][field_path], reverse=direction == 'DESCENDING')
+
+            return [
+                FakeDocumentSnapshot(
+                    FakeDocumentReference(self._client, self._collection_id, document_id),
+                    copy.deepcopy(data),
+                    update_time
+                )
+                for document_id, data, update_time in matches[:self._limit]
+            ]
+
+    def stream(self, **_kwargs) -> Iterator['FakeDocumentSnapshot']:
+        return iter(self.get())
+
+
+class FakeDocumentReference(object):
+    def __init__(self, client: FakeFirestoreClient, collection_id: str, document_id: str):
+        self._client = client
+        self._collection_id = collection_id
+        self.id = document_id
+
+    @property
+    def path(self) -> str:
+        return f'{self._collection_id}/{self.id}'
+
+    def get(self, field_paths: list[str] | None = None, **_kwargs) -> 'FakeDocumentSnapshot':
+        self._client._rpc()
+        with self._client._lock:
+            return self.snapshot(field_paths)
+
+    def create(self, document_data: dict[str, Any]) -> None:
+        self._client._rpc()
+        with self._client._lock:
+            if self.id in self._documents():
+                raise Conflict(f'Document already exists: {self.path}')
+
+            self._write(document_data)
+
+    def set(self, document_data: dict[str, Any], merge: bool = False) -> None:
+        self._client._rpc()
+        with self._client._lock:
+            self._write(document_data, merge)
+
+    def update(self, field_updates: dict[str, Any], option: 'FakeLastUpdateOption | None' = None, **_kwargs) -> None:
+        self._client._rpc()
+        with self._client._lock:
+            self._check_option(option)
+            self._update(field_updates)
+
+    def delete(self, option: 'FakeLastUpdateOption | None' = None, **_kwargs) -> None:
+        self._client._rpc()
+        with self._client._lock:
+            self._check_option(option)
+            self._remove()
+
+    def snapshot(self, field_paths: list[str] | None = None) -> 'FakeDocumentSnapshot':
+        """
+        Snapshot the document without an RPC. The caller holds the client lock.
+        """
+        data, update_time = self._documents().get(self.id, (None, None))
+        if data is not None:
+            data = {key: copy.deepcopy(value) for key, value in data.items()
+                    if field_paths is None or key in field_paths}
+
+        return FakeDocumentSnapshot(self, data, update_time)
+
+    def _documents(self) -> dict[str, tuple[dict[str, Any], datetime]]:
+        return self._client._collection_documents(self._collection_id)
+
+    def _check_option(self, option: 'FakeLastUpdateOption | None') -> None:
+        if option is None:
+            return
+
+        _, update_time = self._documents().get(self.id, (None, None))
+        if update_time != option.last_update_time:
+            raise FailedPrecondition(f'The document was updated since {option.last_update_time}: {self.path}')
+
+    def _write(self, document_data: dict[str, Any], merge: bool = False) -> None:
+        current_data = dict(self._documents()[self.id][0]) if merge and self.id in self._documents() else {}
+        for key, value in document_data.items():
+            current_data[key] = _apply(current_data.get(key), value)
+
+        change_type = ChangeType.MODIFIED if self.id in self._documents() else ChangeType.ADDED
+        self._documents()[self.id] = (current_data, _now())
+        self._client._notify(self._collection_id, FakeDocumentChange(change_type, self.snapshot()))
+
+    def _remove(self) -> None:
+        if self.id in self._documents():
+            removed_change = FakeDocumentChange(ChangeType.REMOVED, self.snapshot())
+            del self._documents()[self.id]
+            self._client._notify(self._collection_id, removed_change)
+
+    def _update(self, field_updates: dict[str, Any]) -> None:
+        if self.id not in self._documents():
+            raise NotFound(f'No document to update: {self.path}')
+
+        self._write(field_updates, merge=True)
+
+
+class FakeDocumentChange(object):
+    def __init__(self, change_type: ChangeType, document: 'FakeDocumentSnapshot'):
+        self.type = change_type
+        self.document = document
+
+
+class FakeWatch(object):
+    """
+    Snapshot listener of a collection. Like a Firestore watch, it first delivers every document as ADDED,
+    then each change, from a background thread.
+    """
+
+    def __init__(self, client: FakeFirestoreClient, collection_id: str,
+                 callback: Callable[[list, list, datetime], None]):
+        self.collection_id = collection_id
+        self.is_active = True
+        self._client = client
+        self._callback = callback
+        self._changes: queue.Queue[list[FakeDocumentChange] | None] = queue.Queue()
+
+        with client._lock:
+            initial_changes = [
+                FakeDocumentChange(ChangeType.ADDED,
+                                   FakeDocumentReference(client, collection_id, document_id).snapshot())
+                for document_id in client._collection_documents(collection_id)
+            ]
+            self._enqueue(initial_changes)
+            client._watches.append(self)
+
+        threading.Thread(target=self._deliver, name=f'fake-watch-{collection_id}', daemon=True).start()
+
+    def unsubscribe(self) -> None:
+        with self._client._lock:
+            if self in self._client._watches:
+                self._client._watches.remove(self)
+
+        self.is_active = False
+        self._changes.put(None)
+
+    def _enqueue(self, changes: list[FakeDocumentChange]) -> None:
+        self._changes.put(changes)
+
+    def _deliver(self) -> None:
+        while True:
+            changes = self._changes.get()
+            if changes is None or not self.is_active:
+                return
+
+            self._callback([], changes, _now())
+
+
+class FakeLastUpdateOption(object):
+    def __init__(self, last_update_time: datetime):
+        self.last_update_time = last_update_time
+
+
+class FakeDocumentSnapshot(object):
+    def __init__(self, reference: FakeDocumentReference, data: dict[str, Any] | None, update_time: datetime | None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self.update_time = update_time
+        self.create_time = update_time
+        self._data = data
+
+    def to_dict(self) -> dict[str, Any] | None:
+        return copy.deepcopy(self._data)
+
+    def get(self, field_path: str) -> Any:
+        if self._data is None or field_path not in self._data:
+            raise KeyError(field_path)
+
+        return copy.deepcopy(self._data[field_path])
+
+
+class FakeWriteBatch(object):
+    def __init__(self, client: FakeFirestoreClient):
+        self._client = client
+        self._writes: list[tuple[FakeDocumentReference, str, dict[str, Any], bool]] = []
+        self._options: list[tuple[FakeDocumentReference, FakeLastUpdateOption]] = []
+
+    def set(self, reference: FakeDocumentReference, document_data: dict[str, Any], merge: bool = False) -> None:
+        self._writes.append((reference, 'set', document_data, merge))
+
+    def update(self, reference: FakeDocumentReference, field_updates: dict[str, Any],
+               option: 'FakeLastUpdateOption | None' = None) -> None:
+        self._writes.append((reference, 'update', field_updates, True))
+        if option is not None:
+            self._options.append((reference, option))
+
+    def delete(self, reference: FakeDocumentReference) -> None:
+        self._writes.append((reference, 'delete', {}, False))
+
+    def commit(self) -> list:
+        self._client._rpc()
+        with self._client._lock:
+            # Preconditions are checked before any write, so a failed batch writes nothing, like a Firestore commit.
+            for reference, option in self._options:
+                reference._check_option(option)
+
+            for reference, operation, document_data, merge in self._writes:
+                if operation == 'set':
+                    reference._write(document_data, merge)
+                elif operation == 'update':
+                    reference._update(document_data)
+                else:
+                    reference._remove()
+
+        return []
+
+
+def _apply(current_value: Any, new_value: Any) -> Any:
+    if new_value is transforms.SERVER_TIMESTAMP:
+        return _now()
+    if isinstance(new_value, transforms.Increment):
+        return (current_value or 0) + new_value.value
+
+    return copy.deepcopy(new_value)
+
+
+def _matches(data: dict[str, Any], field_filter: FieldFilter) -> bool:
+    if field_filter.field_path not in data:
+        return False
+
+    value = data[field_filter.field_path]
+    op_string, expected = field_filter.op_string, field_filter.value
+    if op_string == '==':
+        return value == expected
+    if op_string == '!=':
+        return value != expected
+    if op_string == 'in':
+        return value in expected
+    if op_string == 'not-in':
+        return value not in expected
+    if op_string == 'array_contains':
+        return isinstance(value, list) and expected in value
+    if op_string == 'array_contains_any':
+        return isinstance(value, list) and any(element in value for element in expected)
+
+    if op_string not in _COMPARISONS:
+        raise NotImplementedError(f'Unsupported filter operator: {op_string}')
+
+    return _COMPARISONS[op_string](value, expected)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any
+
+from shared.globals.constants import LLM_CHARS_PER_TOKEN
+
+_TOOL_NAMES_PATTERN = re.compile(r'Valid "action" values: "Final Answer" or (.+)')
+_WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+_RESPONSE_WORDS = ('sure', 'happy', 'to', 'help', 'with', 'that', 'here', 'is', 'what', 'I', 'found', 'about', 'your',
+                   'question', 'and', 'a', 'few', 'details', 'worth', 'knowing')
+
+
+class FakeVertexAI(object):
+    """
+    Deterministic stand-in for the Vertex AI language models, installed in place of ChatModel.from_pretrained
+    and TextEmbeddingModel.from_pretrained, so the LangChain models and everything above them run unchanged.
+    Responses depend only on the prompt, and calls sleep for a configurable latency.
+
+    Chat responses report token counts in their prediction metadata like the real API. Prompts of the structured
+    chat agent are answered with an action for one of the offered tools, and with a final answer once the tool
+    was observed, so agent runs make two model calls and one tool call.
+
+    :param latency_seconds: The base latency of a chat model call.
+    :param jitter_seconds: The maximum latency added to a chat model call, derived from a hash of the prompt.
+    :param response_words: The number of words in plain chat responses.
+    :param embedding_latency_seconds: The latency of an embedding call, for any number of texts.
+    :param embedding_dimensions: The number of dimensions of the embeddings.
+    """
+
+    def __init__(self,
+                 latency_seconds: float = 0.0,
+                 jitter_seconds: float = 0.0,
+                 response_words: int = 40,
+                 embedding_latency_seconds: float = 0.0,
+                 embedding_dimensions: int = 256):
+        self.latency_seconds = latency_seconds
+        self.jitter_seconds = jitter_seconds
+        self.response_words = response_words
+        self.embedding_latency_seconds = embedding_latency_seconds
+        self.embedding_dimensions = embedding_dimensions
+        self.chat_calls = 0
+        self.embedding_calls = 0
+        self._lock = threading.Lock()
+
+    def install(self) -> None:
+        """
+        Replace the Vertex AI SDK entry points used by LangChain with this fake.
+        """
+        import vertexai
+        from vertexai.preview.language_models import ChatModel, CodeChatModel, TextEmbeddingModel
+
+        fake = self
+        vertexai.init = lambda *args, **kwargs: None
+        ChatModel.from_pretrained = classmethod(lambda cls, model_name: _FakeChatModel(fake))
+        CodeChatModel.from_pretrained = classmethod(lambda cls, model_name: _FakeChatModel(fake))
+        TextEmbeddingModel.from_pretrained = classmethod(lambda cls, model_name: _FakeTextEmbeddingModel(fake))
+
+    def respond(self, context: str | None, history: list[Any], message: str) -> SimpleNamespace:
+        """
+        :param context: The system context of the chat.
+        :param history: The earlier messages of the chat.
+        :param message: The new message.
+        :return: A response shaped like a Vertex AI TextGenerationResponse.
+        """
+        prompt = '\n'.join([context or ''] + [getattr(item, 'content', str(item)) for item in history] + [message])
+        digest = _digest(prompt)
+
+        with self._lock:
+            self.chat_calls += 1
+
+        latency = self.latency_seconds + self.jitter_seconds * (digest % 1000) / 1000
+        if latency > 0:
+            time.sleep(latency)
+
+        tool_names = _TOOL_NAMES_PATTERN.search(context or '')
+        if tool_names is not None:
+            text = self._agent_response(tool_names.group(1), message, digest)
+        else:
+            text = ' '.join(_RESPONSE_WORDS[(digest + i) % len(_RESPONSE_WORDS)] for i in range(self.response_words))
+
+        token_metadata = {
+            'inputTokenCount': {'totalTokens': math.ceil(len(prompt) / LLM_CHARS_PER_TOKEN)},
+            'outputTokenCount': {'totalTokens': math.ceil(len(text) / LLM_CHARS_PER_TOKEN)}
+        }
+        return SimpleNamespace(
+            text=text,
+            is_blocked=False,
+            raw_prediction_response=SimpleNamespace(metadata={'tokenMetadata': token_metadata})
+        )
+
+    def embed(self, texts: list[str]) -> list[SimpleNamespace]:
+        """
+        Embed texts as hashed bags of words, so texts sharing words are similar.
+
+        :param texts: The texts to embed.
+        :return: The embeddings, shaped like Vertex AI TextEmbedding objects.
+        """
+        with self._lock:
+            self.embedding_calls += 1
+
+        if self.embedding_latency_seconds > 0:
+            time.sleep(self.embedding_latency_seconds)
+
+        embeddings = []
+        for text in texts:
+            values = [0.0] * self.embedding_dimensions
+            for word in _WORD_PATTERN.findall(text.lower()):
+                word_digest = _digest(word)
+                values[word_digest % self.embedding_dimensions] += 1.0 if word_digest & 1 << 20 else -1.0
+
+            norm = math.sqrt(sum(value * value for value in values)) or 1.0
+            embeddings.append(SimpleNamespace(values=[value / norm for value in values]))
+
+        return embeddings
+
+    @staticmethod
+    def _agent_response(tool_names: str, message: str, digest: int) -> str:
+        if 'Observation:' in message:
+            action = {'action': 'Final Answer', 'action_input': f'Here is what the API returned for you ({digest % 997}).'}
+        else:
+            names = [name.strip().strip('"') for name in tool_names.split(',') if name.strip()]
+            action = {'action': names[digest % len(names)], 'action_input': {}}
+
+        return f'Action:\n```\n{json.dumps(action)}\n```'
+
+
+class _FakeChatModel(object):
+    def __init__(self, fake: FakeVertexAI):
+        self._fake = fake
+
+    def start_chat(self, context: str | None = None, message_history: list | None = None, **_kwargs) -> '_FakeChatSession':
+        return _FakeChatSession(self._fake, context, message_history or [])
+
+
+class _FakeChatSession(object):
+    def __init__(self, fake: FakeVertexAI, context: str | None, history: list):
+        self._fake = fake
+        self._context = context
+        self._history = history
+
+    def send_message(self, message: str, **_kwargs) -> SimpleNamespace:
+        return self._fake.respond(self._context, self._history, message)
+
+
+class _FakeTextEmbeddingModel(object):
+    def __init__(self, fake: FakeVertexAI):
+        self._fake = fake
+
+    def get_embeddings(self, texts: list[str]) -> list[SimpleNamespace]:
+        return self._fake.embed(texts)
+
+
+def _digest(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'big')
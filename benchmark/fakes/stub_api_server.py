@@ -0,0 +1,96 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmark.synthetic_spec import make_openapi_spec
+
+
+class StubAPIServer(object):
+    """
+    Local HTTP server serving a synthetic OpenAPI spec, and small JSON responses to the operations of the spec,
+    as the target API of the agent tools.
+
+    :param base_path: The path of the API, like 'api'. The spec is served at /{base_path}/{docs_url}.
+    :param docs_url: The path of the spec under the base path.
+    :param operation_count: The number of operations in the spec.
+    :param latency_seconds: The latency added to every operation response.
+    """
+
+    def __init__(self, base_path: str, docs_url: str, operation_count: int = 20, latency_seconds: float = 0.0):
+        self.base_path = base_path
+        self.docs_url = docs_url
+        self.operation_count = operation_count
+        self.latency_seconds = latency_seconds
+        self.request_count = 0
+        self._server: ThreadingHTTPServer | None = None
+        self._thread: threading.Thread | None = None
+        self._spec_body = b''
+        self._lock = threading.Lock()
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.port}/{self.base_path}'
+
+    def start(self) -> None:
+        """
+        Start serving on a free port, in a daemon thread.
+        """
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] == f'/{stub.base_path}/{stub.docs_url}':
+                    self._send(stub._spec_body)
+                else:
+                    self._operation()
+
+            def do_POST(self):
+                self._operation()
+
+            def do_PUT(self):
+                self._operation()
+
+            def do_PATCH(self):
+                self._operation()
+
+            def do_DELETE(self):
+                self._operation()
+
+            def log_message(self, _format, *_args):
+                pass
+
+            def _operation(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                with stub._lock:
+                    stub.request_count += 1
+
+                if stub.latency_seconds > 0:
+                    time.sleep(stub.latency_seconds)
+
+                resource = self.path.split('?')[0].rsplit('/', 1)[-1]
+                items = [{'id': f'{resource}-{i}', 'name': f'{resource.replace("_", " ")} {i}'} for i in range(3)]
+                self._send(json.dumps({'items': items, 'count': len(items)}).encode())
+
+            def _send(self, body: bytes):
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._spec_body = json.dumps(make_openapi_spec(self.operation_count, self.base_url)).encode()
+
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-api', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
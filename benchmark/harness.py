@@ -0,0 +1,285 @@
+import contextlib
+import itertools
+import math
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Callable
+
+from flask import Flask
+from flask.testing import FlaskClient
+
+from benchmark.fakes.fake_vertex_ai import FakeVertexAI
+from benchmark.fakes.stub_api_server import StubAPIServer
+
+BENCHMARK_ORG_ID: str = 'benchmark-org'
+BENCHMARK_USER_ID: str = 'benchmark-user'
+
+FIRESTORE_MEMORY: str = 'memory'
+FIRESTORE_EMULATOR: str = 'emulator'
+
+
+@dataclass(slots=True)
+class BenchmarkOptions:
+    firestore: str = FIRESTORE_MEMORY
+    firestore_latency_seconds: float = 0.005
+    llm_latency_seconds: float = 0.2
+    llm_jitter_seconds: float = 0.1
+    llm_response_words: int = 40
+    llm_rate_limits: bool = False
+    embedding_latency_seconds: float = 0.02
+    api_latency_seconds: float = 0.02
+    api_operations: int = 20
+    install_vertex_ai: bool = True
+
+
+@dataclass(slots=True)
+class BenchmarkEnvironment:
+    app: Flask
+    vertex_ai: FakeVertexAI
+    stub_api: StubAPIServer
+    firestore_client: Any
+
+    def firestore_rpc_count(self) -> int | None:
+        return getattr(self.firestore_client, 'rpc_count', None)
+
+    def client(self) -> FlaskClient:
+        """
+        :return: A test client of the app, signed in as an ADMIN_OWNER of the benchmark org.
+        """
+        from shared.globals.constants import AUTH_HEADER_NAME
+
+        client = self.app.test_client()
+        client.environ_base[f'HTTP_{AUTH_HEADER_NAME.upper().replace("-", "_")}'] = f'Bearer {BENCHMARK_USER_ID}'
+        return client
+
+
+@dataclass(slots=True)
+class ScenarioResult:
+    name: str
+    latencies: list[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    server_timing_ms: dict[str, float] = field(default_factory=lambda: defaultdict(float))
+    duration_seconds: float = 0.0
+    firestore_rpcs: int | None = None
+    llm_calls: int = 0
+
+    def summary(self) -> dict[str, Any]:
+        """
+        :return: The throughput, latency percentiles in milliseconds, error count and per-request costs of the run.
+        """
+        count = len(self.latencies)
+        latencies = sorted(self.latencies)
+        errors = sum(number for status, number in self.statuses.items() if status >= 400)
+        return {
+            'scenario': self.name,
+            'requests': count,
+            'errors': errors,
+            'throughput_rps': round(count / self.duration_seconds, 2) if self.duration_seconds else 0.0,
+            'mean_ms': round(1000 * sum(latencies) / count, 2) if count else 0.0,
+            'p50_ms': round(1000 * percentile(latencies, 50), 2),
+            'p95_ms': round(1000 * percentile(latencies, 95), 2),
+            'p99_ms': round(1000 * percentile(latencies, 99), 2),
+            'max_ms': round(1000 * latencies[-1], 2) if count else 0.0,
+            'firestore_rpcs_per_request': round(self.firestore_rpcs / count, 2)
+            if count and self.firestore_rpcs is not None else None,
+            'llm_calls_per_request': round(self.llm_calls / count, 2) if count else 0.0,
+            'statuses': {str(status): number for status, number in sorted(self.statuses.items())},
+            'server_timing_mean_ms': {category: round(total / count, 2)
+                                      for category, total in sorted(self.server_timing_ms.items())} if count else {}
+        }
+
+
+def boot(options: BenchmarkOptions) -> BenchmarkEnvironment:
+    """
+    Import the app from main.py with every external service replaced: Firestore by an in-memory fake
+    (or the emulator at FIRESTORE_EMULATOR_HOST), Vertex AI chat and embedding models by deterministic fakes,
+    Firebase Auth by a fixed ADMIN_OWNER user, and the target API of the agent tools by a local stub server.
+    Must be called before anything else imports the app, since constants are read at import time.
+    Without install_vertex_ai, the fake Vertex AI models are only created, so booting does not import the Vertex AI SDK,
+    and must be installed before the first model call.
+
+    :param options: The options of the fake services.
+    :return: The app and the fakes.
+    """
+    from shared.globals import constants
+
+    stub_api = StubAPIServer(constants.BASE_PATH, constants.DOCS_URL, options.api_operations,
+                             options.api_latency_seconds)
+    stub_api.start()
+
+    # The stub API stands in for the debug host the scrap agent reads its spec from.
+    constants.DEBUG_PORT = stub_api.port
+    constants.REPO_CACHE_LISTENERS_ENABLED = options.firestore == FIRESTORE_EMULATOR
+    constants.TRACE_EXPORTER = ''
+    if not options.llm_rate_limits:
+        # Measure the service rather than the configured quota. Concurrency and queue limits still apply.
+        constants.LLM_MODEL_REQUESTS_PER_MINUTE = constants.LLM_ORG_REQUESTS_PER_MINUTE = None
+
+    # Run as deployed, without the testing filters that set up a test org in Firebase, and fully offline.
+    os.environ['GAE_ENV'] = 'standard'
+    os.environ.setdefault('ANONYMIZED_TELEMETRY', 'False')
+
+    firestore_client = _install_firestore(options)
+    _install_auth()
+
+    from google.oauth2 import service_account
+    service_account.Credentials.from_service_account_info = staticmethod(lambda *args, **kwargs: None)
+
+    vertex_ai = FakeVertexAI(options.llm_latency_seconds, options.llm_jitter_seconds, options.llm_response_words,
+                             options.embedding_latency_seconds)
+    if options.install_vertex_ai:
+        vertex_ai.install()
+
+    import main
+
+    from repository.repo_modules import org_repo
+    org_repo.ORGS.collection_ref.document(BENCHMARK_ORG_ID).set({'org_name': 'Benchmark Organization'})
+
+    return BenchmarkEnvironment(main.app, vertex_ai, stub_api, firestore_client)
+
+
+def run_scenario(environment: BenchmarkEnvironment,
+                 name: str,
+                 request: Callable[[FlaskClient, int], Any],
+                 requests: int,
+                 concurrency: int,
+                 warmup: int = 0) -> ScenarioResult:
+    """
+    Send requests to the app from concurrent clients, and time them.
+    Warm-up requests are sent one at a time first, and are not measured.
+
+    :param environment: The booted benchmark environment.
+    :param name: The name of the scenario.
+    :param request: Sends the request with the given index from the given client, and returns the response.
+    :param requests: The number of measured requests.
+    :param concurrency: The number of clients sending requests at once.
+    :param warmup: The number of warm-up requests.
+    :return: The timings of the measured requests.
+    """
+    result = ScenarioResult(name)
+    result_lock = threading.Lock()
+    indexes = itertools.count()
+
+    # The agent and the tools print their progress, which would drown the report.
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        warmup_client = environment.client()
+        for index in range(warmup):
+            request(warmup_client, -1 - index)
+
+        def worker() -> None:
+            client = environment.client()
+            while (index := next(indexes)) < requests:
+                start = time.perf_counter()
+                response = request(client, index)
+                latency = time.perf_counter() - start
+
+                with result_lock:
+                    result.latencies.append(latency)
+                    result.statuses[response.status_code] += 1
+                    for category, duration in _parse_server_timing(response.headers.get('Server-Timing', '')):
+                        result.server_timing_ms[category] += duration
+
+        rpcs_before = environment.firestore_rpc_count()
+        llm_calls_before = environment.vertex_ai.chat_calls
+        start = time.perf_counter()
+
+        threads = [threading.Thread(target=worker, name=f'benchmark-{i}') for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        result.duration_seconds = time.perf_counter() - start
+        result.llm_calls = environment.vertex_ai.chat_calls - llm_calls_before
+        if rpcs_before is not None:
+            result.firestore_rpcs = environment.firestore_rpc_count() - rpcs_before
+
+    return result
+
+
+def percentile(sorted_values: list[float], percent: float) -> float:
+    """
+    :param sorted_values: The values, in ascending order.
+    :param percent: The percentile, from 0 to 100.
+    :return: The nearest-rank percentile of the values, or 0 without values.
+    """
+    if not sorted_values:
+        return 0.0
+
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def install_memory_firestore(latency_seconds: float) -> Any:
+    """
+    Make the app use an in-memory Firestore, without booting the rest of it. Must be called before
+    repository.firestore is imported, since it creates its client once.
+
+    :param latency_seconds: The latency added to every RPC.
+    :return: The fake Firestore client.
+    """
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    from benchmark.fakes.fake_firestore import FakeFirestoreClient
+
+    client = FakeFirestoreClient(latency_seconds)
+    credentials.Certificate = lambda *args, **kwargs: None
+    firebase_admin.initialize_app = lambda *args, **kwargs: None
+    firestore.client = lambda *args, **kwargs: client
+    return client
+
+
+def _install_firestore(options: BenchmarkOptions) -> Any:
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    if options.firestore == FIRESTORE_MEMORY:
+        return install_memory_firestore(options.firestore_latency_seconds)
+
+    if options.firestore != FIRESTORE_EMULATOR:
+        raise ValueError(f'Unknown Firestore option: {options.firestore}')
+    if not os.getenv('FIRESTORE_EMULATOR_HOST'):
+        raise ValueError('FIRESTORE_EMULATOR_HOST must be set to benchmark against the Firestore emulator')
+
+    # The emulator accepts any project and does not check credentials.
+    from google.auth.credentials import AnonymousCredentials
+
+    class EmulatorCredential(credentials.Base):
+        def get_credential(self):
+            return AnonymousCredentials()
+
+    project_id = os.environ.setdefault('GOOGLE_CLOUD_PROJECT', 'assistful-benchmark')
+    initialize_app = firebase_admin.initialize_app
+    credentials.Certificate = lambda *args, **kwargs: EmulatorCredential()
+    firebase_admin.initialize_app = lambda credential, options=None, **kwargs: initialize_app(
+        credential, {**(options or {}), 'projectId': project_id}, **kwargs)
+    return None
+
+
+def _install_auth() -> None:
+    from firebase_admin import auth
+
+    from shared.globals.enums import AccessLevels, CustomClaimKeys
+
+    claims = {
+        CustomClaimKeys.ACCESS_LEVEL.value: AccessLevels.ADMIN_OWNER.value,
+        CustomClaimKeys.ORG_ID.value: BENCHMARK_ORG_ID
+    }
+    auth.verify_id_token = lambda id_token, check_revoked=False, **kwargs: {'uid': id_token}
+    auth.get_user = lambda uid, **kwargs: SimpleNamespace(uid=uid, email=f'{uid}@example.com',
+                                                          custom_claims=dict(claims))
+
+
+def _parse_server_timing(header: str) -> list[tuple[str, float]]:
+    timings = []
+    for metric in header.split(','):
+        name, _, params = metric.strip().partition(';')
+        if params.startswith('dur='):
+            timings.append((name, float(params[len('dur='):])))
+
+    return timings
@@ -0,0 +1,295 @@
+"""
+Load test of the production server configuration. Serves the app booted against the benchmark fakes
+(benchmark/wsgi.py) with gunicorn and gunicorn.conf.py, once per worker model, drives it over HTTP
+at a fixed concurrency, and reports throughput, latency percentiles and worker memory.
+Each server is stopped with SIGTERM, so the graceful shutdown is exercised and timed too.
+
+Run from the repository root:
+
+    python -m benchmark.load_test --configs 1x8,1x32,2x16 --scenario mixed --concurrency 32 --requests 1000
+
+Configs are workers x threads. The fake latencies default to production-like round trips, so the results show how well
+a worker model overlaps I/O waits, and how much CPU it leaves on the table, on the machine the test runs on.
+"""
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any
+from urllib.parse import urlencode
+
+from benchmark.harness import BENCHMARK_USER_ID, percentile
+from benchmark.scenarios import Fixtures, SCENARIOS
+
+_REPO_ROOT = Path(__file__).parent.parent
+_COLUMNS = ('config', 'requests', 'errors', 'throughput_rps', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms',
+            'worker_rss_mb', 'shutdown_seconds')
+
+
+@dataclass(slots=True)
+class _HTTPResponse:
+    status_code: int
+    headers: dict[str, str]
+    body: bytes
+
+    def get_json(self) -> Any:
+        return json.loads(self.body)
+
+
+class _HTTPClient(object):
+    """
+    The part of the Flask test client the scenarios use, over a keep-alive HTTP connection to a server.
+
+    :param port: The local port of the server.
+    :param headers: The headers of every request.
+    """
+
+    def __init__(self, port: int, headers: dict[str, str]):
+        self.port = port
+        self.headers = headers
+        self._connection = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+
+    def get(self, path: str, query_string: dict[str, str] | None = None) -> _HTTPResponse:
+        return self._request('GET', f'{path}?{urlencode(query_string)}' if query_string else path)
+
+    def post(self, path: str, json: Any = None) -> _HTTPResponse:
+        return self._request('POST', path, json)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def _request(self, method: str, path: str, body: Any = None) -> _HTTPResponse:
+        headers = dict(self.headers)
+        encoded_body = None
+        if body is not None:
+            encoded_body = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+
+        try:
+            self._connection.request(method, path, encoded_body, headers)
+            response = self._connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            # The server closed the keep-alive connection, retry once on a new one.
+            self._connection.close()
+            self._connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=120)
+            self._connection.request(method, path, encoded_body, headers)
+            response = self._connection.getresponse()
+
+        return _HTTPResponse(response.status, dict(response.getheaders()), response.read())
+
+
+def run_load_test(workers: int,
+                  threads: int,
+                  worker_class: str,
+                  scenario_name: str,
+                  requests: int,
+                  concurrency: int,
+                  warmup: int,
+                  server_environment: dict[str, str]) -> dict[str, Any]:
+    """
+    Start a server with the given worker model, send it requests from concurrent clients, and stop it.
+
+    :param workers: The number of worker processes.
+    :param threads: The number of threads per worker.
+    :param worker_class: The gunicorn worker class.
+    :param scenario_name: The scenario sending each request.
+    :param requests: The number of measured requests.
+    :param concurrency: The number of clients sending requests at once.
+    :param warmup: The number of unmeasured requests sent first, at the same concurrency.
+    :param server_environment: The BENCHMARK_ variables of the server.
+    :return: The throughput, latency percentiles, worker memory and shutdown time of the run.
+    """
+    from shared.globals.constants import AUTH_HEADER_NAME
+
+    port = _free_port()
+    environment = {**os.environ, **server_environment, 'PORT': str(port), 'SERVER_WORKERS': str(workers),
+                   'SERVER_THREADS': str(threads), 'SERVER_WORKER_CLASS': worker_class}
+    # The server log goes to a file, since nothing reads it during the test to keep a pipe from filling up.
+    server_log = tempfile.TemporaryFile('w+')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'benchmark.wsgi:app'],
+                              cwd=_REPO_ROOT, env=environment, stdout=subprocess.DEVNULL, stderr=server_log)
+    try:
+        headers = {AUTH_HEADER_NAME: f'Bearer {BENCHMARK_USER_ID}'}
+        _wait_until_ready(server, server_log, port, headers, workers)
+
+        fixtures = Fixtures([f'benchmark-chatbot-{i}' for i in range(int(server_environment['BENCHMARK_CHATBOTS']))],
+                            [f'benchmark-chat-{i}' for i in range(int(server_environment['BENCHMARK_CHATS']))])
+        scenario = SCENARIOS[scenario_name]
+
+        _send_requests(port, headers, lambda client, index: scenario(client, -1 - index, fixtures), warmup,
+                       concurrency)
+        latencies, statuses, duration = _send_requests(
+            port, headers, lambda client, index: scenario(client, index, fixtures), requests, concurrency)
+        worker_rss_mb = _worker_rss_mb(server.pid)
+    finally:
+        start = time.perf_counter()
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        shutdown_seconds = time.perf_counter() - start
+        server_log.close()
+
+    latencies.sort()
+    return {
+        'config': f'{workers}x{threads} {worker_class}',
+        'requests': len(latencies),
+        'errors': sum(number for status, number in statuses.items() if status >= 400),
+        'throughput_rps': round(len(latencies) / duration, 2),
+        'mean_ms': round(1000 * sum(latencies) / len(latencies), 2),
+        'p50_ms': round(1000 * percentile(latencies, 50), 2),
+        'p95_ms': round(1000 * percentile(latencies, 95), 2),
+        'p99_ms': round(1000 * percentile(latencies, 99), 2),
+        'worker_rss_mb': worker_rss_mb,
+        'shutdown_seconds': round(shutdown_seconds, 2),
+        'shutdown_exit_code': server.returncode,
+        'statuses': {str(status): number for status, number in sorted(statuses.items())}
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Load test worker models of the production server.')
+    parser.add_argument('--configs', default='1x8,1x16,1x32,2x16,4x8',
+                        help='Comma separated worker models, as workers x threads')
+    parser.add_argument('--worker-class', default='gthread', help='The gunicorn worker class')
+    parser.add_argument('--scenario', choices=tuple(name for name in SCENARIOS if name != 'scrap'), default='mixed',
+                        help='The scenario of every request')
+    parser.add_argument('--requests', type=int, default=1000, help='Measured requests per config')
+    parser.add_argument('--concurrency', type=int, default=32, help='Clients sending requests at once')
+    parser.add_argument('--warmup', type=int, default=50, help='Unmeasured requests sent first')
+    parser.add_argument('--chatbots', type=int, default=5, help='Chatbots seeded in every worker')
+    parser.add_argument('--chats', type=int, default=20, help='Chats seeded in every worker')
+    parser.add_argument('--firestore-latency-ms', type=float, default=5, help='Latency of in-memory Firestore RPCs')
+    parser.add_argument('--llm-latency-ms', type=float, default=200, help='Base latency of chat model calls')
+    parser.add_argument('--llm-jitter-ms', type=float, default=100, help='Maximum latency added to chat model calls')
+    parser.add_argument('--json', dest='json_path', help='Also write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    server_environment = {
+        'BENCHMARK_CHATBOTS': str(args.chatbots),
+        'BENCHMARK_CHATS': str(args.chats),
+        'BENCHMARK_FIRESTORE_LATENCY_MS': str(args.firestore_latency_ms),
+        'BENCHMARK_LLM_LATENCY_MS': str(args.llm_latency_ms),
+        'BENCHMARK_LLM_JITTER_MS': str(args.llm_jitter_ms)
+    }
+
+    results = []
+    for config in args.configs.split(','):
+        workers, threads = (int(value) for value in config.strip().split('x'))
+        results.append(run_load_test(workers, threads, args.worker_class, args.scenario, args.requests,
+                                     args.concurrency, args.warmup, server_environment))
+        print(f'{results[-1]["config"]}: done', file=sys.stderr)
+
+    rows = [_COLUMNS] + [tuple('-' if result[column] is None else str(result[column]) for column in _COLUMNS)
+                         for result in results]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(_COLUMNS))]
+    print('\n'.join('  '.join(value.rjust(width) for value, width in zip(row, widths)) for row in rows))
+    for result in results:
+        print(f'{result["config"]}: statuses {result["statuses"]}, shutdown exit code {result["shutdown_exit_code"]}')
+
+    if args.json_path:
+        with open(args.json_path, 'w') as json_file:
+            json.dump({'options': vars(args), 'results': results}, json_file, indent=2)
+
+    return 1 if any(result['errors'] or result['shutdown_exit_code'] != 0 for result in results) else 0
+
+
+def _send_requests(port: int,
+                   headers: dict[str, str],
+                   request: Any,
+                   requests: int,
+                   concurrency: int) -> tuple[list[float], Counter, float]:
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    lock = threading.Lock()
+    next_index = iter(range(requests))
+
+    def worker() -> None:
+        client = _HTTPClient(port, headers)
+        try:
+            while True:
+                with lock:
+                    index = next(next_index, None)
+                if index is None:
+                    return
+
+                start = time.perf_counter()
+                response = request(client, index)
+                latency = time.perf_counter() - start
+                with lock:
+                    latencies.append(latency)
+                    statuses[response.status_code] += 1
+        finally:
+            client.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, name=f'load-{i}') for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return latencies, statuses, time.perf_counter() - start
+
+
+def _wait_until_ready(server: subprocess.Popen,
+                      server_log: IO[str],
+                      port: int,
+                      headers: dict[str, str],
+                      workers: int) -> None:
+    """Wait until the server answers, and every worker had time to boot, since workers import the app on their own."""
+    deadline = time.monotonic() + 120
+    ready_responses = 0
+    while ready_responses < 4 * workers:
+        if server.poll() is not None:
+            server_log.seek(0)
+            raise RuntimeError(f'The server exited with {server.returncode}:\n{server_log.read()}')
+        if time.monotonic() > deadline:
+            raise RuntimeError('The server did not start in time')
+
+        try:
+            client = _HTTPClient(port, headers)
+            ready_responses += client.get('/warmup').status_code == 200
+            client.close()
+        except OSError:
+            time.sleep(0.2)
+
+
+def _worker_rss_mb(server_pid: int) -> float | None:
+    """
+    :param server_pid: The process ID of the gunicorn master.
+    :return: The mean resident memory of the workers in MB, or None where /proc is not available.
+    """
+    rss_kb = []
+    for stat_path in Path('/proc').glob('[0-9]*/stat'):
+        try:
+            if int(stat_path.read_text().rsplit(')', 1)[1].split()[1]) != server_pid:
+                continue
+
+            status = (stat_path.parent / 'status').read_text()
+            rss_kb.extend(int(line.split()[1]) for line in status.splitlines() if line.startswith('VmRSS:'))
+        except (OSError, ValueError, IndexError):
+            continue
+
+    return round(sum(rss_kb) / len(rss_kb) / 1024, 1) if rss_kb else None
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,381 @@
+"""
+Micro-benchmarks of the per-query work of the agent path: building API operations and tools from a spec,
+their TypeScript definitions, pickling them in and out of the vector store, and the tool memory checks.
+Every benchmark runs on synthetic specs of 10, 100, 1,000 and 10,000 operations, so costs that grow with
+the size of a spec stand out. The cases that use the reference cache of a spec also report its hits and misses:
+over the timed calls for a case sharing one spec, after the untimed warm-up pass, or of the last call
+for a case building a new spec per call. Parsing a spec leaves its references unresolved, so spec.from_spec_dict
+reports none, and any it starts reporting show references resolved eagerly.
+
+The hydration of each DTO from a Firestore document is timed too, with a schema created per document,
+with the cached schema, and trusted without a schema, and so is serializing each DTO back to a dictionary.
+Chat documents have as many history messages as the size.
+
+Reading as many tools as the size with tool_repo.get is timed against an in-memory Firestore that adds
+_TOOL_READ_LATENCY_SECONDS to every RPC: tool_repo.get.get_all reads the tools in parallel chunks of
+FIRESTORE_GET_ALL_CHUNK_SIZE, and tool_repo.get.per_document is the previous implementation, with one read
+per tool from a new thread pool per call.
+
+Run from the repository root:
+
+    python -m benchmark.micro_benchmarks --sizes 10,100,1000 --fail-on-regression
+
+Each run is appended to a history file, and compared with the median of the previous runs on the same machine
+and Python version. Timings that got slower than the threshold are reported as regressions.
+"""
+import argparse
+import gc
+import json
+import logging
+import math
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from json import dumps
+from pathlib import Path
+from typing import Any, Callable
+
+from benchmark.synthetic_spec import make_openapi_spec
+
+DEFAULT_SIZES: tuple[int, ...] = (10, 100, 1000, 10000)
+DEFAULT_HISTORY_PATH: Path = Path(__file__).parent / 'results' / 'micro_benchmarks.jsonl'
+
+_SERVER_URL = 'http://127.0.0.1:8080/api'
+_TOOL_READ_LATENCY_SECONDS = 0.005
+
+
+@dataclass(slots=True)
+class MicroBenchmarkResult:
+    name: str
+    size: int
+    calls: int
+    best_us: float
+    median_us: float
+    # The hits and misses of the resolved reference cache of the spec, for the cases that use one.
+    ref_cache_hits: int | None = None
+    ref_cache_misses: int | None = None
+
+
+@dataclass(slots=True)
+class _Case:
+    name: str
+    inputs: list[Any]
+    call: Callable[[Any], Any]
+    # Returns the spec whose reference cache the case uses, given the result of the last call.
+    ref_spec: Callable[[Any], Any] | None = None
+
+
+def run_micro_benchmarks(sizes: tuple[int, ...], sample: int, repeat: int) -> list[MicroBenchmarkResult]:
+    """
+    Time every benchmark on a synthetic spec of each size.
+    Operation benchmarks are timed on a sample of operations spread over the whole spec.
+
+    :param sizes: The numbers of operations of the specs.
+    :param sample: The maximum number of operations timed per benchmark.
+    :param repeat: The number of times each benchmark is repeated. The best and median repeats are reported.
+    :return: The time per call of each benchmark and size, in microseconds.
+    """
+    results = []
+    for size in sizes:
+        for case in _cases(size, sample):
+            results.append(_time_case(case, size, repeat))
+            print(f'{case.name} [{size}]: {results[-1].best_us:.1f}us', file=sys.stderr)
+
+    return results
+
+
+def compare_with_history(results: list[MicroBenchmarkResult],
+                         history: list[dict[str, Any]],
+                         baseline_runs: int,
+                         threshold: float) -> list[dict[str, Any]]:
+    """
+    Compare results with the median of the last runs of the same machine and Python version.
+
+    :param results: The results of this run.
+    :param history: The earlier runs, oldest first.
+    :param baseline_runs: The number of earlier runs making up the baseline.
+    :param threshold: The relative slowdown of the best time reported as a regression, like 0.2 for 20%.
+    :return: The comparison of each result, with its baseline and change, if the history has one.
+    """
+    environment = _environment()
+    comparable_runs = [run for run in history if run.get('environment') == environment][-baseline_runs:]
+
+    comparisons = []
+    for result in results:
+        baseline_times = [entry['best_us'] for run in comparable_runs for entry in run['results']
+                          if entry['name'] == result.name and entry['size'] == result.size]
+        baseline_us = statistics.median(baseline_times) if baseline_times else None
+        change = result.best_us / baseline_us - 1 if baseline_us else None
+        comparisons.append({
+            **asdict(result),
+            'baseline_us': round(baseline_us, 2) if baseline_us is not None else None,
+            'change': round(change, 3) if change is not None else None,
+            'regression': change is not None and change > threshold
+        })
+
+    return comparisons
+
+
+def load_history(history_path: Path) -> list[dict[str, Any]]:
+    if not history_path.exists():
+        return []
+
+    with history_path.open() as history_file:
+        return [json.loads(line) for line in history_file if line.strip()]
+
+
+def append_history(history_path: Path, results: list[MicroBenchmarkResult]) -> None:
+    history_path.parent.mkdir(parents=True, exist_ok=True)
+    run = {
+        'time': datetime.now(timezone.utc).isoformat(),
+        'commit': _git_commit(),
+        'environment': _environment(),
+        'results': [asdict(result) for result in results]
+    }
+    with history_path.open('a') as history_file:
+        history_file.write(json.dumps(run) + '\n')
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Micro-benchmark the tool construction hot paths of the agent.')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='Comma separated numbers of operations of the synthetic specs')
+    parser.add_argument('--sample', type=int, default=100, help='Maximum operations timed per benchmark and size')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeats of each benchmark')
+    parser.add_argument('--history', type=Path, default=DEFAULT_HISTORY_PATH, help='JSON lines file of past runs')
+    parser.add_argument('--no-record', action='store_true', help='Do not append this run to the history')
+    parser.add_argument('--baseline-runs', type=int, default=5, help='Past runs making up the baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Slowdown reported as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Exit with 1 if anything regressed')
+    args = parser.parse_args(argv)
+
+    # Loading a 3.0 spec logs a warning every time.
+    logging.basicConfig(level=logging.ERROR)
+
+    sizes = tuple(int(size) for size in args.sizes.split(',') if size.strip())
+    results = run_micro_benchmarks(sizes, args.sample, args.repeat)
+    comparisons = compare_with_history(results, load_history(args.history), args.baseline_runs, args.threshold)
+
+    print(f'{"benchmark":<40} {"size":>6} {"calls":>6} {"best_us":>12} {"median_us":>12} {"baseline_us":>12} '
+          f'{"change":>8} {"ref_hits":>9} {"ref_misses":>10}')
+    for comparison in comparisons:
+        change = f'{comparison["change"]:+.1%}' if comparison['change'] is not None else '-'
+        baseline = f'{comparison["baseline_us"]:.1f}' if comparison['baseline_us'] is not None else '-'
+        ref_hits = comparison['ref_cache_hits'] if comparison['ref_cache_hits'] is not None else '-'
+        ref_misses = comparison['ref_cache_misses'] if comparison['ref_cache_misses'] is not None else '-'
+        print(f'{comparison["name"]:<40} {comparison["size"]:>6} {comparison["calls"]:>6} '
+              f'{comparison["best_us"]:>12.1f} {comparison["median_us"]:>12.1f} {baseline:>12} {change:>8} '
+              f'{ref_hits:>9} {ref_misses:>10}{"  REGRESSION" if comparison["regression"] else ""}')
+
+    if not args.no_record:
+        append_history(args.history, results)
+
+    regressions = [comparison for comparison in comparisons if comparison['regression']]
+    if regressions:
+        print(f'{len(regressions)} regressions over {args.threshold:.0%}', file=sys.stderr)
+
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+def _cases(size: int, sample: int) -> list[_Case]:
+    from jsonpickle import decode, encode
+
+    from shared.models.ai.agents.tools.assistful_nla_tool import AssistfulNLATool
+    from shared.models.ai.agents.tools.utils.assistful_api_operation import AssistfulAPIOperation
+    from shared.models.ai.agents.tools.utils.assistful_openapi_spec import AssistfulOpenAPISpec
+    from shared.models.ai.tool_memory import ToolMemory
+
+    spec_dict = make_openapi_spec(size, _SERVER_URL, read_only=False)
+    spec = AssistfulOpenAPISpec.from_spec_dict(spec_dict)
+    # The operations built below for the other cases would warm the reference cache of the shared spec up.
+    operation_spec = AssistfulOpenAPISpec.from_spec_dict(spec_dict)
+
+    path_methods = [(path, method) for path in spec.paths for method in spec.get_methods_for_path(path)]
+    step = max(1, len(path_methods) // sample)
+    path_methods = path_methods[::step][:sample]
+
+    api_operations = [AssistfulAPIOperation.from_openapi_spec(spec, path, method) for path, method in path_methods]
+    encoded_operations = [encode(api_operation) for api_operation in api_operations]
+
+    # A tool response listing one record per operation of the spec.
+    tool_response = dumps({'items': [
+        {'id': f'item-{i}', 'name': f'Item {i}', 'owner': {'id': f'user-{i % 97}', 'team': f'team-{i % 13}'},
+         'tags': [f'tag-{i % 7}', f'tag-{i % 11}']}
+        for i in range(size)
+    ]})
+
+    user_query = 'Create a widget named benchmark widget for the order order-42'
+    tool_memory = ToolMemory()
+    tool_memory.index_query(user_query)
+    tool_memory.add_output(tool_response)
+    missing_field_inputs = []
+    for api_operation in api_operations:
+        _, fields_dict = AssistfulNLATool._generate_args_schema_objects(api_operation)
+        args = {name: f'item-{i}' if i % 2 else 'benchmark widget' for i, name in enumerate(fields_dict)}
+        missing_field_inputs.append((args, fields_dict))
+
+    def validate_missing_fields(missing_field_input: tuple[dict, dict]) -> None:
+        args, fields_dict = missing_field_input
+        try:
+            AssistfulNLATool._validate_missing_fields(user_query, args, fields_dict, tool_memory)
+        except Exception:
+            pass
+
+    return [
+        _Case('spec.from_spec_dict', [spec_dict], AssistfulOpenAPISpec.from_spec_dict, lambda built_spec: built_spec),
+        _Case('operation.from_openapi_spec', path_methods,
+              lambda path_method: AssistfulAPIOperation.from_openapi_spec(operation_spec, *path_method),
+              lambda _: operation_spec),
+        _Case('operation.to_typescript', api_operations, lambda api_operation: api_operation.to_typescript()),
+        _Case('tool.from_query_and_api_operation', api_operations,
+              lambda api_operation: AssistfulNLATool.from_query_and_api_operation(user_query, api_operation,
+                                                                                  tool_memory=ToolMemory())),
+        _Case('operation.jsonpickle_encode', api_operations, encode),
+        _Case('operation.jsonpickle_decode', encoded_operations, decode),
+        _Case('tool_memory.add_output', [tool_response], lambda response: ToolMemory().add_output(response)),
+        _Case('tool._validate_missing_fields', missing_field_inputs, validate_missing_fields),
+        *_dto_cases(size),
+        *_tool_read_cases(size)
+    ]
+
+
+def _dto_cases(size: int) -> list[_Case]:
+    from benchmark.fakes.fake_firestore import FakeDocumentReference, FakeDocumentSnapshot
+    from shared.models.base_dto import BaseDTOFactory
+    from shared.models.dto.agent_chat_dto import AgentChatDTO, AgentChatDTOFactory, AgentChatSchema
+    from shared.models.dto.assistant_dto import AssistantDTO, AssistantDTOFactory, AssistantSchema
+    from shared.models.dto.chat_dto import ChatDTO, ChatDTOFactory, ChatSchema
+    from shared.models.dto.chatbot_dto import ChatbotDTO, ChatbotDTOFactory, ChatbotSchema
+    from shared.models.dto.example_dto import ExampleDTO, ExampleDTOFactory, ExampleSchema
+    from shared.models.dto.org_dto import OrgDTO, OrgDTOFactory, OrgSchema
+    from shared.models.dto.tool_dto import ToolDTO, ToolDTOFactory, ToolSchema
+
+    history = [f'{"user" if i % 2 else "bot"}: Benchmark message {i} of the chat.' for i in range(size)]
+    temperament = {'temperament': 'FUN', 'temperature': 0.7, 'top_k': 40, 'top_p': 0.9}
+    documents = {
+        'agent_chat': (AgentChatDTO, AgentChatDTOFactory, AgentChatSchema,
+                       {'org_id': 'org-1', 'initiator_id': 'user-1', 'history': history}),
+        'assistant': (AssistantDTO, AssistantDTOFactory, AssistantSchema,
+                      {'org_id': 'org-1', 'context': 'You are a benchmark assistant.'}),
+        'chat': (ChatDTO, ChatDTOFactory, ChatSchema,
+                 {'org_id': 'org-1', 'initiator_id': 'user-1', 'respondent_id': 'chatbot-1', 'sender': 'user',
+                  'message': 'Hello', 'history': history, **temperament}),
+        'chatbot': (ChatbotDTO, ChatbotDTOFactory, ChatbotSchema,
+                    {'org_id': 'org-1', 'context': 'You are a benchmark chatbot.', 'cache_responses': False,
+                     **temperament}),
+        'example': (ExampleDTO, ExampleDTOFactory, ExampleSchema, {'org_id': 'org-1', 'details': 'An example.'}),
+        'org': (OrgDTO, OrgDTOFactory, OrgSchema, {'org_name': 'Benchmark', 'llm_max_concurrency': 8, 'llm_weight': 1}),
+        'tool': (ToolDTO, ToolDTOFactory, ToolSchema, {'org_id': 'org-1', 'api_operation': '{"operation_id": "op"}'})
+    }
+
+    cases = []
+    for name, (dto_type, dto_factory, schema_type, doc_dict) in documents.items():
+        doc_snapshot = FakeDocumentSnapshot(FakeDocumentReference(None, name, f'{name}-1'), doc_dict, None)
+        id_name = dto_type.id_name()
+        cases += [
+            _Case(f'dto.{name}.schema_per_doc', [doc_snapshot],
+                  lambda snapshot, schema_type=schema_type, id_name=id_name:
+                  BaseDTOFactory.doc_to_object(schema_type(), snapshot, id_name)),
+            _Case(f'dto.{name}.cached_schema', [doc_snapshot], dto_factory.create_from_doc),
+            _Case(f'dto.{name}.trusted', [doc_snapshot],
+                  lambda snapshot, dto_factory=dto_factory: dto_factory.create_from_doc(snapshot, trusted=True)),
+            _Case(f'dto.{name}.to_dict', [dto_factory.create_from_doc(doc_snapshot, trusted=True)],
+                  lambda dto: dto.to_dict())
+        ]
+
+    return cases
+
+
+def _tool_read_cases(size: int) -> list[_Case]:
+    from benchmark.harness import install_memory_firestore
+
+    if 'repository.firestore' not in sys.modules:
+        install_memory_firestore(_TOOL_READ_LATENCY_SECONDS)
+
+    import zlib
+    from concurrent.futures import ThreadPoolExecutor
+
+    from repository.repo_modules.ai import tool_repo
+    from shared.models.dto.tool_dto import ToolDTO
+
+    tool_ids = tool_repo.insert([ToolDTO(tool_id=None, api_operation=f'{{"operation_id": "op-{i}"}}')
+                                 for i in range(size)])
+
+    def get_per_document(ids: list[str]) -> list[ToolDTO]:
+        with ThreadPoolExecutor() as executor:
+            tool_snaps = list(executor.map(lambda tool_id: tool_repo.TOOL_COLLECTION.document(tool_id).get(), ids))
+
+        return [ToolDTO(tool_id=tool_snap.id, api_operation=zlib.decompress(tool_snap.get('api_operation')).decode())
+                for tool_snap in tool_snaps if tool_snap.exists]
+
+    return [
+        _Case('tool_repo.get.per_document', [tool_ids], get_per_document),
+        _Case('tool_repo.get.get_all', [tool_ids], tool_repo.get)
+    ]
+
+
+def _time_case(case: _Case, size: int, repeat: int, min_repeat_seconds: float = 0.05) -> MicroBenchmarkResult:
+    """
+    Time a case like timeit: one untimed pass warms caches up, then each repeat loops over the inputs
+    as many times as it takes to run for at least min_repeat_seconds, so fast calls are not lost in timer noise.
+    """
+    start = time.perf_counter_ns()
+    for case_input in case.inputs:
+        result = case.call(case_input)
+    warmup_seconds = (time.perf_counter_ns() - start) / 1e9
+    loops = max(1, math.ceil(min_repeat_seconds / warmup_seconds)) if warmup_seconds > 0 else 1
+
+    warm_spec = case.ref_spec(result) if case.ref_spec is not None else None
+    warm_ref_cache_info = warm_spec.ref_cache_info() if warm_spec is not None else {}
+
+    per_call_us = []
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter_ns()
+            for _ in range(loops):
+                for case_input in case.inputs:
+                    result = case.call(case_input)
+            elapsed_ns = time.perf_counter_ns() - start
+        finally:
+            gc.enable()
+
+        per_call_us.append(elapsed_ns / (loops * len(case.inputs)) / 1000)
+
+    ref_cache_info = {}
+    if case.ref_spec is not None:
+        timed_spec = case.ref_spec(result)
+        ref_cache_info = timed_spec.ref_cache_info()
+        if timed_spec is warm_spec:
+            ref_cache_info = {key: ref_cache_info[key] - warm_ref_cache_info[key] for key in ('hits', 'misses')}
+
+    return MicroBenchmarkResult(
+        name=case.name,
+        size=size,
+        calls=loops * len(case.inputs),
+        best_us=round(min(per_call_us), 2),
+        median_us=round(statistics.median(per_call_us), 2),
+        ref_cache_hits=ref_cache_info.get('hits'),
+        ref_cache_misses=ref_cache_info.get('misses')
+    )
+
+
+def _environment() -> dict[str, str]:
+    return {'machine': platform.node(), 'python': platform.python_version()}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=Path(__file__).parent,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Offline benchmark of the API. Boots the app from main.py against fake Firestore, Vertex AI and Auth services
+and a local stub of the API the agent tools call, then drives scenarios at a fixed concurrency and reports
+throughput and latency percentiles. No Google credentials or network access are needed.
+
+Run from the repository root:
+
+    python -m benchmark.run_benchmark --scenarios chat_messages,chat_continue --concurrency 16 --requests 500
+
+Latencies of the fakes are configurable, so the benchmark can isolate the overhead of the service itself
+(all latencies at 0) or approximate production round trips (the defaults).
+"""
+import argparse
+import json
+import logging
+import sys
+
+from benchmark.harness import BenchmarkOptions, FIRESTORE_MEMORY, FIRESTORE_EMULATOR, boot, run_scenario
+
+_COLUMNS = ('scenario', 'requests', 'errors', 'throughput_rps', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms',
+            'firestore_rpcs_per_request', 'llm_calls_per_request')
+
+
+def main(argv: list[str] | None = None) -> int:
+    from benchmark.scenarios import SCENARIOS
+
+    parser = argparse.ArgumentParser(description='Benchmark the API against fake external services.')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f'Comma separated scenarios to run, from: {", ".join(SCENARIOS)}')
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='Clients sending requests at once')
+    parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests sent first, one at a time')
+    parser.add_argument('--chatbots', type=int, default=5, help='Chatbots created before the scenarios')
+    parser.add_argument('--chats', type=int, default=20, help='Chats started before the scenarios')
+    parser.add_argument('--firestore', choices=(FIRESTORE_MEMORY, FIRESTORE_EMULATOR), default=FIRESTORE_MEMORY,
+                        help='In-memory Firestore, or the emulator at FIRESTORE_EMULATOR_HOST')
+    parser.add_argument('--firestore-latency-ms', type=float, default=5, help='Latency of in-memory Firestore RPCs')
+    parser.add_argument('--llm-latency-ms', type=float, default=200, help='Base latency of chat model calls')
+    parser.add_argument('--llm-jitter-ms', type=float, default=100, help='Maximum latency added to chat model calls')
+    parser.add_argument('--llm-response-words', type=int, default=40, help='Words in chat model responses')
+    parser.add_argument('--llm-rate-limits', action='store_true',
+                        help='Keep the configured LLM rate limits instead of lifting them')
+    parser.add_argument('--embedding-latency-ms', type=float, default=20, help='Latency of embedding calls')
+    parser.add_argument('--api-latency-ms', type=float, default=20, help='Latency of the stub API operations')
+    parser.add_argument('--api-operations', type=int, default=20, help='Operations in the stub API spec')
+    parser.add_argument('--json', dest='json_path', help='Also write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    scenario_names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown_names = [name for name in scenario_names if name not in SCENARIOS]
+    if unknown_names:
+        parser.error(f'Unknown scenarios: {", ".join(unknown_names)}')
+
+    logging.basicConfig(level=logging.ERROR)
+    options = BenchmarkOptions(
+        firestore=args.firestore,
+        firestore_latency_seconds=args.firestore_latency_ms / 1000,
+        llm_latency_seconds=args.llm_latency_ms / 1000,
+        llm_jitter_seconds=args.llm_jitter_ms / 1000,
+        llm_response_words=args.llm_response_words,
+        llm_rate_limits=args.llm_rate_limits,
+        embedding_latency_seconds=args.embedding_latency_ms / 1000,
+        api_latency_seconds=args.api_latency_ms / 1000,
+        api_operations=args.api_operations
+    )
+    environment = boot(options)
+
+    from benchmark.scenarios import prepare_fixtures
+    fixtures = prepare_fixtures(environment, args.chatbots, args.chats)
+
+    summaries = []
+    for name in scenario_names:
+        scenario = SCENARIOS[name]
+        result = run_scenario(
+            environment,
+            name,
+            lambda client, index: scenario(client, index, fixtures),
+            args.requests,
+            args.concurrency,
+            args.warmup
+        )
+        summaries.append(result.summary())
+        print(f'{name}: done in {result.duration_seconds:.2f}s', file=sys.stderr)
+
+    environment.stub_api.stop()
+
+    print(_format_table(summaries))
+    for summary in summaries:
+        timing = ', '.join(f'{category} {ms}ms' for category, ms in summary['server_timing_mean_ms'].items())
+        print(f'{summary["scenario"]}: statuses {summary["statuses"]}; server timing per request: {timing or "none"}')
+
+    if args.json_path:
+        with open(args.json_path, 'w') as json_file:
+            json.dump({'options': vars(args), 'results': summaries}, json_file, indent=2)
+
+    return 1 if any(summary['errors'] for summary in summaries) else 0
+
+
+def _format_table(summaries: list[dict]) -> str:
+    rows = [_COLUMNS] + [tuple('-' if summary[column] is None else str(summary[column]) for column in _COLUMNS)
+                         for summary in summaries]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(_COLUMNS))]
+    return '\n'.join('  '.join(value.rjust(width) for value, width in zip(row, widths)) for row in rows)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
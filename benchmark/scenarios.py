@@ -0,0 +1,175 @@
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from flask.testing import FlaskClient
+
+from benchmark.harness import BENCHMARK_ORG_ID, BENCHMARK_USER_ID, BenchmarkEnvironment
+
+_TEMPERAMENTS = ('TAME', 'FUN', 'LOOSE', 'WILD')
+
+_SCRAP_QUERIES = (
+    'Which orders are pending right now?',
+    'Show me the pending orders',
+    'List the overdue invoices of the account',
+    'What invoices are overdue?',
+    'Find the flagged reviews',
+    'Are there any flagged product reviews?',
+    'List the active subscriptions',
+    'Which shipments are recent?',
+    'Show the archived tickets',
+    'What coupons are featured this week?',
+    'List the shared reports',
+    'Which vendors are local?'
+)
+
+
+@dataclass(slots=True)
+class Fixtures:
+    chatbot_ids: list[str]
+    chat_ids: list[str]
+
+
+Scenario = Callable[[FlaskClient, int, Fixtures], Any]
+
+
+def prepare_fixtures(environment: BenchmarkEnvironment, chatbot_count: int, chat_count: int) -> Fixtures:
+    """
+    Create chatbots and chats through the API, for the scenarios to read and continue.
+
+    :param environment: The booted benchmark environment.
+    :param chatbot_count: The number of chatbots to create.
+    :param chat_count: The number of chats to start, spread over the chatbots.
+    :return: The IDs of the chatbots and chats.
+    """
+    client = environment.client()
+    chatbot_ids = []
+    for i in range(chatbot_count):
+        response = client.post('/api/chatbots', json={
+            'context': f'You are benchmark assistant {i}. Answer questions about the account briefly.',
+            'temperament': _TEMPERAMENTS[i % len(_TEMPERAMENTS)]
+        })
+        _raise_for_status(response)
+        chatbot_ids.append(response.get_json()['chatbot_id'])
+
+    chat_ids = []
+    for i in range(chat_count):
+        response = client.post('/api/chats/start', json={
+            'chatbot_id': chatbot_ids[i % chatbot_count],
+            'message': f'Hello, this is benchmark chat {i}.'
+        })
+        _raise_for_status(response)
+        chat_ids.append(response.get_json()['chat_id'])
+
+    # Chats are inserted in the background, so wait until all of them can be read.
+    deadline = time.monotonic() + 30
+    pending = list(chat_ids)
+    while pending and time.monotonic() < deadline:
+        pending = [chat_id for chat_id in pending if client.get(f'/api/chats/{chat_id}/messages').status_code != 200]
+        if pending:
+            time.sleep(0.05)
+
+    if pending:
+        raise RuntimeError(f'{len(pending)} benchmark chats were never written')
+
+    return Fixtures(chatbot_ids, chat_ids)
+
+
+def seed_fixtures(chatbot_count: int, chat_count: int) -> Fixtures:
+    """
+    Write chatbots and chats with fixed IDs straight to the repos of the booted app, without model calls.
+    Every process seeding the same counts gets the same IDs, so requests can go to any worker of a server.
+
+    :param chatbot_count: The number of chatbots to write.
+    :param chat_count: The number of chats to write, spread over the chatbots.
+    :return: The IDs of the chatbots and chats.
+    """
+    from repository.repo_modules import chat_repo, chatbot_repo
+    from shared.globals.enums import AccessLevels
+    from shared.models.dto.chat_dto import ChatDTO
+    from shared.models.dto.chatbot_dto import ChatbotDTO
+    from shared.models.security.user_context import UserContext
+
+    ctx = UserContext(user_id=BENCHMARK_USER_ID, org_id=BENCHMARK_ORG_ID, access_level=AccessLevels.ADMIN_OWNER)
+    fixtures = Fixtures([f'benchmark-chatbot-{i}' for i in range(chatbot_count)],
+                        [f'benchmark-chat-{i}' for i in range(chat_count)])
+
+    chatbots = []
+    for i, chatbot_id in enumerate(fixtures.chatbot_ids):
+        chatbot = ChatbotDTO(context=f'You are benchmark assistant {i}. Answer questions about the account briefly.',
+                             temperament=_TEMPERAMENTS[i % len(_TEMPERAMENTS)])
+        chatbot_repo.CHATBOTS.insert(ctx, chatbot, chatbot_id)
+        chatbots.append(chatbot)
+
+    for i, chat_id in enumerate(fixtures.chat_ids):
+        chatbot = chatbots[i % chatbot_count]
+        chat = ChatDTO(
+            initiator_id=BENCHMARK_USER_ID,
+            respondent_id=fixtures.chatbot_ids[i % chatbot_count],
+            history=[chatbot.context, f'Hello, this is benchmark chat {i}.', 'Hello! How can I help you today?'],
+            **chatbot.get_temperament_fields()
+        )
+        chat_repo.insert(ctx, chat, chat_id)
+
+    return fixtures
+
+
+def chatbot_list(client: FlaskClient, _index: int, _fixtures: Fixtures) -> Any:
+    return client.get('/api/chatbots')
+
+
+def chat_list(client: FlaskClient, index: int, fixtures: Fixtures) -> Any:
+    return client.get('/api/chats', query_string={'chatbot_id': _pick(fixtures.chatbot_ids, index)})
+
+
+def chat_messages(client: FlaskClient, index: int, fixtures: Fixtures) -> Any:
+    return client.get(f'/api/chats/{_pick(fixtures.chat_ids, index)}/messages')
+
+
+def chat_start(client: FlaskClient, index: int, fixtures: Fixtures) -> Any:
+    return client.post('/api/chats/start', json={
+        'chatbot_id': _pick(fixtures.chatbot_ids, index),
+        'message': f'Hi there, I have question number {index} about my account.'
+    })
+
+
+def chat_continue(client: FlaskClient, index: int, fixtures: Fixtures) -> Any:
+    return client.post(f'/api/chats/{_pick(fixtures.chat_ids, index)}/continue', json={
+        'message': f'Thanks. Can you tell me more about item {index}?'
+    })
+
+
+def scrap(client: FlaskClient, index: int, _fixtures: Fixtures) -> Any:
+    return client.post('/api/scrap', json={'query': _pick(_SCRAP_QUERIES, index)})
+
+
+def mixed(client: FlaskClient, index: int, fixtures: Fixtures) -> Any:
+    """
+    A read-heavy mix of the chat scenarios, picked at random with a seed of the request index.
+    """
+    scenario = random.Random(index).choices(
+        (chat_messages, chat_list, chatbot_list, chat_continue, chat_start),
+        weights=(40, 20, 10, 20, 10)
+    )[0]
+    return scenario(client, index, fixtures)
+
+
+SCENARIOS: dict[str, Scenario] = {
+    'chatbot_list': chatbot_list,
+    'chat_list': chat_list,
+    'chat_messages': chat_messages,
+    'chat_start': chat_start,
+    'chat_continue': chat_continue,
+    'scrap': scrap,
+    'mixed': mixed
+}
+
+
+def _pick(values: list | tuple, index: int) -> Any:
+    return values[index % len(values)]
+
+
+def _raise_for_status(response: Any) -> None:
+    if response.status_code >= 400:
+        raise RuntimeError(f'Benchmark setup failed with {response.status_code}: {response.get_data(as_text=True)}')
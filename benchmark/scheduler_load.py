@@ -0,0 +1,169 @@
+"""
+Noisy neighbor load test of the LLM scheduler. One org keeps every slot busy with many concurrent callers,
+while a few small orgs send calls at a steady rate, and the time each call waited for a slot is reported per org.
+The same load is also run with every call made for one org, which is how a single FIFO queue would schedule it,
+so the benefit of the per-org round robin can be seen side by side.
+
+Calls only hold their slot for a fixed time, with no model behind them, so the run measures the scheduler alone.
+The rate limits are lifted, and every org may use every slot, which is the worst case for the small orgs.
+
+Run from the repository root:
+
+    python -m benchmark.scheduler_load --noisy-callers 64 --small-orgs 4 --max-small-p99-ms 50
+
+Fails with exit code 1 if the p99 wait of the small orgs is over the budget with the per-org queues.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+
+from benchmark.harness import percentile
+
+DEFAULT_MAX_SMALL_P99_MS: float = 50
+
+_MODEL = 'benchmark-model'
+_NOISY_ORG_ID = 'noisy-org'
+_SHARED_ORG_ID = 'shared-org'
+
+
+@dataclass(slots=True)
+class LoadOptions:
+    duration_seconds: float
+    max_in_flight: int
+    call_ms: float
+    noisy_callers: int
+    small_orgs: int
+    small_interval_ms: float
+
+
+@dataclass(slots=True)
+class WaitReport:
+    mode: str
+    tenant: str
+    calls: int
+    rejected: int
+    p50_ms: float
+    p99_ms: float
+    max_ms: float
+
+
+def run_load(options: LoadOptions, per_org: bool) -> list[WaitReport]:
+    """
+    Run the noisy neighbor load against a new scheduler.
+
+    :param options: The shape of the load.
+    :param per_org: Whether each org makes calls for itself, or every call is made for one shared org.
+    :return: The wait of the calls of the noisy org and of the small orgs.
+    """
+    from shared.models.ai.scheduling.llm_scheduler import LLMCallRejectedError, LLMOrgPolicy, LLMScheduler
+
+    scheduler = LLMScheduler(max_in_flight=options.max_in_flight,
+                             max_queue_size=options.noisy_callers + options.small_orgs * 100,
+                             max_queue_wait_seconds=10,
+                             model_requests_per_minute=None,
+                             model_burst=0,
+                             org_requests_per_minute=None,
+                             org_burst=0)
+    policy = LLMOrgPolicy(max_concurrency=options.max_in_flight, weight=1)
+    scheduler.org_policy_resolver = lambda org_id: policy
+
+    waits: dict[str, list[float]] = {'noisy': [], 'small': []}
+    rejected = {'noisy': 0, 'small': 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def call(tenant: str, org_id: str) -> None:
+        try:
+            with scheduler.slot(_MODEL, org_id if per_org else _SHARED_ORG_ID) as queue_seconds:
+                time.sleep(options.call_ms / 1000)
+        except LLMCallRejectedError:
+            with lock:
+                rejected[tenant] += 1
+            return
+
+        with lock:
+            waits[tenant].append(queue_seconds)
+
+    def noisy_caller() -> None:
+        while not stop.is_set():
+            call('noisy', _NOISY_ORG_ID)
+
+    def small_org(org_id: str, executor: ThreadPoolExecutor) -> None:
+        # Open loop: calls arrive on schedule, however long the previous ones waited.
+        next_arrival = time.monotonic()
+        while not stop.is_set():
+            executor.submit(call, 'small', org_id)
+            next_arrival += options.small_interval_ms / 1000
+            time.sleep(max(0.0, next_arrival - time.monotonic()))
+
+    with ThreadPoolExecutor(max_workers=options.small_orgs * 32, thread_name_prefix='small-org') as executor:
+        threads = [threading.Thread(target=noisy_caller, daemon=True) for _ in range(options.noisy_callers)]
+        threads += [threading.Thread(target=small_org, args=(f'small-org-{i}', executor), daemon=True)
+                    for i in range(options.small_orgs)]
+        for thread in threads:
+            thread.start()
+
+        time.sleep(options.duration_seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    mode = 'per_org' if per_org else 'one_org'
+    return [_report(mode, tenant, tenant_waits, rejected[tenant]) for tenant, tenant_waits in waits.items()]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Load test the LLM scheduler with a noisy org and small orgs.')
+    parser.add_argument('--duration-seconds', type=float, default=5, help='Duration of each run')
+    parser.add_argument('--max-in-flight', type=int, default=8, help='Slots of the scheduler')
+    parser.add_argument('--call-ms', type=float, default=20, help='Time each call holds its slot')
+    parser.add_argument('--noisy-callers', type=int, default=64, help='Concurrent callers of the noisy org')
+    parser.add_argument('--small-orgs', type=int, default=4, help='Number of small orgs')
+    parser.add_argument('--small-interval-ms', type=float, default=50, help='Time between the calls of a small org')
+    parser.add_argument('--max-small-p99-ms', type=float, default=DEFAULT_MAX_SMALL_P99_MS,
+                        help='Budget of the p99 wait of the small orgs with per-org queues')
+    parser.add_argument('--json', action='store_true', help='Print the reports as JSON')
+    args = parser.parse_args(argv)
+
+    options = LoadOptions(duration_seconds=args.duration_seconds,
+                          max_in_flight=args.max_in_flight,
+                          call_ms=args.call_ms,
+                          noisy_callers=args.noisy_callers,
+                          small_orgs=args.small_orgs,
+                          small_interval_ms=args.small_interval_ms)
+    reports = run_load(options, per_org=True) + run_load(options, per_org=False)
+
+    if args.json:
+        print(json.dumps([asdict(report) for report in reports], indent=2))
+    else:
+        print(f'{"mode":<8} {"tenant":<6} {"calls":>7} {"rejected":>8} {"p50_ms":>8} {"p99_ms":>8} {"max_ms":>8}')
+        for report in reports:
+            print(f'{report.mode:<8} {report.tenant:<6} {report.calls:>7} {report.rejected:>8} '
+                  f'{report.p50_ms:>8.1f} {report.p99_ms:>8.1f} {report.max_ms:>8.1f}')
+
+    small_report = next(report for report in reports if report.mode == 'per_org' and report.tenant == 'small')
+    if small_report.p99_ms > args.max_small_p99_ms or small_report.rejected:
+        print(f'The small orgs waited {small_report.p99_ms:.1f}ms at p99, with {small_report.rejected} rejected calls. '
+              f'The budget is {args.max_small_p99_ms:.1f}ms', file=sys.stderr)
+        return 1
+
+    return 0
+
+
+def _report(mode: str, tenant: str, waits: list[float], rejected: int) -> WaitReport:
+    waits = sorted(waits)
+    return WaitReport(mode=mode,
+                      tenant=tenant,
+                      calls=len(waits),
+                      rejected=rejected,
+                      p50_ms=round(1000 * percentile(waits, 50), 2),
+                      p99_ms=round(1000 * percentile(waits, 99), 2),
+                      max_ms=round(1000 * waits[-1], 2) if waits else 0.0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""
+Startup profile of the API. Boots the app in a fresh interpreter with -X importtime, like a cold App Engine instance,
+sends it one request that needs no model, then one that does, and reports where the import time went.
+
+Run from the repository root:
+
+    python -m benchmark.startup_profile --budget-seconds 1.5
+
+Fails with exit code 1 if the time to the first request is over the budget, or if the first request loaded
+any of the heavy AI modules, which should only be imported by the first request that uses them.
+Timings include the overhead of -X importtime, so they are somewhat higher than in production.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Any
+
+DEFAULT_BUDGET_SECONDS: float = 1.5
+DEFAULT_HEAVY_MODULES: tuple[str, ...] = ('langchain', 'vertexai', 'chromadb', 'numpy')
+
+_REPO_ROOT = Path(__file__).parent.parent
+_MARKER = 'startup-profile:'
+_FIRST_REQUEST = 'first-request'
+
+
+@dataclass(slots=True)
+class ImportTiming:
+    module: str
+    depth: int
+    self_us: int
+    cumulative_us: int
+
+
+@dataclass(slots=True)
+class StartupProfile:
+    time_to_first_request_seconds: float
+    boot_seconds: float
+    first_request_seconds: float
+    first_ai_request_seconds: float
+    startup_imports: list[ImportTiming] = field(default_factory=list)
+    ai_imports: list[ImportTiming] = field(default_factory=list)
+    loaded_heavy_modules: list[str] = field(default_factory=list)
+
+    def top_cumulative(self, count: int) -> list[ImportTiming]:
+        return sorted(self.startup_imports, key=lambda timing: timing.cumulative_us, reverse=True)[:count]
+
+    def self_time_by_package(self, imports: list[ImportTiming]) -> dict[str, int]:
+        """
+        :param imports: The imports to total.
+        :return: The total self import time of each top level package, in microseconds, slowest first.
+        """
+        totals: dict[str, int] = defaultdict(int)
+        for timing in imports:
+            totals[timing.module.split('.')[0]] += timing.self_us
+
+        return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def profile_startup(heavy_modules: tuple[str, ...]) -> StartupProfile:
+    """
+    Boot the app in a new interpreter and time its imports and first requests.
+
+    :param heavy_modules: The top level modules the first request must not load.
+    :return: The profile of the startup.
+    """
+    environment = {**os.environ, 'PYTHONUNBUFFERED': '1'}
+    command = [sys.executable, '-X', 'importtime', '-m', 'benchmark.startup_profile', '--child',
+               '--heavy-modules', ','.join(heavy_modules)]
+
+    # The import times are written to a file rather than a pipe, which they would fill up while stdout is read.
+    with tempfile.TemporaryFile('w+') as stderr_file:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=_REPO_ROOT, env=environment, stdout=subprocess.PIPE,
+                                   stderr=stderr_file, text=True)
+
+        # The parent times the first request from the process start, so interpreter startup is included.
+        time_to_first_request = None
+        result = None
+        for line in process.stdout:
+            if not line.startswith(_MARKER):
+                continue
+
+            payload = line[len(_MARKER):].strip()
+            if payload == _FIRST_REQUEST:
+                time_to_first_request = time.perf_counter() - start
+            else:
+                result = json.loads(payload)
+
+        process.wait()
+        stderr_file.seek(0)
+        stderr = stderr_file.read()
+
+    if process.returncode != 0 or result is None or time_to_first_request is None:
+        raise RuntimeError(f'The startup profile failed with exit code {process.returncode}:\n{stderr}')
+
+    startup_lines, _, ai_lines = stderr.partition(f'{_MARKER} {_FIRST_REQUEST}\n')
+    return StartupProfile(
+        time_to_first_request_seconds=round(time_to_first_request, 3),
+        boot_seconds=result['boot_seconds'],
+        first_request_seconds=result['first_request_seconds'],
+        first_ai_request_seconds=result['first_ai_request_seconds'],
+        startup_imports=_parse_import_times(startup_lines),
+        ai_imports=_parse_import_times(ai_lines),
+        loaded_heavy_modules=result['loaded_heavy_modules']
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Profile the imports and time to first request of the API.')
+    parser.add_argument('--budget-seconds', type=float, default=DEFAULT_BUDGET_SECONDS,
+                        help='Maximum time from process start to the first response')
+    parser.add_argument('--heavy-modules', default=','.join(DEFAULT_HEAVY_MODULES),
+                        help='Comma separated top level modules the first request must not load')
+    parser.add_argument('--top', type=int, default=15, help='Slowest imports and packages listed')
+    parser.add_argument('--json', dest='json_path', help='Also write the profile as JSON to this path')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    heavy_modules = tuple(module.strip() for module in args.heavy_modules.split(',') if module.strip())
+    if args.child:
+        _run_child(heavy_modules)
+        return 0
+
+    profile = profile_startup(heavy_modules)
+
+    print(f'time to first request: {profile.time_to_first_request_seconds:.3f}s '
+          f'(budget {args.budget_seconds:.3f}s)')
+    print(f'boot: {profile.boot_seconds:.3f}s, first request: {profile.first_request_seconds:.3f}s, '
+          f'first AI request: {profile.first_ai_request_seconds:.3f}s')
+
+    print(f'\n{"slowest imports before the first request":<60} {"self_ms":>9} {"cumulative_ms":>14}')
+    for timing in profile.top_cumulative(args.top):
+        print(f'{"  " * timing.depth + timing.module:<60} {timing.self_us / 1000:>9.1f} '
+              f'{timing.cumulative_us / 1000:>14.1f}')
+
+    for title, imports in (('before the first request', profile.startup_imports),
+                           ('deferred to the first AI request', profile.ai_imports)):
+        print(f'\n{"self import time by package, " + title:<60} {"ms":>9}')
+        for package, self_us in list(profile.self_time_by_package(imports).items())[:args.top]:
+            print(f'{package:<60} {self_us / 1000:>9.1f}')
+
+    if args.json_path:
+        with open(args.json_path, 'w') as json_file:
+            json.dump({'budget_seconds': args.budget_seconds, 'profile': asdict(profile)}, json_file, indent=2)
+
+    failures = []
+    if profile.time_to_first_request_seconds > args.budget_seconds:
+        failures.append(f'time to first request {profile.time_to_first_request_seconds:.3f}s '
+                        f'is over the budget of {args.budget_seconds:.3f}s')
+    if profile.loaded_heavy_modules:
+        failures.append(f'the first request loaded {", ".join(profile.loaded_heavy_modules)}')
+
+    for failure in failures:
+        print(f'FAILED: {failure}', file=sys.stderr)
+
+    return 1 if failures else 0
+
+
+def _run_child(heavy_modules: tuple[str, ...]) -> None:
+    """
+    Boot the app, send a request that needs no model, then a chat opening, which needs one.
+    Prints a marker to stdout and stderr after the first request, so the parent can split the import times.
+    """
+    import contextlib
+    import logging
+
+    from benchmark.harness import BenchmarkOptions, boot
+
+    logging.basicConfig(level=logging.ERROR)
+
+    start = time.perf_counter()
+    # Instances boot without any model, so the fake Vertex AI is only installed for the first AI request.
+    environment = boot(BenchmarkOptions(firestore_latency_seconds=0, llm_latency_seconds=0, llm_jitter_seconds=0,
+                                        embedding_latency_seconds=0, api_latency_seconds=0, install_vertex_ai=False))
+    boot_seconds = time.perf_counter() - start
+
+    client = environment.client()
+    start = time.perf_counter()
+    _raise_for_status(client.get('/api/chatbots'))
+    first_request_seconds = time.perf_counter() - start
+
+    loaded_heavy_modules = [module for module in heavy_modules if module in sys.modules]
+    print(f'{_MARKER} {_FIRST_REQUEST}', flush=True)
+    print(f'{_MARKER} {_FIRST_REQUEST}', file=sys.stderr, flush=True)
+
+    start = time.perf_counter()
+    environment.vertex_ai.install()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        response = client.post('/api/chatbots', json={'context': 'You are a startup profile assistant.',
+                                                      'temperament': 'TAME'})
+        _raise_for_status(response)
+        _raise_for_status(client.post('/api/chats/start', json={'chatbot_id': response.get_json()['chatbot_id'],
+                                                                'message': 'Hello'}))
+    first_ai_request_seconds = time.perf_counter() - start
+
+    environment.stub_api.stop()
+    print(_MARKER + ' ' + json.dumps({
+        'boot_seconds': round(boot_seconds, 3),
+        'first_request_seconds': round(first_request_seconds, 3),
+        'first_ai_request_seconds': round(first_ai_request_seconds, 3),
+        'loaded_heavy_modules': loaded_heavy_modules
+    }), flush=True)
+
+
+def _parse_import_times(lines: str) -> list[ImportTiming]:
+    """
+    Parse -X importtime lines like 'import time:       540 |       1230 |   package.module',
+    where the indentation of the module name is its depth in the import chain.
+    """
+    timings = []
+    for line in lines.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        module = name.lstrip()
+        timings.append(ImportTiming(
+            module=module.strip(),
+            depth=(len(name) - len(module) - 1) // 2,
+            self_us=int(self_us),
+            cumulative_us=int(cumulative_us)
+        ))
+
+    return timings
+
+
+def _raise_for_status(response: Any) -> None:
+    if response.status_code >= 400:
+        raise RuntimeError(f'Startup profile request failed with {response.status_code}: '
+                           f'{response.get_data(as_text=True)}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
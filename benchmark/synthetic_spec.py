@@ -0,0 +1,105 @@
+import random
+from typing import Any
+
+_RESOURCES = ('widget', 'order', 'invoice', 'customer', 'shipment', 'ticket', 'product', 'review', 'coupon', 'refund',
+              'vendor', 'payment', 'address', 'report', 'subscription', 'warehouse', 'campaign', 'message', 'team',
+              'project')
+_ADJECTIVES = ('active', 'archived', 'recent', 'pending', 'flagged', 'featured', 'overdue', 'shared', 'draft', 'local')
+_QUERY_PARAMS = ('limit', 'page', 'sort', 'status', 'since', 'owner', 'region', 'tag')
+
+
+def make_openapi_spec(operation_count: int,
+                      server_url: str,
+                      read_only: bool = True,
+                      seed: int = 0) -> dict[str, Any]:
+    """
+    Generate a valid OpenAPI 3 spec with the given number of operations, for benchmarks.
+    Operations get distinct paths, IDs and descriptions made of resource names, and a few optional query parameters.
+    Unless read_only is set, a third of the operations read one resource by a required path parameter,
+    and a third create resources from JSON request bodies referencing component schemas.
+
+    :param operation_count: The number of operations in the spec.
+    :param server_url: The URL of the server of the spec.
+    :param read_only: Whether every operation is a GET, so agents using the spec never change data.
+    :param seed: The seed of the generator, for reproducible specs.
+    :return: The spec.
+    """
+    rng = random.Random(seed)
+    paths: dict[str, dict[str, Any]] = {}
+    for index in range(operation_count):
+        resource = _RESOURCES[index % len(_RESOURCES)]
+        adjective = _ADJECTIVES[index // len(_RESOURCES) % len(_ADJECTIVES)]
+        method = 'get' if read_only or index % 3 else 'post'
+        by_id = not read_only and index % 3 == 1
+        name = f'{adjective}_{resource}s_{index}'
+        path = f'/{name}/{{{resource}_id}}' if by_id else f'/{name}'
+        operation_id = f'{"list" if method == "get" else "create"}{adjective.title()}{resource.title()}s{index}'
+
+        operation: dict[str, Any] = {
+            'operationId': operation_id,
+            'summary': f'{"List" if method == "get" else "Create"} {adjective} {resource}s',
+            'description': f'{"Lists" if method == "get" else "Creates"} the {adjective} {resource}s of the account, '
+                           f'for questions about {resource}s that are {adjective}.',
+            'responses': {
+                '200': {
+                    'description': 'OK',
+                    'content': {'application/json': {'schema': {'$ref': '#/components/schemas/Items'}}}
+                }
+            }
+        }
+
+        if method == 'get':
+            operation['parameters'] = [
+                {
+                    'name': query_param,
+                    'in': 'query',
+                    'required': False,
+                    'description': f'The {query_param} of the {resource}s to list',
+                    'schema': {'type': 'integer' if query_param in ('limit', 'page') else 'string'}
+                }
+                for query_param in rng.sample(_QUERY_PARAMS, rng.randint(0, 3))
+            ]
+            if by_id:
+                operation['parameters'].append({
+                    'name': f'{resource}_id',
+                    'in': 'path',
+                    'required': True,
+                    'description': f'The identifier of the {resource}',
+                    'schema': {'type': 'string'}
+                })
+        else:
+            operation['requestBody'] = {
+                'required': True,
+                'content': {'application/json': {'schema': {'$ref': f'#/components/schemas/{resource.title()}Input'}}}
+            }
+
+        paths[path] = {method: operation}
+
+    schemas: dict[str, Any] = {
+        'Items': {
+            'type': 'object',
+            'properties': {
+                'items': {'type': 'array', 'items': {'type': 'object'}},
+                'count': {'type': 'integer'}
+            }
+        }
+    }
+    if not read_only:
+        for resource in _RESOURCES:
+            schemas[f'{resource.title()}Input'] = {
+                'type': 'object',
+                'required': ['name'],
+                'properties': {
+                    'name': {'type': 'string', 'description': f'The name of the {resource}'},
+                    'notes': {'type': 'string', 'description': f'Notes about the {resource}'},
+                    'priority': {'type': 'integer', 'description': f'The priority of the {resource}'}
+                }
+            }
+
+    return {
+        'openapi': '3.0.3',
+        'info': {'title': 'Benchmark API', 'version': '1.0'},
+        'servers': [{'url': server_url}],
+        'paths': paths,
+        'components': {'schemas': schemas}
+    }
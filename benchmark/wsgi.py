@@ -0,0 +1,24 @@
+"""
+The app booted against the benchmark fakes, for serving it with the production server configuration in load tests:
+
+    gunicorn -c gunicorn.conf.py benchmark.wsgi:app
+
+Each worker process boots its own fakes and seeds the same chatbots and chats, so any worker can serve any request.
+The fixture counts and the latencies of the fakes are read from the BENCHMARK_ environment variables below.
+"""
+import logging
+import os
+
+from benchmark.harness import BenchmarkOptions, boot
+from benchmark.scenarios import seed_fixtures
+
+logging.basicConfig(level=logging.ERROR)
+
+environment = boot(BenchmarkOptions(
+    firestore_latency_seconds=float(os.getenv('BENCHMARK_FIRESTORE_LATENCY_MS', 5)) / 1000,
+    llm_latency_seconds=float(os.getenv('BENCHMARK_LLM_LATENCY_MS', 200)) / 1000,
+    llm_jitter_seconds=float(os.getenv('BENCHMARK_LLM_JITTER_MS', 100)) / 1000
+))
+fixtures = seed_fixtures(int(os.getenv('BENCHMARK_CHATBOTS', 5)), int(os.getenv('BENCHMARK_CHATS', 20)))
+
+app = environment.app
@@ -1,14 +1,20 @@
 from enum import Enum
+from hashlib import sha1
 from http import HTTPStatus
 from typing import Any, Type, TypeVar
 
 import flask
-from flask import make_response as old_make_response, Response, request
+from flask import make_response as old_make_response, Response, current_app, request
 
 from provider.provider_modules.auth_provider import get_logged_in_user
+from shared.globals.constants import COMPRESSION_ENCODINGS
 from shared.globals.enums import CustomClaimKeys, AccessLevels
+from shared.models.serializable import Serializable
 from shared.models.security.user_context import UserContext
 
+# Headers of a 200 OK response that a 304 Not Modified response replacing it must also send.
+_NOT_MODIFIED_HEADERS = ('Cache-Control', 'ETag', 'Vary')
+
 
 def create_user_context() -> UserContext:
     """
@@ -24,21 +30,81 @@ def create_user_context() -> UserContext:
     return UserContext(user_id=user_id, org_id=org_id, access_level=access_level)
 
 
-def make_response(data: dict | Any = None, status: HTTPStatus = HTTPStatus.OK) -> tuple[dict | list, HTTPStatus] | Response:
+def make_response(
+        data: dict | Any = None,
+        status: HTTPStatus = HTTPStatus.OK,
+        headers: dict[str, str] | None = None
+) -> tuple[dict | list, HTTPStatus] | tuple[dict | list, HTTPStatus, dict[str, str]] | Response:
     """
     Create a Flask response object.
 
-    :param data: The response data as a dictionary or any other object.
+    :param data: The response data as a dictionary, a Serializable object, or any other object.
     :param status: The HTTP status code for the response (default: 200 OK).
-    :return: A tuple containing the response data and the HTTP status code, or a Flask response object.
+    :param headers: Optional headers to add to the response.
+    :return: A tuple containing the response data, the HTTP status code and any headers, or a Flask response object.
     """
 
     if isinstance(data, (dict, list)):
-        return data if data is not None else {}, status
+        response = data if data is not None else {}, status
+    elif isinstance(data, Serializable):
+        response = data.to_dict(), status
     elif data:
-        return data.__dict__, status
+        response = data.__dict__, status
     else:
-        return old_make_response({}, status)
+        return old_make_response({}, status, headers or {})
+
+    return response + (headers,) if headers else response
+
+
+def etag_not_modified(etag: str) -> bool:
+    """
+    Check whether the client already has the representation with the given entity tag.
+    Compressed responses carry the tag with an encoding suffix, so those variants match too.
+
+    :param etag: The unquoted entity tag of the current representation.
+    :return: True if the If-None-Match header of the request matches the entity tag.
+    """
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return False
+
+    return if_none_match.contains(etag) or any(
+        if_none_match.contains(f'{etag}-{encoding}') for encoding in COMPRESSION_ENCODINGS
+    )
+
+
+def masked_etag(etag: str) -> str:
+    """
+    Mix the field mask of the request into an entity tag computed from the data of a representation,
+    since masked and unmasked representations of the same data differ.
+
+    :param etag: The unquoted entity tag of the data.
+    :return: The unquoted entity tag of the representation served for the request.
+    """
+    mask = request.headers.get(current_app.config['RESTX_MASK_HEADER'])
+    if not mask:
+        return etag
+
+    return sha1(f'{etag}:{mask}'.encode()).hexdigest()
+
+
+def not_modified(etag: str, replaced_response: Response | None = None) -> Response:
+    """
+    Create a 304 Not Modified response for the given entity tag.
+    The headers a cache needs to update its stored response are copied from the response it replaces, if any.
+
+    :param etag: The unquoted entity tag of the current representation.
+    :param replaced_response: The 200 OK response that would have been sent instead.
+    :return: A Flask response object without a body.
+    """
+    response = Response(status=HTTPStatus.NOT_MODIFIED)
+    response.set_etag(etag)
+    if replaced_response is not None:
+        for header in _NOT_MODIFIED_HEADERS:
+            if header in replaced_response.headers:
+                response.headers[header] = replaced_response.headers[header]
+
+    return response
 
 
 def from_uri(query_param_names: str | tuple[str, ...]) -> str | tuple[str, ...]:
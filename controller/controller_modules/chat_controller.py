@@ -2,10 +2,13 @@ from http import HTTPStatus
 
 from flask_restx import Resource
 
-from controller.controller_helpers import make_response, create_user_context, from_body, from_uri
+from controller.controller_helpers import make_response, create_user_context, from_body, from_uri, etag_not_modified, \
+    not_modified, masked_etag
+from controller.idempotency import idempotent, IDEMPOTENCY_KEY_DESCRIPTION
 from controller.request_validation.auth_validation import signed_in
+from controller.response_marshalling import fast_marshal_with
 from provider.provider_modules.ai import chat_provider
-from shared.globals.constants import INSUFFICIENT_ACCESS, API_KEY
+from shared.globals.constants import INSUFFICIENT_ACCESS, API_KEY, IDEMPOTENCY_KEY_HEADER
 from shared.globals.enums import AccessLevels
 from shared.models.dto.chat_dto import ChatDTO
 from shared.models.dto.chatbot_dto import ChatbotDTO
@@ -20,7 +23,7 @@ class ChatList(Resource):
 
     @chat_ns.doc('get_chat_list', security=API_KEY)
     @chat_ns.param(ChatbotDTO.id_name(), 'The identifier of the chatbot in the chat', _in='query', required=False)
-    @chat_ns.marshal_list_with(ChatControls.Models.chat_response)
+    @fast_marshal_with(chat_ns, ChatControls.Models.chat_response, as_list=True)
     @signed_in(required_access_level=AccessLevels.ADMIN)
     def get(self):
         """
@@ -35,12 +38,13 @@ class ChatList(Resource):
 
 @chat_ns.route('/<string:chat_id>/messages')
 @chat_ns.response(HTTPStatus.NOT_FOUND, 'Chat not found')
+@chat_ns.response(HTTPStatus.NOT_MODIFIED, 'Chat messages not modified')
 @chat_ns.response(HTTPStatus.UNAUTHORIZED, INSUFFICIENT_ACCESS)
 @chat_ns.param(ChatDTO.id_name(), 'The chat identifier')
 class ChatMessageList(Resource):
 
     @chat_ns.doc('get_chat_message_list', security=API_KEY)
-    @chat_ns.marshal_list_with(ChatControls.Models.chat_message_response)
+    @fast_marshal_with(chat_ns, ChatControls.Models.chat_message_response, as_list=True)
     @signed_in(required_access_level=AccessLevels.ADMIN)
     def get(self, chat_id: str):
         """
@@ -48,19 +52,27 @@ class ChatMessageList(Resource):
         """
         ctx = create_user_context()
 
-        messages = chat_provider.get_chat_messages(ctx, chat_id)
-        return make_response(messages)
+        messages, etag = chat_provider.get_chat_messages_with_etag(ctx, chat_id)
+        etag = masked_etag(etag)
+        if etag_not_modified(etag):
+            return not_modified(etag)
+
+        return make_response(messages, headers={'ETag': f'"{etag}"'})
 
 
 @chat_ns.route('/start')
 @chat_ns.response(HTTPStatus.UNAUTHORIZED, INSUFFICIENT_ACCESS)
+@chat_ns.response(HTTPStatus.CONFLICT, 'A request with the same idempotency key is still in progress')
+@chat_ns.response(HTTPStatus.UNPROCESSABLE_ENTITY, 'The idempotency key was already used for a different request')
 class ChatStart(Resource):
 
     @chat_ns.doc('start_chat', security=API_KEY)
+    @chat_ns.param(IDEMPOTENCY_KEY_HEADER, IDEMPOTENCY_KEY_DESCRIPTION, _in='header', required=False)
     @chat_ns.expect(ChatControls.Models.chat_start_post_request, validate=True)
-    @chat_ns.marshal_with(ChatControls.Models.chat_message_start_response)
+    @fast_marshal_with(chat_ns, ChatControls.Models.chat_message_start_response)
     @chat_ns.response(HTTPStatus.CREATED, 'Chat started')
     @signed_in(required_access_level=AccessLevels.ADMIN)
+    @idempotent
     def post(self):
         """
         Starts a new chat with a chatbot
@@ -74,13 +86,17 @@ class ChatStart(Resource):
 
 @chat_ns.route('/<string:chat_id>/continue')
 @chat_ns.response(HTTPStatus.UNAUTHORIZED, INSUFFICIENT_ACCESS)
+@chat_ns.response(HTTPStatus.CONFLICT, 'A request with the same idempotency key is still in progress')
+@chat_ns.response(HTTPStatus.UNPROCESSABLE_ENTITY, 'The idempotency key was already used for a different request')
 class ChatContinue(Resource):
 
     @chat_ns.doc('continue_chat', security=API_KEY)
+    @chat_ns.param(IDEMPOTENCY_KEY_HEADER, IDEMPOTENCY_KEY_DESCRIPTION, _in='header', required=False)
     @chat_ns.expect(ChatControls.Models.chat_continue_post_request, validate=True)
-    @chat_ns.marshal_with(ChatControls.Models.chat_message_response)
+    @fast_marshal_with(chat_ns, ChatControls.Models.chat_message_response)
     @chat_ns.response(HTTPStatus.CREATED, 'Chat continued')
     @signed_in(required_access_level=AccessLevels.ADMIN)
+    @idempotent
     def post(self, chat_id: str):
         """
         Continues a started chat with a chatbot
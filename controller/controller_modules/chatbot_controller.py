@@ -40,8 +40,9 @@ class ChatbotList(Resource):
         """
         ctx = create_user_context()
 
-        chatbot_context, temperament_str = from_body(('context', 'temperament'))
+        chatbot_context, temperament_str, cache_responses_str = from_body(('context', 'temperament', 'cache_responses'))
         temperament = validate_enum('temperament', temperament_str, ChatbotTemperaments)
+        cache_responses = cache_responses_str == str(True)
 
-        chatbot_id = chatbot_repo.insert(ctx, chatbot_context, temperament)
+        chatbot_id = chatbot_repo.insert(ctx, chatbot_context, temperament, cache_responses)
         return make_response(ChatbotDTO(chatbot_id=chatbot_id), HTTPStatus.CREATED)
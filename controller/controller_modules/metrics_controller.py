@@ -0,0 +1,27 @@
+from http import HTTPStatus
+
+from flask import Response
+from flask_restx import Resource
+
+from controller.request_validation.auth_validation import signed_in_or_bearer_token
+from provider.provider_modules import metrics_provider
+from shared.globals.constants import INSUFFICIENT_ACCESS, API_KEY, METRICS_TOKEN
+from shared.globals.enums import AccessLevels
+from shared.models.rest.metrics_controls import MetricsControls
+
+metrics_ns = MetricsControls.namespace
+
+
+@metrics_ns.route('')
+@metrics_ns.response(HTTPStatus.UNAUTHORIZED, INSUFFICIENT_ACCESS)
+class Metrics(Resource):
+
+    @metrics_ns.doc('get_metrics', security=API_KEY)
+    @metrics_ns.response(HTTPStatus.OK, 'Metrics in the Prometheus text format')
+    @signed_in_or_bearer_token(METRICS_TOKEN, required_access_level=AccessLevels.OWNER)
+    def get(self):
+        """
+        Get the service metrics in the Prometheus text format. Scrapers authenticate with the metrics bearer token
+        """
+        return Response(metrics_provider.get_metrics_text(), HTTPStatus.OK,
+                        mimetype='text/plain', content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -7,7 +7,6 @@ from controller.request_validation.auth_validation import signed_in
 from provider.provider_modules import org_provider
 from shared.globals.constants import INSUFFICIENT_ACCESS, API_KEY
 from shared.globals.enums import AccessLevels
-from shared.models.ai.agents import assistful_agent
 from shared.models.rest.org_controls import OrgControls
 
 org_ns = OrgControls.namespace
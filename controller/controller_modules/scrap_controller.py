@@ -2,7 +2,7 @@ from http import HTTPStatus
 
 from flask_restx import Resource
 
-from controller.controller_helpers import make_response, from_body
+from controller.controller_helpers import make_response, from_body, create_user_context
 from controller.request_validation.auth_validation import signed_in
 from provider.provider_modules.ai import scrap_provider
 from shared.globals.constants import INSUFFICIENT_ACCESS, API_KEY
@@ -28,9 +28,11 @@ class Scrap(Resource):
         Scrap with a test agent
         """
 
-        query = from_body('query')
-        query_response = scrap_provider.query_test_agent(query)
-        return make_response({'query_response': query_response}, HTTPStatus.OK)
+        ctx = create_user_context()
+
+        query, chat_id = from_body(('query', 'chat_id'))
+        chat_id, query_response = scrap_provider.query_test_agent(ctx, query, chat_id)
+        return make_response({'chat_id': chat_id, 'query_response': query_response}, HTTPStatus.OK)
 
 
 @scrap_ns.route('/vector-store')
@@ -49,17 +51,21 @@ class ScrapVectorStoreClear(Resource):
         return make_response(status=HTTPStatus.NO_CONTENT)
 
 
-@scrap_ns.route('/memory')
+@scrap_ns.route('/memory/<string:chat_id>')
+@scrap_ns.response(HTTPStatus.NOT_FOUND, 'Agent chat not found')
 @scrap_ns.response(HTTPStatus.UNAUTHORIZED, INSUFFICIENT_ACCESS)
+@scrap_ns.param('chat_id', 'The agent chat identifier')
 class ScrapMemoryClear(Resource):
 
     @scrap_ns.doc('clear_scrap_memory', security=API_KEY)
     @scrap_ns.response(HTTPStatus.NO_CONTENT, 'Memory cleared')
     @signed_in(required_access_level=AccessLevels.ADMIN)
-    def delete(self):
+    def delete(self, chat_id: str):
         """
-        Clear the chat memory of the test agent
+        Clear the chat memory of the test agent for an agent chat
         """
 
-        scrap_provider.clear_memory()
+        ctx = create_user_context()
+
+        scrap_provider.clear_memory(ctx, chat_id)
         return make_response(status=HTTPStatus.NO_CONTENT)
@@ -0,0 +1,40 @@
+from http import HTTPStatus
+
+import flask
+from flask_restx import Resource
+
+from controller.controller_helpers import make_response, create_user_context, from_uri, validate_enum
+from controller.request_validation.auth_validation import signed_in
+from controller.response_marshalling import fast_marshal_with
+from provider.provider_modules import usage_provider
+from shared.globals.constants import INSUFFICIENT_ACCESS, API_KEY, USAGE_REPORT_MAX_LIMIT
+from shared.globals.enums import AccessLevels, UsageScopes
+from shared.models.rest.usage_controls import UsageControls
+
+usage_ns = UsageControls.namespace
+
+
+@usage_ns.route('')
+@usage_ns.response(HTTPStatus.UNAUTHORIZED, INSUFFICIENT_ACCESS)
+class UsageReport(Resource):
+
+    @usage_ns.doc('get_usage_report', security=API_KEY)
+    @usage_ns.param('scope', 'The scope to report: ORG, ASSISTANT, CHATBOT or CHAT. The default value is ORG. '
+                             'OWNER users get the usage of every org for the ORG scope.', _in='query', required=False)
+    @usage_ns.param('limit', f'The maximum number of subjects to report, up to {USAGE_REPORT_MAX_LIMIT}. '
+                             'The default value is 20.', _in='query', required=False)
+    @fast_marshal_with(usage_ns, UsageControls.Models.usage_response, as_list=True)
+    @signed_in(required_access_level=AccessLevels.ADMIN)
+    def get(self):
+        """
+        Gets the LLM usage of the subjects of a scope, most tokens first
+        """
+        ctx = create_user_context()
+
+        scope_str, limit_str = from_uri(('scope', 'limit'))
+        scope = validate_enum('scope', scope_str, UsageScopes) or UsageScopes.ORG
+        if limit_str is not None and not limit_str.isdigit():
+            flask.abort(HTTPStatus.BAD_REQUEST, 'Invalid limit, expected a positive integer')
+
+        usage_report = usage_provider.get_usage_report(ctx, scope, int(limit_str or 20))
+        return make_response(usage_report)
@@ -0,0 +1,26 @@
+from http import HTTPStatus
+
+from flask import Flask, jsonify
+
+from provider.provider_modules import warmup_provider
+
+
+def init_warmup_routes(app: Flask) -> None:
+    """
+    :param app: The Flask application object.
+    :return: None
+
+    This method adds the warm-up routes to the Flask application, outside the API blueprint and without auth:
+
+    1. `/_ah/warmup`, which App Engine requests when it starts an instance, if the `warmup` inbound service is enabled
+       in app.yaml, before sending it traffic.
+    2. `/warmup`, the same for other hosts, to call from a startup probe or a post-start hook.
+
+    Both run the warm-up of the warmup provider within its time budget, and answer 200 OK with its report.
+    The warm-up only does its work once per process, so the routes are cheap to call again.
+    """
+
+    @app.route('/_ah/warmup')
+    @app.route('/warmup')
+    def warmup():
+        return jsonify(warmup_provider.warm_up()), HTTPStatus.OK
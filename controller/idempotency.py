@@ -0,0 +1,225 @@
+import logging
+import threading
+import time
+from functools import wraps
+from hashlib import sha256
+from http import HTTPStatus
+from typing import Any, Callable
+
+import flask
+from flask import Response, request
+
+from provider.provider_modules import auth_provider
+from repository.repo_modules import idempotency_repo
+from shared.caching import LRUTTLCache
+from shared.globals.constants import IDEMPOTENCY_KEY_HEADER, IDEMPOTENCY_KEY_MAX_LENGTH, IDEMPOTENCY_TTL_SECONDS, \
+    IDEMPOTENCY_MAX_KEYS, IDEMPOTENCY_WAIT_SECONDS, IDEMPOTENCY_POLL_SECONDS
+
+IDEMPOTENCY_KEY_DESCRIPTION = 'A unique key for the request. Retries with the same key get the response of the ' \
+                              'first request instead of being processed again'
+
+logger = logging.getLogger(__name__)
+
+# Completed responses, by user ID and idempotency key, with the fingerprint of the request that produced them.
+# Keys are claimed and completed in Firestore, so retries landing on any instance see them. This cache is only a front.
+_completed = LRUTTLCache('idempotency', IDEMPOTENCY_MAX_KEYS, IDEMPOTENCY_TTL_SECONDS)
+
+# Requests being processed in this process, by user ID and idempotency key, with their fingerprint and an event
+# set when they end. Retries in the same process wait on the event instead of polling Firestore.
+_in_flight: dict[tuple[str, str], tuple[str, threading.Event]] = {}
+_in_flight_lock = threading.Lock()
+
+
+def idempotent(func_to_wrap: Callable) -> Callable:
+    """
+    Decorator that makes a POST endpoint idempotent for requests with an Idempotency-Key header.
+    The first request with a key claims it in Firestore, is processed, and its successful response is kept
+    for IDEMPOTENCY_TTL_SECONDS. Retries with the same key, on any instance, get that response back, and retries
+    arriving while the first request is still being processed wait for it instead of being processed again.
+    Keys are scoped to the signed in user, so this decorator must be applied below signed_in.
+
+    Requests without the header are processed as usual. Error responses are not kept, so a failed request
+    can be retried with the same key.
+
+    :param func_to_wrap: The endpoint function.
+    :return: The wrapped function.
+    :raises flask.abort(400): If the key is too long.
+    :raises flask.abort(409): If the first request with the key is still being processed after the wait.
+    :raises flask.abort(422): If the key was already used for a different request.
+    """
+
+    @wraps(func_to_wrap)
+    def inner_func(*args, **kwargs):
+        idempotency_key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+        if not idempotency_key:
+            return func_to_wrap(*args, **kwargs)
+
+        if len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            flask.abort(HTTPStatus.BAD_REQUEST,
+                        f'The {IDEMPOTENCY_KEY_HEADER} header must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters')
+
+        user_id = auth_provider.get_logged_in_user().uid
+        cache_key = (user_id, idempotency_key)
+        fingerprint = _fingerprint_request()
+
+        while True:
+            completed = _completed.get(cache_key)
+            if completed is not None:
+                completed_fingerprint, response = completed
+                _abort_if_fingerprint_mismatch(completed_fingerprint, fingerprint)
+                return _replayed(response)
+
+            with _in_flight_lock:
+                in_flight = _in_flight.get(cache_key)
+                if in_flight is None:
+                    # Check again under the lock, the first request may have completed since.
+                    if _completed.get(cache_key) is not None:
+                        continue
+
+                    done = threading.Event()
+                    _in_flight[cache_key] = (fingerprint, done)
+                    break
+
+            in_flight_fingerprint, in_flight_done = in_flight
+            _abort_if_fingerprint_mismatch(in_flight_fingerprint, fingerprint)
+            if not in_flight_done.wait(IDEMPOTENCY_WAIT_SECONDS):
+                flask.abort(HTTPStatus.CONFLICT, f'A request with this {IDEMPOTENCY_KEY_HEADER} is still in progress')
+
+        claimed = False
+        try:
+            completed_record = _claim_or_wait(user_id, idempotency_key, fingerprint)
+            if completed_record is not None:
+                response = _response_from_record(completed_record['response'])
+                _completed.put(cache_key, (fingerprint, response))
+                return _replayed(response)
+
+            claimed = True
+            response = func_to_wrap(*args, **kwargs)
+            if _is_successful(response):
+                claimed = False
+                _completed.put(cache_key, (fingerprint, response))
+                try:
+                    idempotency_repo.complete(user_id, idempotency_key, fingerprint, _response_to_record(response))
+                except Exception as ex:
+                    # The claim is kept until its lease expires, so retries on other instances are not processed again.
+                    logger.error(f'Failed to keep the response of an idempotent request: {ex}')
+
+            return response
+        finally:
+            if claimed:
+                # Error responses are not kept, so the request can be retried with the same key.
+                try:
+                    idempotency_repo.release(user_id, idempotency_key)
+                except Exception as ex:
+                    # The claim expires with its lease, and the retries waiting on this instance must still be freed.
+                    logger.error(f'Failed to release the claim of an idempotent request: {ex}')
+
+            with _in_flight_lock:
+                del _in_flight[cache_key]
+
+            done.set()
+
+    return inner_func
+
+
+def _claim_or_wait(user_id: str, idempotency_key: str, fingerprint: str) -> dict[str, Any] | None:
+    """
+    Claim an idempotency key in Firestore, or wait for the request holding it on another instance to complete.
+
+    :param user_id: The ID of the signed in user.
+    :param idempotency_key: The idempotency key of the request.
+    :param fingerprint: The fingerprint of the request.
+    :return: None if the key was claimed, or the record of the completed request holding it.
+    :raises flask.abort(409): If the request holding the key is still being processed after the wait.
+    :raises flask.abort(422): If the key was already used for a different request.
+    """
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        record = idempotency_repo.claim(user_id, idempotency_key, fingerprint)
+        if record is None:
+            return None
+
+        _abort_if_fingerprint_mismatch(record['fingerprint'], fingerprint)
+        if record['status'] == idempotency_repo.STATUS_COMPLETED:
+            return record
+
+        if time.monotonic() + IDEMPOTENCY_POLL_SECONDS > deadline:
+            flask.abort(HTTPStatus.CONFLICT, f'A request with this {IDEMPOTENCY_KEY_HEADER} is still in progress')
+
+        time.sleep(IDEMPOTENCY_POLL_SECONDS)
+
+
+def _fingerprint_request() -> str:
+    """
+    Hash the method, path and body of the current request, to detect an idempotency key reused for another request.
+
+    :return: The fingerprint of the request.
+    """
+    fingerprint = sha256(f'{request.method} {request.path}\n'.encode())
+    fingerprint.update(request.get_data())
+    return fingerprint.hexdigest()
+
+
+def _abort_if_fingerprint_mismatch(expected_fingerprint: str, fingerprint: str) -> None:
+    """
+    :param expected_fingerprint: The fingerprint of the first request with the idempotency key.
+    :param fingerprint: The fingerprint of the current request.
+    :raises flask.abort(422): If the fingerprints are different.
+    """
+    if expected_fingerprint != fingerprint:
+        flask.abort(HTTPStatus.UNPROCESSABLE_ENTITY,
+                    f'The {IDEMPOTENCY_KEY_HEADER} was already used for a different request')
+
+
+def _is_successful(response: Any) -> bool:
+    """
+    :param response: The return value of an endpoint function.
+    :return: True if the response has a 2xx status code.
+    """
+    if isinstance(response, Response):
+        status = response.status_code
+    elif isinstance(response, tuple) and len(response) > 1:
+        status = response[1]
+    else:
+        status = HTTPStatus.OK
+
+    return 200 <= int(status) < 300
+
+
+def _response_to_record(response: Any) -> dict[str, Any]:
+    """
+    :param response: The return value of an endpoint function.
+    :return: The response as a Firestore map, for _response_from_record.
+    """
+    if isinstance(response, Response):
+        return {'body': response.get_data(), 'status': response.status_code, 'headers': dict(response.headers)}
+
+    data, status, headers = (response + ({},))[:3] if isinstance(response, tuple) else (response, HTTPStatus.OK, {})
+    return {'data': data, 'status': int(status), 'headers': headers or {}}
+
+
+def _response_from_record(record: dict[str, Any]) -> Any:
+    """
+    :param record: A response kept with _response_to_record.
+    :return: The response, like the endpoint function returned it.
+    """
+    if 'body' in record:
+        return Response(record['body'], record['status'], record['headers'])
+
+    return record['data'], record['status'], record['headers']
+
+
+def _replayed(response: Any) -> Any:
+    """
+    Mark a kept response as replayed with the Idempotent-Replayed header.
+
+    :param response: The return value of the endpoint function for the first request.
+    :return: The same response, with the header added.
+    """
+    if isinstance(response, Response):
+        response = Response(response.get_data(), response.status_code, response.headers)
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+
+    data, status, headers = (response + ({},))[:3] if isinstance(response, tuple) else (response, HTTPStatus.OK, {})
+    return data, status, {**(headers or {}), 'Idempotent-Replayed': 'true'}
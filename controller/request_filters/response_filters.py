@@ -0,0 +1,74 @@
+import gzip
+from http import HTTPStatus
+
+from flask import Flask, Response, request
+
+from controller.controller_helpers import etag_not_modified, not_modified
+from shared.globals.constants import COMPRESSION_LEVEL, COMPRESSION_MIN_SIZE
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def init_response_filters(app: Flask) -> None:
+    """
+    :param app: The Flask application object.
+    :return: None
+
+    This method adds an `after_request` handler to the Flask application for successful JSON GET responses that:
+
+    1. Adds a strong entity tag hashed from the response body, unless the endpoint already set one
+       (for example from a document update time, so it could answer 304 before loading the document).
+    2. Answers with 304 Not Modified if the If-None-Match header of the request matches the entity tag.
+    3. Compresses bodies of at least COMPRESSION_MIN_SIZE bytes with brotli (if installed) or gzip,
+       depending on the Accept-Encoding header of the request.
+    """
+
+    @app.after_request
+    def conditional_compressed_response(response: Response) -> Response:
+        if request.method != 'GET' or response.status_code != HTTPStatus.OK or response.direct_passthrough:
+            return response
+
+        if response.mimetype != 'application/json' or 'Content-Encoding' in response.headers:
+            return response
+
+        etag, _ = response.get_etag()
+        if not etag:
+            response.add_etag()
+            etag, _ = response.get_etag()
+
+        response.vary.add('Accept-Encoding')
+        if etag_not_modified(etag):
+            return not_modified(etag, response)
+
+        _compress(response, etag)
+        return response
+
+
+def _compress(response: Response, etag: str) -> None:
+    """
+    Compress the response body with the best encoding accepted by the client.
+    The entity tag gets an encoding suffix, since a strong tag must differ between encodings of the same content.
+
+    :param response: The response to compress.
+    :param etag: The unquoted entity tag of the uncompressed response.
+    """
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_SIZE:
+        return
+
+    accept_encodings = request.accept_encodings
+    if brotli is not None and accept_encodings['br']:
+        encoding = 'br'
+        compressed_data = brotli.compress(data, quality=COMPRESSION_LEVEL)
+    elif accept_encodings['gzip']:
+        encoding = 'gzip'
+        compressed_data = gzip.compress(data, compresslevel=COMPRESSION_LEVEL)
+    else:
+        return
+
+    response.set_data(compressed_data)
+    response.headers['Content-Encoding'] = encoding
+    response.set_etag(f'{etag}-{encoding}')
@@ -0,0 +1,49 @@
+from flask import Flask, Response, g, request
+
+from shared.tracing import start_span, end_span
+
+
+def init_tracing_filters(app: Flask) -> None:
+    """
+    :param app: The Flask application object.
+    :return: None
+
+    This method adds handlers to the Flask application that:
+
+    1. Start a root span for every request, so the spans of the controllers, providers, repositories and
+       LLM calls it makes are grouped in one trace.
+    2. Add a Server-Timing header to every response, summarizing the time spent in each span category
+       (auth, firestore, llm, tool, spec) and in the whole request, for example:
+       `Server-Timing: auth;dur=12.1, firestore;dur=48.3, llm;dur=912.4, total;dur=981.0`.
+    3. End the root span when the request is torn down, which exports the trace.
+
+    It should be initialized before the other filters, since the after request handlers run in the reverse order
+    they were added, and the total should include them.
+    """
+
+    @app.before_request
+    def start_request_span() -> None:
+        g.request_span, g.request_span_token = start_span(
+            'http.request', method=request.method, path=request.path, endpoint=request.endpoint)
+
+    @app.after_request
+    def add_server_timing(response: Response) -> Response:
+        request_span = g.get('request_span')
+        if request_span is None:
+            return response
+
+        request_span.set_attribute('status_code', response.status_code)
+
+        metrics = [f'{category};dur={seconds * 1000:.1f}'
+                   for category, seconds in request_span.category_seconds().items()]
+        metrics.append(f'total;dur={request_span.elapsed() * 1000:.1f}')
+        response.headers['Server-Timing'] = ', '.join(metrics)
+        return response
+
+    @app.teardown_request
+    def end_request_span(ex: BaseException | None) -> None:
+        request_span = g.pop('request_span', None)
+        if request_span is not None and ex is not None:
+            request_span.set_attribute('error', type(ex).__name__)
+
+        end_span(request_span, g.pop('request_span_token', None))
@@ -1,3 +1,4 @@
+import hmac
 from http import HTTPStatus
 from typing import Any
 from functools import wraps
@@ -7,6 +8,7 @@ import flask
 from provider.provider_modules import auth_provider
 from shared.globals.constants import INSUFFICIENT_ACCESS
 from shared.globals.enums import AccessLevels, CustomClaimKeys
+from shared.tracing import span
 
 
 def signed_in(required_access_level=AccessLevels.SERVICE) -> Any:
@@ -20,7 +22,35 @@ def signed_in(required_access_level=AccessLevels.SERVICE) -> Any:
     def outer_func(func_to_wrap):
         @wraps(func_to_wrap)
         def inner_func(*args, **kwargs):
-            _signed_in(required_access_level)
+            with span('auth.signed_in', 'auth', required_access_level=required_access_level.name):
+                _signed_in(required_access_level)
+
+            response = func_to_wrap(*args, **kwargs)
+            return response
+
+        return inner_func
+
+    return outer_func
+
+
+def signed_in_or_bearer_token(token: str, required_access_level=AccessLevels.OWNER) -> Any:
+    """
+    Decorator that lets requests with the given bearer token in the Authorization header through,
+    for clients that cannot sign in like a metrics scraper, and checks that other requests are signed in
+    with the required access level. Only signed in users are let through when the token is empty.
+
+    :param token: The bearer token.
+    :param required_access_level: The minimum access level required for users. Defaults to `AccessLevels.OWNER`.
+    :return: The wrapped function.
+    """
+
+    def outer_func(func_to_wrap):
+        @wraps(func_to_wrap)
+        def inner_func(*args, **kwargs):
+            authorization = flask.request.headers.get('Authorization', '')
+            if not token or not hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()):
+                with span('auth.signed_in', 'auth', required_access_level=required_access_level.name):
+                    _signed_in(required_access_level)
 
             response = func_to_wrap(*args, **kwargs)
             return response
@@ -0,0 +1,199 @@
+import json
+from functools import wraps
+from http import HTTPStatus
+from typing import Any, Callable
+
+import flask
+from flask import Response, current_app, request
+from flask_restx import Model, Namespace, fields, marshal
+from flask_restx.utils import merge, unpack
+
+from shared.globals.constants import FAST_JSON_RESPONSES
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Returned by a compiled value marshaller for values that must go through field.output instead.
+_FALLBACK = object()
+
+# Formatters for the field types that marshal a value by converting it. Other field types fall back to field.output.
+_FIELD_FORMATTERS: dict[type, Callable[[Any], Any]] = {
+    fields.String: str,
+    fields.Integer: int,
+    fields.Float: float,
+    fields.Boolean: bool,
+    fields.Raw: lambda value: value
+}
+
+
+def fast_marshal_with(
+        namespace: Namespace,
+        model: Model,
+        as_list: bool = False,
+        code: HTTPStatus = HTTPStatus.OK,
+        description: str = None
+) -> Callable:
+    """
+    Decorator equivalent to namespace.marshal_with, documenting the model the same way in Swagger,
+    except that Flask responses returned by the endpoint, like 304 Not Modified, are passed through as they are.
+    When FAST_JSON_RESPONSES is enabled, the response is marshalled by a function compiled once from the model
+    and encoded with orjson when it is installed, instead of field-by-field marshalling and stdlib json encoding.
+
+    :param namespace: The namespace of the resource.
+    :param model: The model used to marshal the response.
+    :param as_list: Whether the response is a list of the model (for the documentation).
+    :param code: The documented HTTP status code of the response.
+    :param description: The documented description of the response.
+    :return: The decorator.
+    """
+    marshal_model = compile_marshaller(model) if FAST_JSON_RESPONSES else None
+
+    def outer_func(func_to_wrap):
+        func_to_wrap.__apidoc__ = merge(getattr(func_to_wrap, '__apidoc__', {}), {
+            'responses': {str(code): (description, [model] if as_list else model, {})},
+            '__mask__': True
+        })
+
+        @wraps(func_to_wrap)
+        def inner_func(*args, **kwargs):
+            response = func_to_wrap(*args, **kwargs)
+            if isinstance(response, Response):
+                return response
+
+            data, status, headers = unpack(response)
+
+            mask = request.headers.get(current_app.config['RESTX_MASK_HEADER'])
+            if marshal_model is None:
+                return marshal(data, model, mask=mask), status, headers
+
+            if mask:
+                # Field masks are rare, so they go through the regular marshalling instead of the compiled function.
+                marshalled_data = marshal(data, model, mask=mask)
+            elif isinstance(data, (list, tuple)):
+                marshalled_data = [marshal_model(item) for item in data]
+            else:
+                marshalled_data = marshal_model(data)
+
+            return flask.Response(encode_json(marshalled_data), status=status, headers=headers, mimetype='application/json')
+
+        return inner_func
+
+    return outer_func
+
+
+def compile_marshaller(model: Model) -> Callable[[Any], dict]:
+    """
+    Compile a model into a function that marshals an object (a dictionary or an object with attributes)
+    the same way flask_restx.marshal does. Nested models and lists are compiled too. Fields with a dotted or callable
+    attribute, a default or a mask, and values the compiled function does not handle, like a list of dictionaries
+    in a list of strings, go through field.output instead.
+
+    :param model: The model to compile.
+    :return: A function that marshals a single object into a dictionary.
+    """
+    field_marshallers: list[tuple[str, str, Callable[[Any], Any] | None, fields.Raw]] = []
+    for key, field in model.items():
+        field = field() if isinstance(field, type) else field
+        attribute = key if field.attribute is None else field.attribute
+
+        # Dotted or callable attributes keep the full field.output behavior.
+        is_plain_attribute = isinstance(attribute, str) and '.' not in attribute
+        value_marshaller = _compile_value_marshaller(field) if is_plain_attribute else None
+        field_marshallers.append((key, attribute, value_marshaller, field))
+
+    def marshal_model(obj: Any) -> dict:
+        is_dict = isinstance(obj, dict)
+        marshalled = {}
+        for key, attribute, value_marshaller, field in field_marshallers:
+            if value_marshaller is not None:
+                value = obj.get(attribute) if is_dict else getattr(obj, attribute, None)
+                marshalled_value = value_marshaller(value)
+                if marshalled_value is not _FALLBACK:
+                    marshalled[key] = marshalled_value
+                    continue
+
+            marshalled[key] = field.output(key, obj)
+
+        return marshalled
+
+    return marshal_model
+
+
+def encode_json(data: Any) -> bytes | str:
+    """
+    Encode data as JSON, with orjson if it is installed and the app has no RESTX_JSON settings.
+    Otherwise, the settings are passed to json.dumps, like the default flask_restx representation does.
+
+    :param data: The data to encode.
+    :return: The encoded JSON, ending with a newline like the default flask_restx representation.
+    """
+    settings = dict(current_app.config.get('RESTX_JSON', {}))
+    if current_app.debug:
+        settings.setdefault('indent', 4)
+
+    if orjson is not None and not settings:
+        return orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE)
+
+    return json.dumps(data, **settings) + '\n'
+
+
+def _compile_value_marshaller(field: fields.Raw) -> Callable[[Any], Any] | None:
+    """
+    Compile the marshalling of the value of a field, already read from the object.
+
+    :param field: The field of the value.
+    :return: A function that marshals the value, and returns _FALLBACK for values it does not handle,
+             or None if the field must always go through field.output.
+    """
+    if field.default is not None or getattr(field, 'mask', None) is not None:
+        return None
+
+    if type(field) is fields.Nested:
+        if field.skip_none or field.as_list:
+            return None
+
+        marshal_nested = compile_marshaller(field.nested)
+        allow_null = field.allow_null
+
+        def marshal_nested_value(value: Any) -> Any:
+            if value is None and allow_null:
+                return None
+            if isinstance(value, (list, tuple)):
+                return [marshal_nested(item) for item in value]
+
+            return marshal_nested(value)
+
+        return marshal_nested_value
+
+    if type(field) is fields.List:
+        container = field.container
+        marshal_item = _compile_value_marshaller(container) if container.attribute is None else None
+        if marshal_item is None:
+            return None
+
+        is_nested = isinstance(container, fields.Nested) or type(container) is fields.Raw
+
+        def marshal_list(value: Any) -> Any:
+            if value is None:
+                return None
+            if not isinstance(value, (list, tuple)):
+                return _FALLBACK
+
+            marshalled_items = []
+            for item in value:
+                marshalled_item = marshal_item(item) if is_nested or not isinstance(item, dict) else _FALLBACK
+                if marshalled_item is _FALLBACK:
+                    return _FALLBACK
+                marshalled_items.append(marshalled_item)
+
+            return marshalled_items
+
+        return marshal_list
+
+    formatter = _FIELD_FORMATTERS.get(type(field))
+    if formatter is None:
+        return None
+
+    return lambda value: None if value is None else formatter(value)
@@ -0,0 +1,41 @@
+"""
+Production server configuration, used by the entrypoint in app.yaml:
+
+    gunicorn -c gunicorn.conf.py main:app
+
+Requests mostly wait on LLM and Firestore calls, so each worker serves many requests at once from a pool of threads.
+Workers do not share the LLM scheduler, caches or tool index, so more workers multiply the LLM quota and the memory
+of the process. Settings default to the SERVER_ constants, and environment variables of the same names override them.
+"""
+import logging
+import os
+
+from shared.globals import constants
+
+logger = logging.getLogger(__name__)
+
+bind = f'0.0.0.0:{os.getenv("PORT", constants.DEBUG_PORT)}'
+worker_class = os.getenv('SERVER_WORKER_CLASS', constants.SERVER_WORKER_CLASS)
+workers = int(os.getenv('SERVER_WORKERS', constants.SERVER_WORKERS))
+threads = int(os.getenv('SERVER_THREADS', constants.SERVER_THREADS))
+timeout = int(os.getenv('SERVER_TIMEOUT_SECONDS', constants.SERVER_TIMEOUT_SECONDS))
+graceful_timeout = int(os.getenv('SERVER_GRACEFUL_TIMEOUT_SECONDS', constants.SERVER_GRACEFUL_TIMEOUT_SECONDS))
+keepalive = 5
+
+# The Firebase app and its gRPC channels are created at import and cannot be shared with forked workers.
+preload_app = False
+
+
+def worker_exit(server, worker) -> None:
+    """
+    Shut a worker down gracefully, once it stopped taking requests and its requests in flight finished
+    or ran out of graceful_timeout: wait for the LLM calls still running, then flush the buffered writes
+    and stop the background threads through the shutdown hooks.
+    """
+    from shared.lifecycle import run_shutdown_hooks
+    from shared.models.ai.scheduling.llm_scheduler import LLM_SCHEDULER
+
+    if not LLM_SCHEDULER.drain(constants.LLM_DRAIN_TIMEOUT_SECONDS):
+        logger.warning(f'Worker {worker.pid} is exiting with LLM calls still running')
+
+    run_shutdown_hooks()
@@ -9,11 +9,21 @@ from controller.controller_modules.auth_controller import auth_ns
 from controller.controller_modules.chat_controller import chat_ns
 from controller.controller_modules.chatbot_controller import chatbot_ns
 from controller.controller_modules.example_controller import example_ns
+from controller.controller_modules.metrics_controller import metrics_ns
 from controller.controller_modules.org_controller import org_ns
 from controller.controller_modules.scrap_controller import scrap_ns
+from controller.controller_modules.usage_controller import usage_ns
+from controller.controller_modules.warmup_controller import init_warmup_routes
+from controller.request_filters.response_filters import init_response_filters
 from controller.request_filters.testing_filters import init_testing_filters
+from controller.request_filters.tracing_filters import init_tracing_filters
+from provider.provider_modules import org_provider, metrics_provider
+from repository.cache_invalidation import start_cache_invalidation_listeners
+from repository.repo_modules import assistant_repo, chatbot_repo, org_repo
 from shared.globals import constants
 from shared.globals.constants import API_KEY
+from shared.models.ai.scheduling.llm_scheduler import LLM_SCHEDULER
+from shared.tracing import add_span_listener
 from shared.utilities import is_testing_environment
 
 app = flask.Flask(__name__)
@@ -44,16 +54,27 @@ api.add_namespace(auth_ns)
 api.add_namespace(chat_ns)
 api.add_namespace(chatbot_ns)
 api.add_namespace(example_ns)
+api.add_namespace(metrics_ns)
 api.add_namespace(org_ns)
 api.add_namespace(scrap_ns)
+api.add_namespace(usage_ns)
 
 app.register_blueprint(blueprint)
+init_warmup_routes(app)
 
 is_testing = is_testing_environment()
 if is_testing:
     os.environ['FIRESTORE_EMULATOR_HOST'] = '[::1]:8587'
 
+init_tracing_filters(app)
 init_testing_filters(app, is_testing)
+init_response_filters(app)
+
+LLM_SCHEDULER.org_policy_resolver = org_provider.get_llm_org_policy
+add_span_listener(metrics_provider.record_span)
+
+if constants.REPO_CACHE_LISTENERS_ENABLED:
+    start_cache_invalidation_listeners([chatbot_repo.CHATBOTS, assistant_repo.ASSISTANTS, org_repo.ORGS])
 
 if __name__ == '__main__':
     app.run(host=constants.DEBUG_HOST, port=constants.DEBUG_PORT, debug=True)
@@ -1,15 +1,33 @@
-from google.oauth2 import service_account
-from langchain.chat_models import ChatVertexAI
-from langchain.schema import HumanMessage, SystemMessage
+from __future__ import annotations
 
-from repository.firestore import FIREBASE_CREDS
+import json
+import threading
+from hashlib import sha1, sha256
+from typing import TYPE_CHECKING, Any
+
+from provider.provider_modules import usage_provider
 from repository.repo_modules import chat_repo, chatbot_repo
-from shared.globals.constants import MAX_OUTPUT_TOKENS
+from shared.caching import LRUTTLCache
+from shared.globals.constants import MAX_OUTPUT_TOKENS, CHAT_START_DURABLE_INSERT, CHAT_RESPONSE_CACHE_MAX_SIZE, \
+    CHAT_RESPONSE_CACHE_TTL_SECONDS, CHAT_RESPONSE_CACHE_MAX_TEMPERATURE
 from shared.models.data_class.chat_message_dc import ChatMessageDC
 from shared.models.data_class.chatbot_temperament_dc import ChatbotTemperamentDC
 from shared.models.dto.chat_dto import ChatDTO
+from shared.models.dto.chatbot_dto import ChatbotDTO
 from shared.models.security.user_context import UserContext
 
+# LangChain takes seconds to import, so the model and its callbacks are imported on the first model call.
+if TYPE_CHECKING:
+    from langchain.schema import HumanMessage, SystemMessage
+
+    from shared.models.ai.callbacks.token_usage_callback_handler import TokenUsageCallbackHandler
+    from shared.models.ai.chat_models.assistful_chat_vertex_ai import AssistfulChatVertexAI
+
+# Model responses to chat openings, by chatbot and a hash of the prompt and sampling parameters.
+_response_cache = LRUTTLCache('chat_responses', CHAT_RESPONSE_CACHE_MAX_SIZE, CHAT_RESPONSE_CACHE_TTL_SECONDS)
+_response_cache_skips = 0
+_response_cache_lock = threading.Lock()
+
 
 def get_chats(ctx: UserContext, chatbot_id: str) -> list[ChatDTO]:
     """
@@ -39,29 +57,60 @@ def get_chat_messages(ctx: UserContext, chat_id: str) -> list[ChatMessageDC]:
     return chat.messages()
 
 
-def start_chat(ctx: UserContext, chatbot_id: str, message: str) -> ChatDTO:
+def get_chat_messages_with_etag(ctx: UserContext, chat_id: str) -> tuple[list[ChatMessageDC], str]:
+    """
+    Retrieve chat messages for a given chat ID, with an entity tag derived from the last update time of the chat
+    and the number of messages, including those still waiting to be written.
+    The tag comes from the same read as the messages, so answering with 304 Not Modified takes a single read.
+
+    :param ctx: UserContext object representing the user's context and permissions.
+    :param chat_id: ID of the chat for which to retrieve messages.
+    :return: A list of ChatMessageDC objects representing the chat messages, and their entity tag.
+    """
+    chat, update_time = chat_repo.get_with_update_time(ctx, chat_id)
+    etag = sha1(f'messages:{chat_id}:{update_time.isoformat()}:{len(chat.history)}'.encode()).hexdigest()
+    return chat.messages(), etag
+
+
+def start_chat(
+        ctx: UserContext,
+        chatbot_id: str,
+        message: str,
+        durable: bool = CHAT_START_DURABLE_INSERT
+) -> ChatDTO:
     """
     Starts a chat conversation with a chatbot.
+    The chat ID is allocated on the client, so the new chat can be returned while it is still being inserted,
+    and the usage of the model can be attributed to the chat before it exists.
 
     :param ctx: The UserContext object representing the current user's context.
     :param chatbot_id: The ID of the chatbot to start the conversation with.
     :param message: The initial message to send to the chatbot.
+    :param durable: Whether to wait for the new chat to be written before returning.
     :return: The ChatDTO object representing the new chat conversation.
     """
+    from langchain.schema import HumanMessage, SystemMessage
+    from shared.models.ai.callbacks.token_usage_callback_handler import TokenUsageCallbackHandler
+
     chatbot = chatbot_repo.get(ctx, chatbot_id)
     initial_messages = [
         SystemMessage(content=chatbot.context),
         HumanMessage(content=message)
     ]
 
-    chat_vertex = _get_chat_vertex(chatbot)
-    response_message = chat_vertex(initial_messages)
+    new_chat_id = chat_repo.new_id()
+    usage_handler = TokenUsageCallbackHandler()
+    response_content = _get_opening_response(ctx, chatbot, initial_messages, usage_handler)
+    usage_provider.record_usage(ctx, usage_handler.usage, chat_id=new_chat_id, chatbot_id=chatbot_id)
 
-    history = [chatbot.context, message, response_message.content.strip()]
+    history = [chatbot.context, message, response_content]
     temperament_fields = chatbot.get_temperament_fields()
 
     new_chat = ChatDTO(initiator_id=ctx.user_id, respondent_id=chatbot_id, history=history, **temperament_fields)
-    new_chat_id = chat_repo.insert(ctx, new_chat)
+    if durable:
+        chat_repo.insert(ctx, new_chat, new_chat_id)
+    else:
+        chat_repo.insert_async(ctx, new_chat, new_chat_id)
 
     new_chat.chat_id = new_chat_id
     return new_chat
@@ -80,8 +129,12 @@ def continue_chat(ctx: UserContext, chat_id: str, new_message: str) -> ChatDTO:
     chat = chat_repo.get(ctx, chat_id)
     chat.add_message(new_message)
 
-    chat_vertex = _get_chat_vertex(chat)
-    response_message = chat_vertex(chat.messages_langchain())
+    from shared.models.ai.callbacks.token_usage_callback_handler import TokenUsageCallbackHandler
+
+    chat_vertex = _get_chat_vertex(ctx, chat)
+    usage_handler = TokenUsageCallbackHandler()
+    response_message = chat_vertex(chat.messages_langchain(), callbacks=[usage_handler])
+    usage_provider.record_usage(ctx, usage_handler.usage, chat_id=chat_id, chatbot_id=chat.respondent_id)
 
     response_content = response_message.content.strip()
     chat_repo.add_to_history(ctx, chat_id, [new_message, response_content])
@@ -89,24 +142,114 @@ def continue_chat(ctx: UserContext, chat_id: str, new_message: str) -> ChatDTO:
     return ChatDTO(sender=chat.respondent_id, message=response_content)
 
 
-def _get_chat_vertex(chatbot_temperament: ChatbotTemperamentDC) -> ChatVertexAI:
+def get_response_cache_stats() -> dict[str, Any]:
+    """
+    Get the statistics of the chat opening response cache.
+
+    :return: The cache stats, with the number of model calls avoided by cache hits
+             and the number of openings not cached because of a high temperature.
+    """
+    stats = _response_cache.stats()
+    stats['llm_calls_avoided'] = stats['hits']
+    with _response_cache_lock:
+        stats['skipped_high_temperature'] = _response_cache_skips
+
+    return stats
+
+
+def warm_up() -> None:
+    """
+    Import the chat model and create the shared Vertex AI client and credentials,
+    so the first chat of an instance does not pay for them.
+    """
+    from shared.models.ai.callbacks.token_usage_callback_handler import TokenUsageCallbackHandler
+    from shared.models.ai.chat_models.assistful_chat_vertex_ai import AssistfulChatVertexAI, get_credentials
+
+    AssistfulChatVertexAI(credentials=get_credentials(), max_output_tokens=MAX_OUTPUT_TOKENS,
+                          callbacks=[TokenUsageCallbackHandler()])
+
+
+def _get_opening_response(
+        ctx: UserContext,
+        chatbot: ChatbotDTO,
+        initial_messages: list[SystemMessage | HumanMessage],
+        usage_handler: TokenUsageCallbackHandler
+) -> str:
+    """
+    Get the model response to the opening messages of a chat. For chatbots with cache_responses enabled,
+    identical openings with the same sampling parameters are answered from the response cache.
+    Chatbots with a temperature above CHAT_RESPONSE_CACHE_MAX_TEMPERATURE are never cached,
+    since a varied response is the point of their temperament.
+
+    :param ctx: The UserContext object representing the current user's context.
+    :param chatbot: The chatbot of the chat.
+    :param initial_messages: The system and human messages opening the chat.
+    :param usage_handler: The handler totaling the token usage of the model call, if the model is called.
+    :return: The response message text.
+    """
+    global _response_cache_skips
+
+    # Temperament temperatures are computed in floating point (FUN is 0.6000000000000001), so compare them rounded.
+    use_cache = bool(chatbot.cache_responses)
+    if use_cache and round(chatbot.temperature, 2) > CHAT_RESPONSE_CACHE_MAX_TEMPERATURE:
+        use_cache = False
+        with _response_cache_lock:
+            _response_cache_skips += 1
+
+    if use_cache:
+        cache_key = (chatbot.chatbot_id, _get_response_cache_key(chatbot, initial_messages))
+        cached_response = _response_cache.get(cache_key)
+        if cached_response is not None:
+            return cached_response
+
+    chat_vertex = _get_chat_vertex(ctx, chatbot)
+    response_content = chat_vertex(initial_messages, callbacks=[usage_handler]).content.strip()
+
+    if use_cache:
+        _response_cache.put(cache_key, response_content)
+
+    return response_content
+
+
+def _get_response_cache_key(chatbot: ChatbotDTO, messages: list[SystemMessage | HumanMessage]) -> str:
+    """
+    Hash everything that determines a model response: the messages, the sampling parameters and the output limit.
+
+    :param chatbot: The chatbot holding the sampling parameters.
+    :param messages: The messages sent to the model.
+    :return: The hex digest identifying the request.
     """
+    request = {
+        'messages': [(message.type, message.content) for message in messages],
+        'sampling': chatbot.get_vertex_chat_fields(),
+        'max_output_tokens': MAX_OUTPUT_TOKENS
+    }
+    return sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+
+def _get_chat_vertex(ctx: UserContext, chatbot_temperament: ChatbotTemperamentDC) -> AssistfulChatVertexAI:
+    """
+    :param ctx: The UserContext object representing the current user's context.
     :param chatbot_temperament: A data class representing the temperament of the chatbot.
-    :return: An instance of ChatVertexAI, which is a chatbot model used for generating responses.
+    :return: An instance of AssistfulChatVertexAI, which is a chatbot model used for generating responses.
 
-    This method takes a ChatbotTemperamentDC object as a parameter and returns an instance of ChatVertexAI.
+    This method takes a ChatbotTemperamentDC object as a parameter and returns an instance of AssistfulChatVertexAI.
     Within the method, the chatbot temperament fields are extracted from the ChatbotTemperamentDC object and used
-    as arguments to initialize the ChatVertexAI object.
+    as arguments to initialize the AssistfulChatVertexAI object.
 
-    Additionally, the credentials are set to the FIREBASE_CREDS and
-    the maximum number of output tokens is set to MAX_OUTPUT_TOKENS.
-    The initialized ChatVertexAI object is then returned.
+    Additionally, the credentials are set to the shared Vertex AI credentials,
+    the maximum number of output tokens is set to MAX_OUTPUT_TOKENS,
+    and the calls are scheduled for the org of the user.
+    The initialized AssistfulChatVertexAI object is then returned.
     """
+    from shared.models.ai.chat_models.assistful_chat_vertex_ai import AssistfulChatVertexAI, get_credentials
+
     kwargs = chatbot_temperament.get_vertex_chat_fields()
     kwargs.update({
-        'credentials': service_account.Credentials.from_service_account_info(FIREBASE_CREDS),
-        'max_output_tokens': MAX_OUTPUT_TOKENS
+        'credentials': get_credentials(),
+        'max_output_tokens': MAX_OUTPUT_TOKENS,
+        'org_id': ctx.org_id
     })
 
-    chat_vertex = ChatVertexAI(**kwargs)
+    chat_vertex = AssistfulChatVertexAI(**kwargs)
     return chat_vertex
@@ -1,49 +1,102 @@
-from typing import Optional, cast
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Optional, cast, Any
 
 from flask import request
-from google.oauth2 import service_account
-from jsonpickle import decode
-from langchain.agents import AgentType, initialize_agent
-from langchain.chat_models import ChatVertexAI
-from langchain.memory import ConversationBufferMemory
-from langchain.prompts import MessagesPlaceholder
-from langchain.vectorstores import Chroma
-
-from shared.globals.constants import MAX_OUTPUT_TOKENS, AUTH_HEADER_NAME
-from shared.globals.objects import FIREBASE_CREDS
-from shared.models.ai.agents.tools.assistful_nla_tool import AssistfulNLATool
-from shared.models.ai.agents.tools.utils.assistful_api_operation import AssistfulAPIOperation
+
+from shared.caching import LRUTTLCache
+from shared.globals.constants import MAX_OUTPUT_TOKENS, AUTH_HEADER_NAME, SEMANTIC_CACHE_ENABLED, \
+    SEMANTIC_CACHE_SIMILARITY_THRESHOLD, SEMANTIC_CACHE_TTL_SECONDS, SEMANTIC_CACHE_MAX_ENTRIES, \
+    SEMANTIC_CACHE_MAX_NAMESPACES, AGENT_MEMORY_MAX_TOKENS, AGENT_MEMORY_CACHE_MAX_SIZE, AGENT_MEMORY_CACHE_TTL_SECONDS
+from shared.models.security.user_context import UserContext
+from shared.tracing import span
+
+# LangChain, Chroma and the agent models take seconds to import, so they are imported on the first query.
+if TYPE_CHECKING:
+    from langchain.vectorstores import Chroma
+
+    from shared.models.ai.agents.tools.assistful_nla_tool import AssistfulNLATool
+    from shared.models.ai.semantic_cache import SemanticCache
+    from shared.models.ai.tool_memory import ToolMemory
 
 # TODO: wrap all this into a class with a class method like AssistfulAgent.from_...(...)
 # TODO:     the agent should not make calls to fs itself. fs resources go in the from... method?
 # TODO: these are called agents internally, but assistants externally
 
 vector_store: Optional[Chroma] = None  # TODO: this is only for testing
-chat_history: Optional[MessagesPlaceholder] = None  # TODO: this is only for testing
-memory: Optional[ConversationBufferMemory] = None  # TODO: this is only for testing
+semantic_cache: Optional[SemanticCache] = None
+
+# The remembered messages of the agent chats, by org and chat ID. Every change is written through to Firestore,
+# so an entry is only stale after another instance answered in the same chat, for at most the TTL.
+_agent_memories = LRUTTLCache('agent_memories', AGENT_MEMORY_CACHE_MAX_SIZE, AGENT_MEMORY_CACHE_TTL_SECONDS)
 
 MEMORY_KEY: str = 'chat_history'
 API_OPERATION_KEY: str = 'encoded_api_operation'
 
 
-def query_test_agent(user_query: str) -> str:
+def query_test_agent(ctx: UserContext, user_query: str, chat_id: str | None = None) -> tuple[str, str]:
+    """
+    Answer a query with the test agent, remembering the recent messages of the agent chat.
+
+    :param ctx: The user context.
+    :param user_query: The query of the user.
+    :param chat_id: The agent chat to continue. A new agent chat is started if not given.
+    :return: The ID of the agent chat and the answer.
+    :raises flask.abort(404): If the agent chat does not exist.
+    """
+    from repository.repo_modules.ai import agent_chat_repo
+    if chat_id is None:
+        chat_id = agent_chat_repo.new_id()
+        history = None
+    else:
+        history = _get_history(ctx, chat_id)
+
+    # Tools call the API with the credentials of the user, so answers are only shared between queries of the same user.
+    from shared.globals.helpers import get_debug_docs_uri
+    cache_namespace = (ctx.org_id, ctx.user_id, get_debug_docs_uri())
+    # Follow-up queries are answered from the history of their chat, so only the first query of a chat is cached.
+    use_semantic_cache = SEMANTIC_CACHE_ENABLED and not history
+    query_embedding = None
+    if use_semantic_cache:
+        _create_semantic_cache_if_not_exists()
+        with span('semantic_cache.lookup', 'cache', cache=semantic_cache.name,
+                  threshold=semantic_cache.similarity_threshold) as cache_span:
+            query_embedding = semantic_cache.embed(user_query)
+            cache_hit = semantic_cache.lookup(cache_namespace, user_query, query_embedding)
+            cache_span.set_attribute('hit', cache_hit is not None)
+
+        if cache_hit:
+            _remember(ctx, chat_id, history, user_query, cache_hit.answer)
+            return chat_id, cache_hit.answer
+
     _create_tool_vector_store_if_not_exists()
 
-    tool_memory: set[str] = set()
-    relevant_tools: list[AssistfulNLATool] = _get_relevant_tools_from_vector_store(user_query, tool_memory)
+    from langchain.agents import AgentType, initialize_agent
+    from langchain.memory import ChatMessageHistory, ConversationBufferMemory
+    from langchain.prompts import MessagesPlaceholder
+    from langchain.schema import AIMessage, HumanMessage
 
-    # TODO: need to store this memory in firestore probably
-    # TODO: also need a more efficient memory model for large memory
-    global chat_history
-    global memory
-    if not chat_history or not memory:
-        chat_history = MessagesPlaceholder(variable_name=MEMORY_KEY)
-        memory = ConversationBufferMemory(memory_key=MEMORY_KEY, return_messages=True)
+    from shared.models.ai.chat_models.assistful_chat_vertex_ai import AssistfulChatVertexAI, get_credentials
 
-    chat_llm = ChatVertexAI(**{
+    from shared.models.ai.tool_memory import ToolMemory
+    tool_memory = ToolMemory()
+    relevant_tools: list[AssistfulNLATool] = _get_relevant_tools_from_vector_store(user_query, history, tool_memory)
+
+    # The memory only lives for this query. The agent chat remembers the exchange once it is answered.
+    memory = ConversationBufferMemory(
+        memory_key=MEMORY_KEY,
+        return_messages=True,
+        chat_memory=ChatMessageHistory(messages=[
+            HumanMessage(content=message) if i % 2 == 0 else AIMessage(content=message)
+            for i, message in enumerate(history or [])
+        ])
+    )
+
+    chat_llm = AssistfulChatVertexAI(**{
         # TODO: 'tuned_model_name': GCP_TUNED_MODEL_DOCS2REQUESTS
-        'credentials': service_account.Credentials.from_service_account_info(FIREBASE_CREDS),
-        'max_output_tokens': MAX_OUTPUT_TOKENS
+        'credentials': get_credentials(),
+        'max_output_tokens': MAX_OUTPUT_TOKENS,
+        'org_id': ctx.org_id
     })
 
     # "all_relevant_tools" once api specs are being combined?
@@ -54,7 +107,7 @@ def query_test_agent(user_query: str) -> str:
         memory=memory,
         agent_kwargs={
             'input_variables': ['input', 'agent_scratchpad', MEMORY_KEY],
-            'memory_prompts': [chat_history],
+            'memory_prompts': [MessagesPlaceholder(variable_name=MEMORY_KEY)],
         },
         verbose=True
     )
@@ -63,8 +116,32 @@ def query_test_agent(user_query: str) -> str:
     from shared.models.ai.callbacks.tool_memory_callback_handler import ToolMemoryCallbackHandler
     handler = ToolMemoryCallbackHandler(tool_memory=tool_memory)
 
-    chain_output = agent_executor.run(user_query, callbacks=[handler])
-    return str(chain_output)
+    from shared.models.ai.callbacks.tool_usage_callback_handler import ToolUsageCallbackHandler
+    usage_handler = ToolUsageCallbackHandler(relevant_tools)
+
+    from shared.models.ai.callbacks.token_usage_callback_handler import TokenUsageCallbackHandler
+    token_usage_handler = TokenUsageCallbackHandler()
+
+    chain_output = str(agent_executor.run(user_query, callbacks=[handler, usage_handler, token_usage_handler]))
+
+    # The test agent is not an assistant document yet, so its usage is only attributed to the org and the agent chat.
+    from provider.provider_modules import usage_provider
+    usage_provider.record_usage(ctx, token_usage_handler.usage, chat_id=chat_id)
+
+    if use_semantic_cache:
+        with span('semantic_cache.put', 'cache', cache=semantic_cache.name) as cache_span:
+            # Only answers built from successful reads can be reused. Other tools change data or may fail differently.
+            cache_span.set_attribute('stored', usage_handler.only_read_operations)
+            if usage_handler.only_read_operations:
+                semantic_cache.put(cache_namespace, user_query, query_embedding, chain_output)
+            else:
+                methods_used = [method.value if method else 'unknown' for method in usage_handler.methods_used]
+                reason = f'tools used {methods_used}, failed {usage_handler.failed}'
+                cache_span.set_attribute('reason', reason)
+                semantic_cache.skip(user_query, reason)
+
+    _remember(ctx, chat_id, history, user_query, chain_output)
+    return chat_id, chain_output
 
 
 def clear_vector_store() -> None:
@@ -72,11 +149,41 @@ def clear_vector_store() -> None:
     vector_store = None
 
 
-def clear_memory() -> None:
-    global chat_history
-    global memory
-    memory = None
-    chat_history = None
+def clear_memory(ctx: UserContext, chat_id: str) -> None:
+    """
+    Forget an agent chat and its remembered messages.
+
+    :param ctx: The user context.
+    :param chat_id: The ID of the agent chat.
+    :raises flask.abort(404): If the agent chat does not exist.
+    """
+    from repository.repo_modules.ai import agent_chat_repo
+    agent_chat_repo.delete(ctx, chat_id)
+    _agent_memories.invalidate((ctx.org_id, chat_id))
+
+
+def get_semantic_cache_stats() -> dict[str, Any] | None:
+    """
+    :return: The stats of the semantic answer cache, or None if it was not created yet.
+    """
+    return semantic_cache.stats() if semantic_cache else None
+
+
+def warm_up(tool_index: bool = True) -> None:
+    """
+    Import the agent, and build the tool index and the semantic answer cache,
+    so the first query of an instance does not pay for them.
+
+    :param tool_index: Whether to build the tool index, which reads the API spec and embeds every tool.
+    """
+    from importlib import import_module
+    import_module('langchain.agents')
+    import_module('shared.models.ai.agents.tools.assistful_nla_tool')
+
+    if SEMANTIC_CACHE_ENABLED:
+        _create_semantic_cache_if_not_exists()
+    if tool_index:
+        _create_tool_vector_store_if_not_exists()
 
 
 def _create_tool_vector_store_if_not_exists() -> None:
@@ -88,11 +195,14 @@ def _create_tool_vector_store_if_not_exists() -> None:
     from shared.globals.helpers import get_debug_docs_uri, get_debug_uri
     spec: dict = spec_provider.spec_from_uri(get_debug_docs_uri(), get_debug_uri())
 
-    from langchain.tools.openapi.utils.openapi_utils import OpenAPISpec
-    openapi_spec = OpenAPISpec.from_spec_dict(spec)
+    from shared.models.ai.agents.tools.utils.assistful_openapi_spec import AssistfulOpenAPISpec
+    with span('spec.parse', 'spec'):
+        openapi_spec = AssistfulOpenAPISpec.from_spec_dict(spec)
 
     from shared.models.ai.agents.toolkits.assistful_nla_toolkit import AssistfulNLAToolkit
-    toolkit = AssistfulNLAToolkit.from_spec(openapi_spec)
+    with span('spec.toolkit', 'spec') as toolkit_span:
+        toolkit = AssistfulNLAToolkit.from_spec(openapi_spec)
+        toolkit_span.set_attribute('tools', len(toolkit.nla_tools))
 
     from langchain.schema import Document
     from jsonpickle import encode
@@ -105,19 +215,92 @@ def _create_tool_vector_store_if_not_exists() -> None:
         docs.append(doc)
 
     from langchain.embeddings import VertexAIEmbeddings
-    vector_store = Chroma.from_documents(docs, VertexAIEmbeddings())  # TODO: switch to Redis from Chroma
+    from langchain.vectorstores import Chroma
+    with span('spec.embed', 'spec', documents=len(docs)):
+        vector_store = Chroma.from_documents(docs, VertexAIEmbeddings())  # TODO: switch to Redis from Chroma
+
+
+def _create_semantic_cache_if_not_exists() -> None:
+    global semantic_cache
+    if semantic_cache:
+        return
+
+    from langchain.embeddings import VertexAIEmbeddings
+    from shared.models.ai.semantic_cache import SemanticCache
+    semantic_cache = SemanticCache(
+        'scrap_answers',
+        VertexAIEmbeddings(),
+        SEMANTIC_CACHE_SIMILARITY_THRESHOLD,
+        SEMANTIC_CACHE_TTL_SECONDS,
+        SEMANTIC_CACHE_MAX_ENTRIES,
+        SEMANTIC_CACHE_MAX_NAMESPACES
+    )
+
 
+def _get_history(ctx: UserContext, chat_id: str) -> list[str]:
+    """
+    :param ctx: The user context.
+    :param chat_id: The ID of the agent chat.
+    :return: The remembered messages of the agent chat, read from Firestore the first time.
+    :raises flask.abort(404): If the agent chat does not exist.
+    """
+    history: tuple[str, ...] | None = _agent_memories.get((ctx.org_id, chat_id))
+    if history is None:
+        from repository.repo_modules.ai import agent_chat_repo
+        history = tuple(agent_chat_repo.get(ctx, chat_id).history or [])
+        _agent_memories.put((ctx.org_id, chat_id), history)
 
-def _get_relevant_tools_from_vector_store(user_query: str, tool_memory: set[str]) -> list[AssistfulNLATool]:
+    return list(history)
+
+
+def _remember(ctx: UserContext, chat_id: str, history: list[str] | None, user_query: str, answer: str) -> None:
+    """
+    Add an exchange to the memory of an agent chat, and forget the oldest exchanges beyond the token budget.
+
+    :param ctx: The user context.
+    :param chat_id: The ID of the agent chat.
+    :param history: The remembered messages of the agent chat, or None if the chat is new.
+    :param user_query: The query of the user.
+    :param answer: The answer of the agent.
+    """
+    from repository.repo_modules.ai import agent_chat_repo
+    new_history = _trim_history((history or []) + [user_query, answer], AGENT_MEMORY_MAX_TOKENS)
+    if history is None:
+        from shared.models.dto.agent_chat_dto import AgentChatDTO
+        agent_chat_repo.insert(ctx, AgentChatDTO(initiator_id=ctx.user_id, history=new_history), chat_id)
+    else:
+        agent_chat_repo.set_history(ctx, chat_id, new_history)
+
+    _agent_memories.put((ctx.org_id, chat_id), tuple(new_history))
+
+
+def _trim_history(history: list[str], max_tokens: int) -> list[str]:
+    """
+    :param history: Messages alternating between the user and the agent, starting with the user.
+    :param max_tokens: The token budget of the messages.
+    :return: The most recent exchanges that fit the budget. The latest exchange is always kept.
+    """
+    from shared.models.ai.chat_models.assistful_chat_vertex_ai import estimate_tokens
+    message_tokens = [estimate_tokens(message) for message in history]
+    total_tokens = sum(message_tokens)
+    start = 0
+    while total_tokens > max_tokens and len(history) - start > 2:
+        total_tokens -= message_tokens[start] + message_tokens[start + 1]
+        start += 2
+
+    return history[start:]
+
+
+def _get_relevant_tools_from_vector_store(user_query: str,
+                                          history: list[str] | None,
+                                          tool_memory: ToolMemory) -> list[AssistfulNLATool]:
     global vector_store
     if not vector_store:
         raise ValueError('There is no vector store')
 
-    if memory:
+    if history:
         # Recent chat history should be used for selecting relevant tools and for running the tool functions.
-        messages = memory.chat_memory.messages
-        messages_content = [message.content for message in messages] if messages else []
-        user_query = '\n'.join([user_query] + messages_content[-2:])
+        user_query = '\n'.join([user_query] + history[-2:])
 
     # Longer queries are given more than the default 4 tools.
     min_k = 4
@@ -127,7 +310,12 @@ def _get_relevant_tools_from_vector_store(user_query: str, tool_memory: set[str]
     k = min(word_count // word_count_per_k + min_k, max_k)
 
     retriever = vector_store.as_retriever(search_kwargs={'k': k})
-    relevant_tool_docs = retriever.get_relevant_documents(user_query)
+    with span('tool.select', 'tool', k=k):
+        relevant_tool_docs = retriever.get_relevant_documents(user_query)
+
+    from jsonpickle import decode
+    from shared.models.ai.agents.tools.assistful_nla_tool import AssistfulNLATool
+    from shared.models.ai.agents.tools.utils.assistful_api_operation import AssistfulAPIOperation
 
     headers = {AUTH_HEADER_NAME: request.headers.get(AUTH_HEADER_NAME)}
     return [
@@ -85,14 +85,21 @@ def get_all_users() -> list[Any]:
 def get_logged_in_user() -> UserRecord:
     """
     Get the currently logged in user.
+    The user is looked up once per request and kept in flask.g, since the access check, the user context
+    and other request handling all need it.
 
     :return: The UserRecord object representing the currently logged in user.
     :rtype: UserRecord
     """
+    user = flask.g.get('logged_in_user')
+    if user is not None:
+        return user
+
     decoded_id_token = get_decoded_id_token()
     uid = decoded_id_token.get('uid')
 
     user = auth.get_user(uid)
+    flask.g.logged_in_user = user
     return user
 
 
@@ -0,0 +1,137 @@
+from typing import Any
+
+from shared.metrics import Counter, Histogram, MetricFamily, render_metrics
+from shared.tracing import Span
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'assistful_http_request_duration_seconds',
+    'Latency of HTTP requests, by route.',
+    ('method', 'endpoint', 'status'))
+FIRESTORE_OPERATION_SECONDS = Histogram(
+    'assistful_firestore_operation_duration_seconds',
+    'Latency of Firestore operations, by collection. Reads served by a repo cache are counted in the cache metrics.',
+    ('collection', 'operation', 'outcome'))
+LLM_CALL_SECONDS = Histogram(
+    'assistful_llm_call_duration_seconds',
+    'Latency of LLM calls, including the time waiting for a scheduler slot.',
+    ('model', 'org_id', 'outcome'))
+LLM_QUEUE_SECONDS = Histogram(
+    'assistful_llm_queue_wait_seconds',
+    'Time LLM calls waited for a scheduler slot.',
+    ('model',))
+LLM_PROMPT_TOKENS = Counter(
+    'assistful_llm_prompt_tokens_total',
+    'Prompt tokens sent to LLMs, estimated from text lengths when the response does not report them.',
+    ('model', 'org_id'))
+LLM_COMPLETION_TOKENS = Counter(
+    'assistful_llm_completion_tokens_total',
+    'Completion tokens received from LLMs, estimated from text lengths when the response does not report them.',
+    ('model', 'org_id'))
+TOOL_CALL_SECONDS = Histogram(
+    'assistful_tool_call_duration_seconds',
+    'Latency of the API operations run by agent tools.',
+    ('operation_id', 'method', 'status'))
+
+_CACHE_COUNTERS = ('hits', 'misses', 'evictions', 'expirations', 'invalidations', 'stale_puts', 'puts', 'skips')
+_BUFFER_COUNTERS = ('appended', 'flushed', 'dropped', 'flushes', 'failed_flushes')
+_SCHEDULER_COUNTERS = ('admitted', 'completed')
+_SCHEDULER_GAUGES = ('in_flight', 'queue_depth', 'orgs_waiting', 'orgs_in_flight')
+
+
+def record_span(span: Span) -> None:
+    """
+    Span listener that records the metrics of finished spans. Only a dictionary lookup and a histogram
+    observation are added to each traced operation, so it can stay on in production.
+
+    :param span: The finished span.
+    """
+    attributes = span.attributes
+    outcome = attributes.get('error', 'ok')
+    if span.name == 'http.request':
+        HTTP_REQUEST_SECONDS.observe(span.duration, (
+            attributes.get('method'), attributes.get('endpoint') or 'unmatched', str(attributes.get('status_code'))))
+    elif span.category == 'firestore' and span.name.startswith('firestore.'):
+        if attributes.get('cache') != 'hit':
+            FIRESTORE_OPERATION_SECONDS.observe(span.duration, (
+                attributes.get('collection'), span.name.removeprefix('firestore.'), outcome))
+    elif span.name == 'llm.generate':
+        model, org_id = attributes.get('model'), attributes.get('org_id') or 'none'
+        LLM_CALL_SECONDS.observe(span.duration, (model, org_id, outcome))
+        LLM_QUEUE_SECONDS.observe(attributes.get('queue_seconds', 0.0), (model,))
+        LLM_PROMPT_TOKENS.inc((model, org_id), attributes.get('prompt_tokens', 0))
+        LLM_COMPLETION_TOKENS.inc((model, org_id), attributes.get('completion_tokens', 0))
+    elif span.name == 'tool.api_operation':
+        TOOL_CALL_SECONDS.observe(span.duration, (
+            attributes.get('operation_id'), attributes.get('method'), str(attributes.get('status_code', outcome))))
+
+
+def get_metrics_text() -> str:
+    """
+    Get the metrics of the process in the Prometheus text format: the metrics recorded from spans,
+    and snapshots of the cache, write-behind buffer and LLM scheduler stats.
+
+    :return: The metrics as text.
+    """
+    return render_metrics([_collect_cache_metrics, _collect_buffer_metrics, _collect_scheduler_metrics])
+
+
+def _collect_cache_metrics() -> list[MetricFamily]:
+    from provider.provider_modules.ai import scrap_provider
+    from shared.caching import get_all_cache_stats
+
+    all_stats = get_all_cache_stats()
+    semantic_cache_stats = scrap_provider.get_semantic_cache_stats()
+    if semantic_cache_stats is not None:
+        all_stats.append(semantic_cache_stats)
+
+    return _stats_to_metrics('assistful_cache', 'cache', all_stats, _CACHE_COUNTERS, ('size',))
+
+
+def _collect_buffer_metrics() -> list[MetricFamily]:
+    from repository.write_behind import get_all_buffer_stats
+
+    return _stats_to_metrics(
+        'assistful_write_behind', 'buffer', get_all_buffer_stats(), _BUFFER_COUNTERS, ('queue_depth',))
+
+
+def _collect_scheduler_metrics() -> list[MetricFamily]:
+    from shared.models.ai.scheduling.llm_scheduler import LLM_SCHEDULER
+
+    stats = LLM_SCHEDULER.stats()
+    families = _stats_to_metrics('assistful_llm_scheduler', None, [stats], _SCHEDULER_COUNTERS, _SCHEDULER_GAUGES)
+    families.append(MetricFamily(
+        'assistful_llm_scheduler_rejected_total', 'counter', 'LLM calls rejected by the scheduler, by reason.',
+        [('', {'reason': reason}, count) for reason, count in stats['rejected'].items()]))
+
+    return families
+
+
+def _stats_to_metrics(prefix: str,
+                      label_name: str | None,
+                      all_stats: list[dict[str, Any]],
+                      counter_keys: tuple[str, ...],
+                      gauge_keys: tuple[str, ...]) -> list[MetricFamily]:
+    """
+    Convert stats dictionaries, like the ones of the caches, to metric families with one sample per dictionary.
+
+    :param prefix: The prefix of the metric names.
+    :param label_name: The label holding the 'name' of each dictionary, or None if there is a single dictionary.
+    :param all_stats: The stats dictionaries.
+    :param counter_keys: The keys of the stats that only increase. Keys missing from a dictionary are skipped.
+    :param gauge_keys: The keys of the stats that are current values.
+    :return: The metric families.
+    """
+    families = []
+    for metric_type, keys in (('counter', counter_keys), ('gauge', gauge_keys)):
+        for key in keys:
+            name = f'{prefix}_{key}_total' if metric_type == 'counter' else f'{prefix}_{key}'
+            family = MetricFamily(name, metric_type, f"The '{key}' stat.")
+            for stats in all_stats:
+                if key in stats:
+                    labels = {label_name: stats['name']} if label_name else {}
+                    family.samples.append(('', labels, stats[key]))
+
+            if family.samples:
+                families.append(family)
+
+    return families
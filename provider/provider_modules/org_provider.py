@@ -1,6 +1,7 @@
 from provider.provider_modules import auth_provider
 from repository.repo_modules import org_repo
 from shared.globals.objects import NO_USER_CONTEXT, OWNER_CONTEXT
+from shared.models.ai.scheduling.llm_scheduler import LLMOrgPolicy, DEFAULT_ORG_POLICY
 from shared.models.dto.org_dto import OrgDTO
 from shared.models.security.user_context import UserContext
 
@@ -32,3 +33,19 @@ def get_org_info(ctx: UserContext) -> OrgDTO:
     org = org_repo.get(ctx, ctx.org_id)
 
     return org
+
+
+def get_llm_org_policy(org_id: str) -> LLMOrgPolicy:
+    """
+    Get the LLM scheduling policy of an organization from the llm_max_concurrency and llm_weight fields
+    of its document, with the defaults for fields that are not set. Organization documents are cached.
+
+    :param org_id: The ID of the organization.
+    :return: The LLM scheduling policy of the organization.
+    """
+    org = org_repo.get(NO_USER_CONTEXT, org_id)
+
+    return LLMOrgPolicy(
+        max_concurrency=org.llm_max_concurrency or DEFAULT_ORG_POLICY.max_concurrency,
+        weight=org.llm_weight or DEFAULT_ORG_POLICY.weight
+    )
@@ -1,6 +1,9 @@
 from typing import Optional
 
+from shared.tracing import traced
 
+
+@traced('spec.from_uri', 'spec')
 def spec_from_uri(spec_uri: str, base_uri: Optional[str] = None) -> dict:
     """
     Retrieve API specification from a URI.
@@ -14,6 +17,7 @@ def spec_from_uri(spec_uri: str, base_uri: Optional[str] = None) -> dict:
     return spec_from_dict(spec, base_uri)
 
 
+@traced('spec.from_dict', 'spec')
 def spec_from_dict(spec: dict, base_uri: Optional[str] = None) -> dict:
     """
     Convert a Swagger/OpenAPI specification from a dictionary to the OpenAPI format.
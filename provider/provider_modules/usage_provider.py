@@ -0,0 +1,47 @@
+from repository.repo_modules import usage_repo
+from shared.globals.constants import USAGE_REPORT_MAX_LIMIT
+from shared.globals.enums import UsageScopes, AccessLevels
+from shared.models.data_class.token_usage_dc import TokenUsageDC
+from shared.models.security.user_context import UserContext
+
+
+def record_usage(ctx: UserContext,
+                 usage: TokenUsageDC,
+                 chat_id: str | None = None,
+                 chatbot_id: str | None = None,
+                 assistant_id: str | None = None) -> None:
+    """
+    Attribute the usage of LLM calls to the org of the user, and to the chat, chatbot and assistant they were made for.
+    The totals are written in the background, so recording never slows down the request.
+
+    :param ctx: The user context of the calls.
+    :param usage: The usage of the calls, from a TokenUsageCallbackHandler.
+    :param chat_id: The chat the calls were made for, if any.
+    :param chatbot_id: The chatbot the calls were made for, if any.
+    :param assistant_id: The assistant the calls were made for, if any.
+    """
+    if usage.calls == 0 or ctx.org_id is None:
+        return
+
+    subjects = [(UsageScopes.ORG.value, ctx.org_id)]
+    for scope, subject_id in ((UsageScopes.CHAT, chat_id),
+                              (UsageScopes.CHATBOT, chatbot_id),
+                              (UsageScopes.ASSISTANT, assistant_id)):
+        if subject_id is not None:
+            subjects.append((scope.value, subject_id))
+
+    usage_repo.add_usage(ctx.org_id, subjects, usage)
+
+
+def get_usage_report(ctx: UserContext, scope: UsageScopes, limit: int) -> list[TokenUsageDC]:
+    """
+    Get the subjects of a scope that used the most tokens, to find the chats, chatbots, assistants and orgs
+    that dominate cost and latency. Only OWNER users see the usage of every org, other users see their own org.
+
+    :param ctx: The user context for the request.
+    :param scope: The scope of the subjects to report.
+    :param limit: The maximum number of subjects to report, capped at USAGE_REPORT_MAX_LIMIT.
+    :return: The usage of the subjects, most tokens first.
+    """
+    org_id = None if ctx.access_level == AccessLevels.OWNER and scope == UsageScopes.ORG else ctx.org_id
+    return usage_repo.get_by_scope(org_id, scope.value, max(1, min(limit, USAGE_REPORT_MAX_LIMIT)))
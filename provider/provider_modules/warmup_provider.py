@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable
+
+from shared.globals.constants import WARMUP_BUDGET_SECONDS, WARMUP_HOT_CHATBOTS, WARMUP_TOOL_INDEX
+from shared.globals.enums import UsageScopes
+from shared.tracing import span, submit_traced
+
+logger = logging.getLogger(__name__)
+
+# The reports of the warm-up tasks by name, updated by the tasks as they finish, and the futures of the tasks.
+_task_reports: dict[str, dict[str, Any]] = {}
+_task_futures: dict[str, Future] = {}
+_warmup_lock = threading.Lock()
+
+
+def warm_up(budget_seconds: float = WARMUP_BUDGET_SECONDS) -> dict[str, Any]:
+    """
+    Prepare a new instance for its first requests: create the Vertex AI client of the chat model, build the tool index
+    and semantic cache of the agent, and read the most used chatbots into the repo cache, which also opens
+    the Firestore connection. The tasks run in parallel, and the warm-up returns once they are all done
+    or the budget runs out. Tasks still running then keep going in the background.
+
+    Every task runs once per process, so the warm-up is cheap to call again. Later calls only wait for the tasks
+    still running. A task that failed is not retried, and the first request needing its resource prepares it instead.
+
+    :param budget_seconds: The maximum number of seconds to wait for the tasks.
+    :return: Whether every task is done, the duration of the call, and the status (running, done or failed),
+             duration and any result of each task. Errors are logged, not reported.
+    """
+    start = time.perf_counter()
+    with _warmup_lock:
+        tasks = {name: task for name, task in _get_tasks().items() if name not in _task_reports}
+        for name, task in tasks.items():
+            _task_reports[name] = {'status': 'running'}
+
+        with span('warmup', 'warmup', tasks=len(tasks)):
+            if tasks:
+                executor = ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix='warmup')
+                for name, task in tasks.items():
+                    _task_futures[name] = submit_traced(executor, _run_task, name, task)
+                executor.shutdown(wait=False)
+
+            wait(_task_futures.values(), timeout=budget_seconds)
+
+        task_reports = {name: dict(report) for name, report in _task_reports.items()}
+
+    return {
+        'complete': all(report['status'] == 'done' for report in task_reports.values()),
+        'seconds': round(time.perf_counter() - start, 3),
+        'tasks': task_reports
+    }
+
+
+def _get_tasks() -> dict[str, Callable[[], Any]]:
+    from provider.provider_modules.ai import chat_provider, scrap_provider
+
+    return {
+        'chat_model': chat_provider.warm_up,
+        'agent': lambda: scrap_provider.warm_up(tool_index=WARMUP_TOOL_INDEX),
+        'chatbot_cache': _prime_hot_chatbots
+    }
+
+
+def _run_task(name: str, task: Callable[[], Any]) -> None:
+    start = time.perf_counter()
+    try:
+        with span(f'warmup.{name}', 'warmup'):
+            result = task()
+
+        report = {'status': 'done', 'seconds': round(time.perf_counter() - start, 3)}
+        if result is not None:
+            report['result'] = result
+    except Exception as ex:
+        logger.warning(f"Warm-up task '{name}' failed: {ex}")
+        # The report is served by public routes, so the error is only logged.
+        report = {'status': 'failed', 'seconds': round(time.perf_counter() - start, 3)}
+
+    _task_reports[name] = report
+
+
+def _prime_hot_chatbots() -> int:
+    """
+    Read the chatbots that used the most tokens into the chatbot cache.
+
+    :return: The number of chatbots cached.
+    """
+    from repository.repo_modules import chatbot_repo, usage_repo
+
+    usages = usage_repo.get_by_scope(None, UsageScopes.CHATBOT.value, WARMUP_HOT_CHATBOTS)
+    return chatbot_repo.prime_cache([usage.subject_id for usage in usages])
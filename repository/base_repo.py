@@ -1,25 +1,66 @@
+import logging
+from datetime import datetime
+from functools import wraps
 from http import HTTPStatus
-from typing import TypeVar, Generic
+from typing import Any, TypeVar, Generic, Callable
 
 import flask
 
 from firebase_admin.firestore import firestore as fs
+from google.api_core.exceptions import FailedPrecondition
 
+from repository.firestore import db
+from shared.caching import LRUTTLCache
 from shared.globals import constants
 from shared.globals.constants import OWNER_ID, FIELD_ORG_ID, TYPE_NAME_ORG
 from shared.globals.enums import AccessLevels
 from shared.models.base_dto import BaseDTOFactory, BaseDTO
 from shared.models.security.user_context import UserContext
+from shared.tracing import span, current_span
 
 T_DTO = TypeVar('T_DTO', BaseDTO, None)
 
+logger = logging.getLogger(__name__)
+
+
+def _traced(operation: str) -> Callable:
+    """
+    Decorator that times every call of a repo method as a Firestore span, tagged with the document type of the repo.
+
+    :param operation: The name of the operation, like 'get'.
+    :return: The decorator.
+    """
+
+    def outer_func(func_to_wrap):
+        @wraps(func_to_wrap)
+        def inner_func(self, *args, **kwargs):
+            with span(f'firestore.{operation}', 'firestore', collection=self.doc_type_name):
+                return func_to_wrap(self, *args, **kwargs)
+
+        return inner_func
+
+    return outer_func
+
 
 class GenericRepo(Generic[T_DTO]):
-    def __init__(self, doc_type_name: str, collection_ref: fs.CollectionReference, dto_factory: type[BaseDTOFactory]):
+    def __init__(self,
+                 doc_type_name: str,
+                 collection_ref: fs.CollectionReference,
+                 dto_factory: type[BaseDTOFactory],
+                 cache: LRUTTLCache | None = None):
+        """
+        :param doc_type_name: The display name of the document type.
+        :param collection_ref: The Firestore collection holding the documents.
+        :param dto_factory: The factory that creates DTOs from document snapshots.
+        :param cache: Optional read-through cache for document snapshots. Entries are invalidated by writes made
+                      through this repo, so it should only be enabled for documents that are read far more than written.
+        """
         self.doc_type_name = doc_type_name
         self.collection_ref = collection_ref
         self.dto_factory = dto_factory
+        self.cache = cache
 
+    @_traced('get')
     def get(self, ctx: UserContext, doc_id: str) -> T_DTO | None:
         """
         Get a document by its ID.
@@ -30,9 +71,24 @@ class GenericRepo(Generic[T_DTO]):
         :raises flask.abort(404): If the document does not exist.
         """
         doc_snap = self._validate_doc(ctx, doc_id)
-        doc_object: T_DTO = self.dto_factory.create_from_doc(doc_snap)
+        doc_object: T_DTO = self.dto_factory.create_from_doc(doc_snap, trusted=True)
         return doc_object
 
+    @_traced('get')
+    def get_with_update_time(self, ctx: UserContext, doc_id: str) -> tuple[T_DTO, datetime]:
+        """
+        Get a document by its ID, with the last update time of the snapshot it was read from,
+        to version the document without reading it again.
+
+        :param ctx: The user context for the request.
+        :param doc_id: The ID of the document to get.
+        :return: The document object and the time it was last updated.
+        :raises flask.abort(404): If the document does not exist.
+        """
+        doc_snap = self._validate_doc(ctx, doc_id)
+        return self.dto_factory.create_from_doc(doc_snap, trusted=True), doc_snap.update_time
+
+    @_traced('get_all')
     def get_all(self, ctx: UserContext) -> list[T_DTO | None]:
         """
         Retrieve all documents from the collection.
@@ -44,25 +100,40 @@ class GenericRepo(Generic[T_DTO]):
         """
         ctx.abort_if_insufficient_access(AccessLevels.ADMIN)
 
-        return [self.dto_factory.create_from_doc(doc_snap) for doc_snap in self.collection_ref.get()]
+        return [self.dto_factory.create_from_doc(doc_snap, trusted=True) for doc_snap in self.collection_ref.get()]
+
+    def new_doc_id(self) -> str:
+        """
+        Allocate a new document ID on the client, without a round trip to the database.
+
+        :return: A new, unused document ID for the collection.
+        """
+        return self.collection_ref.document().id
 
-    def insert(self, ctx: UserContext, insert_dto: T_DTO) -> str:
+    @_traced('insert')
+    def insert(self, ctx: UserContext, insert_dto: T_DTO, doc_id: str | None = None) -> str:
         """
         Inserts a new document into the database collection.
 
         :param ctx: The user context for the request.
         :param insert_dto: An instance of a data transfer object (DTO) representing the document to be inserted.
+        :param doc_id: Optional ID allocated with new_doc_id. A new ID is generated if not given.
         :return: The ID of the newly created document.
         """
-        insert_dto_dict = {k: v for k, v in insert_dto.__dict__.items() if k != insert_dto.id_name()}
+        insert_dto_dict = {k: v for k, v in insert_dto.to_dict().items() if k != insert_dto.id_name()}
         if insert_dto.id_name() != constants.FIELD_ORG_ID and ctx.org_id is not None:
             insert_dto_dict[constants.FIELD_ORG_ID] = ctx.org_id
 
         insert_dto_dict[constants.FIELD_INSERT_USER] = OWNER_ID if ctx.user_id is None else ctx.user_id
 
+        if doc_id is not None:
+            self.collection_ref.document(doc_id).create(insert_dto_dict)
+            return doc_id
+
         _, new_doc_ref = self.collection_ref.add(insert_dto_dict)
         return new_doc_ref.id
 
+    @_traced('update')
     def update(self, ctx: UserContext, update_dto: T_DTO, ignore_none: bool = True) -> None:
         """
         This method updates a document in the Firestore database with the provided data from the update_dto parameter.
@@ -78,13 +149,15 @@ class GenericRepo(Generic[T_DTO]):
                             Default is True.
         :raises flask.abort(404): If the document does not exist.
         """
-        update_dto_dict = {k: v for k, v in update_dto.__dict__.items() if
+        update_dto_dict = {k: v for k, v in update_dto.to_dict().items() if
                            k not in [update_dto.id_name(), constants.FIELD_ORG_ID] and (ignore_none or v is not None)}
         update_dto_dict[constants.FIELD_UPDATE_USER] = OWNER_ID if ctx.user_id is None else ctx.user_id
 
-        doc_snap = self._validate_doc(ctx, update_dto.id_value())
+        doc_snap = self._validate_doc(ctx, update_dto.id_value(), use_cache=False)
         doc_snap.reference.update(update_dto_dict)
+        self._invalidate(update_dto.id_value())
 
+    @_traced('add_elements')
     def add_elements(self, ctx: UserContext, doc_id: str, array_field_name: str, new_elements: list[str]) -> None:
         """
         :param ctx: UserContext object containing user information
@@ -95,18 +168,66 @@ class GenericRepo(Generic[T_DTO]):
 
         The add_elements method is used to add new elements to an array field in a Firestore document.
         It takes in the user context, document ID, array field name, and new elements as parameters.
+        The update only applies if the document did not change since it was read, and is retried otherwise,
+        so concurrent appends from other requests or instances are not lost.
         """
-        doc_snap = self._validate_doc(ctx, doc_id)
-        if doc_snap is None or not doc_snap.exists:
-            return
-
-        array_field_value = doc_snap.get(array_field_name)
-        if array_field_value is None:
-            raise Exception(f'The {array_field_name} field does not exist on the {self.doc_type_name} type')
-
-        array_field_value += new_elements
-        doc_snap.reference.update({array_field_name: array_field_value})
-
+        for attempt in range(1, constants.FIRESTORE_ARRAY_UPDATE_MAX_ATTEMPTS + 1):
+            doc_snap = self._validate_doc(ctx, doc_id, use_cache=False)
+            if doc_snap is None or not doc_snap.exists:
+                return
+
+            array_field_value = doc_snap.get(array_field_name)
+            if array_field_value is None:
+                raise Exception(f'The {array_field_name} field does not exist on the {self.doc_type_name} type')
+
+            array_field_value += new_elements
+            try:
+                doc_snap.reference.update({array_field_name: array_field_value},
+                                          option=db.write_option(last_update_time=doc_snap.update_time))
+                break
+            except FailedPrecondition:
+                if attempt == constants.FIRESTORE_ARRAY_UPDATE_MAX_ATTEMPTS:
+                    raise
+
+        self._invalidate(doc_id)
+
+    @_traced('add_elements_batch')
+    def add_elements_batch(self,
+                           array_field_name: str,
+                           new_elements_by_doc: dict[str, tuple[UserContext, list[str]]],
+                           chunk_size: int = constants.FIRESTORE_GET_ALL_CHUNK_SIZE) -> tuple[list[str], list[str]]:
+        """
+        Add new elements to an array field of many documents, with one read and one batched write per chunk of
+        documents instead of a read and a write per document.
+        Each chunk is committed atomically, and a chunk that fails does not stop the chunks after it. Documents that
+        no longer exist or that the user context cannot access are skipped, since there is no request left to answer
+        with 404.
+
+        :param array_field_name: The name of the array field in the documents.
+        :param new_elements_by_doc: The user context and the new elements to add, by document ID.
+        :param chunk_size: The number of documents read and committed together, at most FIRESTORE_GET_ALL_CHUNK_SIZE.
+                           A chunk size of 1 keeps a document that cannot be written from failing the others.
+        :return: The IDs of the documents that were skipped, and of the documents in chunks that failed to commit.
+                 Every other document was written.
+        """
+        skipped_doc_ids = []
+        failed_doc_ids = []
+        doc_ids = list(new_elements_by_doc)
+        for i in range(0, len(doc_ids), chunk_size):
+            chunk_doc_ids = doc_ids[i:i + chunk_size]
+            try:
+                skipped_doc_ids += self._add_elements_chunk(array_field_name, chunk_doc_ids, new_elements_by_doc)
+            except Exception as ex:
+                logger.warning(f'Failed to add {array_field_name} elements to {len(chunk_doc_ids)} '
+                               f'{self.doc_type_name} documents: {ex}')
+                failed_doc_ids += chunk_doc_ids
+
+        for doc_id in doc_ids:
+            self._invalidate(doc_id)
+
+        return skipped_doc_ids, failed_doc_ids
+
+    @_traced('delete')
     def delete(self, ctx: UserContext, doc_id: str) -> None:
         """
         Delete a document from the Firestore collection.
@@ -117,28 +238,132 @@ class GenericRepo(Generic[T_DTO]):
         """
         ctx.abort_if_insufficient_access(AccessLevels.ADMIN_OWNER)
 
-        doc_snap = self._validate_doc(ctx, doc_id)
+        doc_snap = self._validate_doc(ctx, doc_id, use_cache=False)
         doc_snap.reference.delete()
+        self._invalidate(doc_id)
+
+    @_traced('prime_cache')
+    def prime_cache(self, doc_ids: list[str]) -> int:
+        """
+        Read documents into the read-through cache ahead of their first request, with batched multi-document reads.
+        Access is still checked when the cached documents are read.
+
+        :param doc_ids: The IDs of the documents to cache.
+        :return: The number of documents cached, or 0 if caching is disabled for this repo.
+        """
+        if self.cache is None:
+            return 0
+
+        cached_count = 0
+        for i in range(0, len(doc_ids), constants.FIRESTORE_GET_ALL_CHUNK_SIZE):
+            doc_refs = [self.collection_ref.document(doc_id)
+                        for doc_id in doc_ids[i:i + constants.FIRESTORE_GET_ALL_CHUNK_SIZE]]
+            generation = self.cache.generation()
+            for doc_snap in db.get_all(doc_refs):
+                if doc_snap.exists and self.cache.put(doc_snap.id, doc_snap, generation):
+                    cached_count += 1
 
-    def _validate_doc(self, ctx: UserContext, doc_id: str) -> fs.DocumentSnapshot:
+        return cached_count
+
+    def cache_stats(self) -> dict[str, Any] | None:
+        """
+        Get the hit/miss statistics of the read-through cache.
+
+        :return: The cache stats, or None if caching is disabled for this repo.
+        """
+        return self.cache.stats() if self.cache is not None else None
+
+    def _add_elements_chunk(self,
+                            array_field_name: str,
+                            doc_ids: list[str],
+                            new_elements_by_doc: dict[str, tuple[UserContext, list[str]]]) -> list[str]:
+        """
+        Add new elements to an array field of a chunk of documents, with one read and one atomic batched write.
+        Each document is only written if it did not change since it was read, so elements appended concurrently
+        by other requests or instances are not overwritten. The chunk is read and written again if any changed.
+
+        :param array_field_name: The name of the array field in the documents.
+        :param doc_ids: The IDs of the documents of the chunk.
+        :param new_elements_by_doc: The user context and the new elements to add, by document ID.
+        :return: The IDs of the documents that were skipped.
+        :raises FailedPrecondition: If documents kept changing for FIRESTORE_ARRAY_UPDATE_MAX_ATTEMPTS attempts.
+        """
+        for attempt in range(1, constants.FIRESTORE_ARRAY_UPDATE_MAX_ATTEMPTS + 1):
+            skipped_doc_ids = []
+            batch = db.batch()
+            doc_refs = [self.collection_ref.document(doc_id) for doc_id in doc_ids]
+            for doc_snap in db.get_all(doc_refs, field_paths=[FIELD_ORG_ID, array_field_name]):
+                ctx, new_elements = new_elements_by_doc[doc_snap.id]
+                if not doc_snap.exists or not self._has_org_access_to_doc(ctx, doc_snap):
+                    skipped_doc_ids.append(doc_snap.id)
+                    continue
+
+                array_field_value = doc_snap.get(array_field_name) or []
+                batch.update(doc_snap.reference, {array_field_name: array_field_value + new_elements},
+                             option=db.write_option(last_update_time=doc_snap.update_time))
+
+            try:
+                batch.commit()
+                return skipped_doc_ids
+            except FailedPrecondition:
+                if attempt == constants.FIRESTORE_ARRAY_UPDATE_MAX_ATTEMPTS:
+                    raise
+
+    def _validate_doc(self, ctx: UserContext, doc_id: str, use_cache: bool = True) -> fs.DocumentSnapshot:
         """
         Validate a document by its ID. Gets document data if the document exists.
+        Writes should pass use_cache=False so they always act on the latest document data.
 
         :param ctx: The user context for the request.
         :type ctx: UserContext
         :return: A tuple containing the reference to the document and the document snapshot.
         :param doc_id: The ID of the document to validate.
         :type doc_id: str
+        :param use_cache: Whether the document may be served from the read-through cache.
+        :type use_cache: bool
         :return: A snapshot containing the document data.
         :rtype: DocumentSnapshot
         """
-        doc_ref = self.collection_ref.document(doc_id)
-        doc_snap = doc_ref.get()
+        doc_snap = self._get_doc_snap(doc_id) if use_cache else self.collection_ref.document(doc_id).get()
         if not doc_snap.exists or not self._has_org_access_to_doc(ctx, doc_snap):
             flask.abort(HTTPStatus.NOT_FOUND, f"{self.doc_type_name} '{doc_id}' not found")
 
         return doc_snap
 
+    def _get_doc_snap(self, doc_id: str) -> fs.DocumentSnapshot:
+        """
+        Get a document snapshot through the read-through cache, if enabled.
+        Only existing documents are cached, so newly created documents are never hidden by a cached miss.
+
+        :param doc_id: The ID of the document to get.
+        :return: The document snapshot.
+        """
+        if self.cache is None:
+            return self.collection_ref.document(doc_id).get()
+
+        doc_snap = self.cache.get(doc_id)
+        repo_span = current_span()
+        if repo_span is not None:
+            repo_span.set_attribute('cache', 'miss' if doc_snap is None else 'hit')
+
+        if doc_snap is None:
+            # A change invalidated while the read is in flight would otherwise be cached as the old snapshot.
+            generation = self.cache.generation()
+            doc_snap = self.collection_ref.document(doc_id).get()
+            if doc_snap.exists:
+                self.cache.put(doc_id, doc_snap, generation)
+
+        return doc_snap
+
+    def _invalidate(self, doc_id: str) -> None:
+        """
+        Remove a document from the read-through cache, if enabled.
+
+        :param doc_id: The ID of the document that changed.
+        """
+        if self.cache is not None:
+            self.cache.invalidate(doc_id)
+
     def _has_org_access_to_doc(self, ctx: UserContext, doc_snap: fs.DocumentSnapshot):
         """
         :param ctx: The UserContext object representing the current user's context.
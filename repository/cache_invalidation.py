@@ -0,0 +1,125 @@
+import logging
+import threading
+
+from google.cloud.firestore_v1.watch import ChangeType, Watch
+
+from repository.base_repo import GenericRepo
+from shared.globals.constants import REPO_CACHE_TTL_SECONDS, REPO_CACHE_LISTENED_TTL_SECONDS, \
+    REPO_CACHE_LISTENER_CHECK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_watches: dict[str, tuple[GenericRepo, Watch]] = {}
+_watches_lock = threading.Lock()
+_monitor_stop = threading.Event()
+_monitor_thread: threading.Thread | None = None
+
+
+def start_cache_invalidation_listeners(repos: list[GenericRepo]) -> None:
+    """
+    Subscribe to Firestore snapshot listeners for the collections of the given repos,
+    so documents changed by any instance are evicted from this instance's read-through cache.
+
+    Once a listener delivered its initial snapshot, the cache of its repo is cleared and its TTL is raised to
+    REPO_CACHE_LISTENED_TTL_SECONDS. A background monitor falls back to the short TTL and resubscribes
+    if a listener stops streaming.
+
+    A listener streams its whole collection: its initial snapshot is billed as one read per document, on every
+    instance start and every resubscribe, and every instance keeps a snapshot of every document in memory for as
+    long as it listens. This suits the small, rarely written chatbot, assistant and organization collections.
+    Large collections should be cached with a short TTL instead.
+
+    :param repos: The repos whose caches should be kept coherent. Repos without a cache are skipped.
+    """
+    global _monitor_thread
+
+    for repo in repos:
+        if repo.cache is not None:
+            _subscribe(repo)
+
+    with _watches_lock:
+        if _monitor_thread is None and any(_watches):
+            _monitor_stop.clear()
+            _monitor_thread = threading.Thread(target=_monitor_listeners, name='cache-invalidation', daemon=True)
+            _monitor_thread.start()
+
+
+def stop_cache_invalidation_listeners() -> None:
+    """
+    Unsubscribe every snapshot listener and restore the short cache TTLs.
+    Cached entries are cleared, since changes are no longer being observed.
+    """
+    global _monitor_thread
+
+    _monitor_stop.set()
+    with _watches_lock:
+        watches = list(_watches.values())
+        _watches.clear()
+        _monitor_thread = None
+
+    for repo, watch in watches:
+        _unsubscribe(repo, watch)
+
+
+def _subscribe(repo: GenericRepo) -> None:
+    """
+    Start a snapshot listener that invalidates cached documents of the repo when they are modified or removed.
+
+    :param repo: The repo to listen to.
+    """
+    initial_snapshot_done = threading.Event()
+
+    def on_snapshot(_collection_snapshot, changes, _read_time) -> None:
+        if not initial_snapshot_done.is_set():
+            # Every document arrives as ADDED in the initial snapshot, so entries cached before the stream was current
+            # would never be evicted. They are dropped, and only from here on can the TTL be long.
+            repo.cache.clear()
+            repo.cache.ttl_seconds = REPO_CACHE_LISTENED_TTL_SECONDS
+            initial_snapshot_done.set()
+            return
+
+        for change in changes:
+            if change.type in (ChangeType.MODIFIED, ChangeType.REMOVED):
+                repo.cache.invalidate(change.document.id)
+
+    try:
+        watch = repo.collection_ref.on_snapshot(on_snapshot)
+    except Exception as ex:
+        logger.warning(f'Failed to listen for {repo.doc_type_name} changes, caching with a short TTL: {ex}')
+        return
+
+    with _watches_lock:
+        _watches[repo.cache.name] = (repo, watch)
+
+
+def _unsubscribe(repo: GenericRepo, watch: Watch) -> None:
+    """
+    Stop a snapshot listener and make the repo cache safe to use without it.
+
+    :param repo: The repo that was listened to.
+    :param watch: The listener to stop.
+    """
+    repo.cache.ttl_seconds = REPO_CACHE_TTL_SECONDS
+    repo.cache.clear()
+
+    try:
+        watch.unsubscribe()
+    except Exception as ex:
+        logger.warning(f'Failed to stop listening for {repo.doc_type_name} changes: {ex}')
+
+
+def _monitor_listeners() -> None:
+    """
+    Periodically check that every listener is still streaming. A listener that stopped could miss changes,
+    so its cache is dropped back to the short TTL and a new listener is started.
+    """
+    while not _monitor_stop.wait(REPO_CACHE_LISTENER_CHECK_SECONDS):
+        with _watches_lock:
+            inactive_watches = [(name, repo, watch) for name, (repo, watch) in _watches.items() if not watch.is_active]
+            for name, _, _ in inactive_watches:
+                del _watches[name]
+
+        for _, repo, watch in inactive_watches:
+            logger.warning(f'Listener for {repo.doc_type_name} changes stopped, resubscribing')
+            _unsubscribe(repo, watch)
+            _subscribe(repo)
@@ -1,9 +1,18 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import firebase_admin
 from firebase_admin import firestore, credentials
 from firebase_admin.firestore import firestore as fs
 
+from shared.globals.constants import FIRESTORE_IO_MAX_WORKERS
 from shared.globals.objects import FIREBASE_CREDS
+from shared.lifecycle import register_shutdown_hook
 
 firebase_admin.initialize_app(credentials.Certificate(FIREBASE_CREDS))
 
 db: fs.Client = firestore.client()
+
+# Long-lived pool for fanning out Firestore I/O. Creating a pool per call costs more than the RPCs it saves.
+io_executor = ThreadPoolExecutor(max_workers=FIRESTORE_IO_MAX_WORKERS, thread_name_prefix='firestore-io')
+# Registered at import, before the write-behind buffers that register on first use, so it runs after they flush.
+register_shutdown_hook('firestore-io', io_executor.shutdown)
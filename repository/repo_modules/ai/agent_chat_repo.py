@@ -0,0 +1,63 @@
+from repository.base_repo import GenericRepo
+from repository.firestore import db
+from shared.models.dto.agent_chat_dto import AgentChatDTO, AgentChatDTOFactory
+from shared.models.security.user_context import UserContext
+
+AGENT_CHATS = GenericRepo[AgentChatDTO]('AgentChat', db.collection('agent_chats'), AgentChatDTOFactory)
+
+
+def get(ctx: UserContext, chat_id: str) -> AgentChatDTO | None:
+    """
+    Retrieve the conversation memory of an agent chat.
+
+    :param ctx: The user context.
+    :param chat_id: The ID of the agent chat.
+    :return: The agent chat.
+    :raises flask.abort(404): If the agent chat does not exist.
+    """
+    return AGENT_CHATS.get(ctx, chat_id)
+
+
+def new_id() -> str:
+    """
+    Allocates a new agent chat ID on the client, without a round trip to the database.
+
+    :return: A new, unused agent chat ID.
+    """
+    return AGENT_CHATS.new_doc_id()
+
+
+def insert(ctx: UserContext, agent_chat: AgentChatDTO, chat_id: str) -> str:
+    """
+    Inserts a new agent chat into the database.
+
+    :param ctx: The user context.
+    :param agent_chat: The agent chat DTO to be inserted.
+    :param chat_id: The agent chat ID allocated with new_id.
+    :return: The ID of the new agent chat.
+    """
+    return AGENT_CHATS.insert(ctx, agent_chat, chat_id)
+
+
+def set_history(ctx: UserContext, chat_id: str, history: list[str]) -> None:
+    """
+    Replaces the remembered messages of an agent chat. The history is trimmed by the caller,
+    so it is rewritten whole instead of appended to.
+
+    :param ctx: The user context.
+    :param chat_id: The ID of the agent chat.
+    :param history: The messages to remember.
+    :raises flask.abort(404): If the agent chat does not exist.
+    """
+    AGENT_CHATS.update(ctx, AgentChatDTO(chat_id=chat_id, history=history))
+
+
+def delete(ctx: UserContext, chat_id: str) -> None:
+    """
+    Deletes an agent chat and its conversation memory.
+
+    :param ctx: The user context.
+    :param chat_id: The ID of the agent chat.
+    :raises flask.abort(404): If the agent chat does not exist.
+    """
+    AGENT_CHATS.delete(ctx, chat_id)
@@ -1,10 +1,11 @@
 import zlib
-from concurrent.futures import ThreadPoolExecutor
 
 from firebase_admin.firestore import firestore as fs
 
-from repository.firestore import db
+from repository.firestore import db, io_executor
+from shared.globals.constants import FIRESTORE_GET_ALL_CHUNK_SIZE
 from shared.models.dto.tool_dto import ToolDTO
+from shared.tracing import span, submit_traced
 
 TOOL_COLLECTION = db.collection('tools')
 
@@ -28,7 +29,8 @@ def insert(tools: list[ToolDTO]) -> list[str]:
         compressed_api_operation: bytes = zlib.compress(tool.api_operation.encode())
         batch.set(tool_ref, {'api_operation': compressed_api_operation})
 
-    batch.commit()
+    with span('firestore.insert', 'firestore', collection='Tool', count=len(tools)):
+        batch.commit()
 
     return tool_ids
 
@@ -36,20 +38,26 @@ def insert(tools: list[ToolDTO]) -> list[str]:
 def get(tool_ids: list[str]) -> list[ToolDTO]:
     """
     Retrieve a list of tools based on the provided tool IDs.
+    Tools are fetched with batched multi-document reads, one RPC per chunk of IDs.
 
     :param tool_ids: A list of tool IDs.
-    :return: A list of ToolDTO objects representing the tools.
+    :return: A list of ToolDTO objects representing the tools, in the order of the given IDs.
     """
-    tools = []
-    tool_futures = {tool_id: None for tool_id in tool_ids}
-
-    with ThreadPoolExecutor() as executor:
-        for tool_id in tool_ids:
-            tool_futures[tool_id] = executor.submit(_fetch_tool, tool_id)
+    chunks = [tool_ids[i:i + FIRESTORE_GET_ALL_CHUNK_SIZE] for i in range(0, len(tool_ids), FIRESTORE_GET_ALL_CHUNK_SIZE)]
+    tool_snaps: dict[str, fs.DocumentSnapshot] = {}
+    with span('firestore.get', 'firestore', collection='Tool', count=len(tool_ids)):
+        if len(chunks) > 1:
+            futures = [submit_traced(io_executor, _fetch_tools, chunk) for chunk in chunks]
+            chunk_snaps = [future.result() for future in futures]
+        else:
+            chunk_snaps = [_fetch_tools(chunk) for chunk in chunks]
+
+        for snaps in chunk_snaps:
+            tool_snaps.update({tool_snap.id: tool_snap for tool_snap in snaps})
 
+    tools = []
     for tool_id in tool_ids:
-        tool_snap: fs.DocumentSnapshot = tool_futures[tool_id].result()
-
+        tool_snap = tool_snaps.get(tool_id)
         if not tool_snap or not tool_snap.exists:
             continue
 
@@ -64,14 +72,12 @@ def get(tool_ids: list[str]) -> list[ToolDTO]:
     return tools
 
 
-def _fetch_tool(tool_id: str) -> fs.DocumentSnapshot:
+def _fetch_tools(tool_ids: list[str]) -> list[fs.DocumentSnapshot]:
     """
-    Fetches a tool from the Firestore database.
+    Fetches a chunk of tools from the Firestore database in a single batched read.
 
-    :param tool_id: The ID of the tool to fetch.
-    :return: The document snapshot of the tool if it exists, otherwise None.
+    :param tool_ids: The IDs of the tools to fetch.
+    :return: The document snapshots of the tools that exist.
     """
-    tool_ref: fs.DocumentReference = TOOL_COLLECTION.document(tool_id)
-    tool_snap: fs.DocumentSnapshot = tool_ref.get()
-    if tool_snap.exists:
-        return tool_snap
+    tool_refs: list[fs.DocumentReference] = [TOOL_COLLECTION.document(tool_id) for tool_id in tool_ids]
+    return [tool_snap for tool_snap in db.get_all(tool_refs) if tool_snap.exists]
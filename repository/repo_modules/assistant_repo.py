@@ -1,9 +1,12 @@
 from repository.base_repo import GenericRepo
 from repository.firestore import db
+from shared.caching import LRUTTLCache
+from shared.globals.constants import REPO_CACHE_MAX_SIZE, REPO_CACHE_TTL_SECONDS
 from shared.models.dto.assistant_dto import AssistantDTO, AssistantDTOFactory
 from shared.models.security.user_context import UserContext
 
-ASSISTANTS = GenericRepo[AssistantDTO]('Assistant', db.collection('assistants'), AssistantDTOFactory)
+ASSISTANTS = GenericRepo[AssistantDTO]('Assistant', db.collection('assistants'), AssistantDTOFactory,
+                                       cache=LRUTTLCache('assistants', REPO_CACHE_MAX_SIZE, REPO_CACHE_TTL_SECONDS))
 
 
 def get(ctx: UserContext, assistant_id: str) -> AssistantDTO | None:
@@ -1,14 +1,42 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable
+
 from firebase_admin.firestore import firestore as fs
+from google.api_core.exceptions import Conflict
 
 from repository.base_repo import GenericRepo
-from repository.firestore import db
-from shared.globals.constants import FIELD_ORG_ID
+from repository.firestore import db, io_executor
+from repository.write_behind import WriteBehindBuffer
+from shared.globals.constants import FIELD_ORG_ID, CHAT_HISTORY_WRITE_BEHIND, CHAT_HISTORY_FLUSH_INTERVAL_SECONDS, \
+    CHAT_HISTORY_MAX_PENDING, CHAT_HISTORY_MAX_FLUSH_RETRIES, CHAT_INSERT_MAX_ATTEMPTS, \
+    CHAT_INSERT_RETRY_BACKOFF_SECONDS
 from shared.models.dto.chat_dto import ChatDTO, ChatDTOFactory
 from shared.models.security.user_context import UserContext
+from shared.tracing import span, submit_traced
 
 CHAT_DB = db.collection('chats')
 CHATS = GenericRepo[ChatDTO]('Chat', CHAT_DB, ChatDTOFactory)
 
+# Coalesces history appends and writes them in batches, when enabled. Reads overlay the appends not yet written.
+HISTORY_BUFFER = WriteBehindBuffer(
+    'chat_history',
+    CHATS,
+    'history',
+    CHAT_HISTORY_FLUSH_INTERVAL_SECONDS,
+    CHAT_HISTORY_MAX_PENDING,
+    CHAT_HISTORY_MAX_FLUSH_RETRIES
+) if CHAT_HISTORY_WRITE_BEHIND else None
+
+logger = logging.getLogger(__name__)
+
+# Inserts still in flight, by chat ID. Reads of a chat in this process wait for its insert to land first.
+_pending_inserts: dict[str, Future] = {}
+_pending_inserts_lock = threading.Lock()
+
 
 def get(ctx: UserContext, chat_id: str) -> ChatDTO | None:
     """
@@ -18,10 +46,30 @@ def get(ctx: UserContext, chat_id: str) -> ChatDTO | None:
     :param chat_id: The ID of the chat to retrieve.
     :return: The ChatDTO object if the chat is found, otherwise None.
     """
-    chat = CHATS.get(ctx, chat_id)
+    _wait_for_pending_insert(chat_id)
+    chat = _read_with_pending_history(lambda: CHATS.get(ctx, chat_id), chat_id)
     return chat
 
 
+def get_with_update_time(ctx: UserContext, chat_id: str) -> tuple[ChatDTO, datetime]:
+    """
+    Retrieve a specific chat by its chat_id, with the time the chat was last written to the database.
+    History messages still waiting to be written are added to the chat, but do not change the update time.
+
+    :param ctx: The user context.
+    :param chat_id: The ID of the chat to retrieve.
+    :return: The ChatDTO object and its last update time.
+    """
+    _wait_for_pending_insert(chat_id)
+    if HISTORY_BUFFER is None:
+        return CHATS.get_with_update_time(ctx, chat_id)
+
+    (chat, update_time), pending_history = HISTORY_BUFFER.read_through(
+        lambda: CHATS.get_with_update_time(ctx, chat_id), chat_id)
+    chat.history = chat.history + pending_history.get(chat_id, [])
+    return chat, update_time
+
+
 def get_by_chatbot_id(ctx: UserContext, chatbot_id: str) -> list[ChatDTO] | None:
     """
     Retrieves a list of ChatDTO objects based on the chatbot ID.
@@ -30,12 +78,16 @@ def get_by_chatbot_id(ctx: UserContext, chatbot_id: str) -> list[ChatDTO] | None
     :param chatbot_id: The chatbot ID to filter the chats by.
     :return: A list of ChatDTO objects or None if no chats are found.
     """
-    chat_docs = (CHAT_DB
-                 .where(filter=fs.FieldFilter('respondent_id', '==', chatbot_id))
-                 .where(filter=fs.FieldFilter(FIELD_ORG_ID, '==', ctx.org_id))
-                 .get())
+    def get_chats() -> list[ChatDTO]:
+        with span('firestore.query', 'firestore', collection=CHATS.doc_type_name):
+            chat_docs = (CHAT_DB
+                         .where(filter=fs.FieldFilter('respondent_id', '==', chatbot_id))
+                         .where(filter=fs.FieldFilter(FIELD_ORG_ID, '==', ctx.org_id))
+                         .get())
+
+        return [ChatDTOFactory.create_from_doc(chat_doc, trusted=True) for chat_doc in chat_docs]
 
-    return [ChatDTOFactory.create_from_doc(chat_doc) for chat_doc in chat_docs]
+    return _read_with_pending_history(get_chats)
 
 
 def get_all(ctx: UserContext) -> list[ChatDTO | None]:
@@ -45,28 +97,135 @@ def get_all(ctx: UserContext) -> list[ChatDTO | None]:
     :param ctx: User context.
     :return: A list of ChatDTO objects or None if there are no chats found.
     """
-    all_chats = CHATS.get_all(ctx)
+    all_chats = _read_with_pending_history(lambda: CHATS.get_all(ctx))
     return all_chats
 
 
-def insert(ctx: UserContext, chat: ChatDTO) -> str:
+def new_id() -> str:
+    """
+    Allocates a new chat ID on the client, without a round trip to the database.
+
+    :return: A new, unused chat ID.
+    """
+    return CHATS.new_doc_id()
+
+
+def insert(ctx: UserContext, chat: ChatDTO, chat_id: str | None = None) -> str:
     """
     Inserts a new chat into the database.
 
     :param ctx: The user context.
     :param chat: The chat DTO to be inserted.
+    :param chat_id: Optional chat ID allocated with new_id.
     :return: The ID of the new chat.
     """
-    new_chat_id = CHATS.insert(ctx, chat)
+    new_chat_id = CHATS.insert(ctx, chat, chat_id)
     return new_chat_id
 
 
+def insert_async(ctx: UserContext, chat: ChatDTO, chat_id: str) -> Future:
+    """
+    Inserts a new chat into the database in the background, retrying with exponential backoff
+    up to CHAT_INSERT_MAX_ATTEMPTS times. Reads of the chat in this process wait for the insert, but other instances
+    may not see the chat until it lands. The caller has already answered when the last attempt fails,
+    so the chat is lost, which is why durable inserts are the default.
+
+    :param ctx: The user context.
+    :param chat: The chat DTO to be inserted.
+    :param chat_id: The chat ID allocated with new_id.
+    :return: A future that resolves to the ID of the new chat.
+    """
+    future = submit_traced(io_executor, _insert_with_retries, ctx, chat, chat_id)
+    with _pending_inserts_lock:
+        _pending_inserts[chat_id] = future
+
+    def on_done(done_future: Future) -> None:
+        with _pending_inserts_lock:
+            _pending_inserts.pop(chat_id, None)
+
+        if done_future.exception() is not None:
+            logger.error(f"Failed to insert chat '{chat_id}' after {CHAT_INSERT_MAX_ATTEMPTS} attempts, "
+                         f"the chat is lost: {done_future.exception()}")
+
+    future.add_done_callback(on_done)
+    return future
+
+
 def add_to_history(ctx: UserContext, chat_id: str, new_messages: list[str]) -> None:
     """
     Add new messages to the chat history.
+    With write-behind enabled, the messages are buffered and written in the background with other appends.
 
     :param ctx: The user context.
     :param chat_id: The ID of the chat.
     :param new_messages: List of new messages to be added.
     """
+    _wait_for_pending_insert(chat_id)
+    if HISTORY_BUFFER is not None:
+        HISTORY_BUFFER.append(ctx, chat_id, new_messages)
+        return
+
     CHATS.add_elements(ctx, chat_id, 'history', new_messages)
+
+
+def _insert_with_retries(ctx: UserContext, chat: ChatDTO, chat_id: str) -> str:
+    """
+    Inserts a new chat, retrying failed attempts with exponential backoff.
+    An attempt that failed may still have written the chat, so a retry finding the chat already there succeeds.
+
+    :param ctx: The user context.
+    :param chat: The chat DTO to be inserted.
+    :param chat_id: The chat ID allocated with new_id.
+    :return: The ID of the new chat.
+    """
+    for attempt in range(1, CHAT_INSERT_MAX_ATTEMPTS + 1):
+        try:
+            return CHATS.insert(ctx, chat, chat_id)
+        except Conflict:
+            if attempt == 1:
+                raise
+
+            return chat_id
+        except Exception as ex:
+            if attempt == CHAT_INSERT_MAX_ATTEMPTS:
+                raise
+
+            backoff_seconds = CHAT_INSERT_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+            logger.warning(f"Failed to insert chat '{chat_id}' (attempt {attempt}), "
+                           f"retrying in {backoff_seconds}s: {ex}")
+            time.sleep(backoff_seconds)
+
+
+def _read_with_pending_history(read: Callable[[], ChatDTO | list[ChatDTO]],
+                               chat_id: str | None = None) -> ChatDTO | list[ChatDTO]:
+    """
+    Read one or more chats, adding the history messages still waiting in the write-behind buffer, if enabled.
+
+    :param read: The function reading the chat(s) from the database.
+    :param chat_id: The ID of the chat being read, or None if the read spans several chats.
+    :return: The chat(s) with their complete history.
+    """
+    if HISTORY_BUFFER is None:
+        return read()
+
+    chats, pending_history = HISTORY_BUFFER.read_through(read, chat_id)
+    for chat in chats if isinstance(chats, list) else [chats]:
+        pending_messages = pending_history.get(chat.chat_id)
+        if pending_messages:
+            chat.history = chat.history + pending_messages
+
+    return chats
+
+
+def _wait_for_pending_insert(chat_id: str) -> None:
+    """
+    Wait for a background insert of the chat to finish, if one is in flight in this process.
+
+    :param chat_id: The ID of the chat.
+    """
+    with _pending_inserts_lock:
+        future = _pending_inserts.get(chat_id)
+
+    if future is not None:
+        # A failed insert is logged by its callback; the read that follows reports the chat as not found.
+        future.exception()
@@ -1,10 +1,13 @@
 from repository.base_repo import GenericRepo
 from repository.firestore import db
+from shared.caching import LRUTTLCache
+from shared.globals.constants import REPO_CACHE_MAX_SIZE, REPO_CACHE_TTL_SECONDS
 from shared.globals.enums import ChatbotTemperaments
 from shared.models.dto.chatbot_dto import ChatbotDTO, ChatbotDTOFactory
 from shared.models.security.user_context import UserContext
 
-CHATBOTS = GenericRepo[ChatbotDTO]('Chatbot', db.collection('chatbots'), ChatbotDTOFactory)
+CHATBOTS = GenericRepo[ChatbotDTO]('Chatbot', db.collection('chatbots'), ChatbotDTOFactory,
+                                   cache=LRUTTLCache('chatbots', REPO_CACHE_MAX_SIZE, REPO_CACHE_TTL_SECONDS))
 
 
 def get(ctx: UserContext, chatbot_id: str) -> ChatbotDTO | None:
@@ -30,14 +33,29 @@ def get_all(ctx: UserContext) -> list[ChatbotDTO | None]:
     return all_chatbots
 
 
-def insert(ctx: UserContext, context: str, temperament: ChatbotTemperaments = None) -> str:
+def insert(ctx: UserContext,
+           context: str,
+           temperament: ChatbotTemperaments = None,
+           cache_responses: bool = False) -> str:
     """
     Inserts a new chatbot into the database.
 
     :param ctx: The user context.
     :param context: The context of the chatbot.
     :param temperament: The temperament of the chatbot. Defaults to ChatbotTemperaments.FUN.
+    :param cache_responses: Whether identical chat openings may be answered from the response cache.
     :return: The ID of the newly inserted chatbot.
     """
-    new_chatbot_id = CHATBOTS.insert(ctx, ChatbotDTO(context=context, temperament=temperament))
+    new_chatbot = ChatbotDTO(context=context, temperament=temperament, cache_responses=cache_responses)
+    new_chatbot_id = CHATBOTS.insert(ctx, new_chatbot)
     return new_chatbot_id
+
+
+def prime_cache(chatbot_ids: list[str]) -> int:
+    """
+    Read chatbots into the cache ahead of their first request.
+
+    :param chatbot_ids: The IDs of the chatbots to cache.
+    :return: The number of chatbots cached.
+    """
+    return CHATBOTS.prime_cache(chatbot_ids)
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta, timezone
+from hashlib import sha256
+from typing import Any
+
+from google.api_core.exceptions import Conflict, FailedPrecondition, NotFound
+
+from repository.firestore import db
+from shared.globals.constants import IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_LEASE_SECONDS
+from shared.tracing import span
+
+# One document per user and idempotency key. The expires_at field should have a Firestore TTL policy, so expired
+# keys are deleted in the background. Deletion can lag by a day, so reads check expires_at themselves.
+IDEMPOTENCY_KEYS = db.collection('idempotency_keys')
+
+STATUS_IN_FLIGHT = 'in_flight'
+STATUS_COMPLETED = 'completed'
+
+
+def claim(user_id: str, idempotency_key: str, fingerprint: str) -> dict[str, Any] | None:
+    """
+    Claim an idempotency key for a request, across every instance. The claim is the creation of the key document,
+    which fails if the document exists. Keys that expired, or whose claim was not completed or released within
+    IDEMPOTENCY_LEASE_SECONDS because its instance went away, are taken over.
+
+    :param user_id: The ID of the signed in user.
+    :param idempotency_key: The idempotency key of the request.
+    :param fingerprint: The fingerprint of the request.
+    :return: None if the key was claimed, or the record of the request holding it: its fingerprint, status,
+             and response once completed.
+    """
+    doc_ref = IDEMPOTENCY_KEYS.document(_doc_id(user_id, idempotency_key))
+    while True:
+        now = datetime.now(timezone.utc)
+        claim_dict = {
+            'fingerprint': fingerprint,
+            'status': STATUS_IN_FLIGHT,
+            'lease_expires_at': now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS),
+            'expires_at': now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+        }
+
+        try:
+            with span('firestore.create', 'firestore', collection='IdempotencyKey'):
+                doc_ref.create(claim_dict)
+
+            return None
+        except Conflict:
+            pass
+
+        with span('firestore.get', 'firestore', collection='IdempotencyKey'):
+            doc_snap = doc_ref.get()
+        if not doc_snap.exists:
+            # Released since the create failed.
+            continue
+
+        record = doc_snap.to_dict()
+        if record['expires_at'] > now and (record['status'] == STATUS_COMPLETED or record['lease_expires_at'] > now):
+            return record
+
+        try:
+            # Only take the key over if no other instance did since it was read.
+            with span('firestore.update', 'firestore', collection='IdempotencyKey'):
+                doc_ref.update({**claim_dict, 'response': None},
+                               option=db.write_option(last_update_time=doc_snap.update_time))
+
+            return None
+        except (FailedPrecondition, NotFound):
+            continue
+
+
+def complete(user_id: str, idempotency_key: str, fingerprint: str, response: dict[str, Any]) -> None:
+    """
+    Keep the response of the request that claimed an idempotency key, for its retries on any instance.
+
+    :param user_id: The ID of the signed in user.
+    :param idempotency_key: The idempotency key of the request.
+    :param fingerprint: The fingerprint of the request.
+    :param response: The response to replay, as the data, status and headers of the endpoint function.
+    """
+    with span('firestore.set', 'firestore', collection='IdempotencyKey'):
+        IDEMPOTENCY_KEYS.document(_doc_id(user_id, idempotency_key)).set({
+            'fingerprint': fingerprint,
+            'status': STATUS_COMPLETED,
+            'response': response,
+            'expires_at': datetime.now(timezone.utc) + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+        })
+
+
+def release(user_id: str, idempotency_key: str) -> None:
+    """
+    Release the claim of a request that failed, so the key can be retried.
+
+    :param user_id: The ID of the signed in user.
+    :param idempotency_key: The idempotency key of the request.
+    """
+    with span('firestore.delete', 'firestore', collection='IdempotencyKey'):
+        IDEMPOTENCY_KEYS.document(_doc_id(user_id, idempotency_key)).delete()
+
+
+def _doc_id(user_id: str, idempotency_key: str) -> str:
+    """
+    Keys are chosen by clients and may contain characters that are not allowed in document IDs, so they are hashed.
+    """
+    return f'{user_id}:{sha256(idempotency_key.encode()).hexdigest()}'
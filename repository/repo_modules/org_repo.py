@@ -1,10 +1,12 @@
 from repository.base_repo import GenericRepo
 from repository.firestore import db
-from shared.globals.constants import TYPE_NAME_ORG
+from shared.caching import LRUTTLCache
+from shared.globals.constants import TYPE_NAME_ORG, REPO_CACHE_MAX_SIZE, REPO_CACHE_TTL_SECONDS
 from shared.models.dto.org_dto import OrgDTO, OrgDTOFactory
 from shared.models.security.user_context import UserContext
 
-ORGS = GenericRepo[OrgDTO](TYPE_NAME_ORG, db.collection('organizations'), OrgDTOFactory)
+ORGS = GenericRepo[OrgDTO](TYPE_NAME_ORG, db.collection('organizations'), OrgDTOFactory,
+                           cache=LRUTTLCache('organizations', REPO_CACHE_MAX_SIZE, REPO_CACHE_TTL_SECONDS))
 
 
 def get(ctx: UserContext, org_id: str) -> OrgDTO | None:
@@ -0,0 +1,131 @@
+import logging
+import threading
+
+from firebase_admin.firestore import firestore as fs
+
+from repository.firestore import db
+from shared.globals.constants import FIELD_ORG_ID, USAGE_TOTALS_FLUSH_INTERVAL_SECONDS, FIRESTORE_GET_ALL_CHUNK_SIZE
+from shared.lifecycle import register_shutdown_hook
+from shared.models.data_class.token_usage_dc import TokenUsageDC
+from shared.tracing import span
+
+# One document per subject, with the usage of every process added up, to rank the subjects of a scope with
+# a query ordered by total_tokens. The composite indexes of the query are in firestore.indexes.json.
+USAGE_TOTALS = db.collection('usage_totals')
+
+_COUNTER_FIELDS = ('calls', 'prompt_tokens', 'completion_tokens', 'total_tokens', 'llm_seconds')
+
+logger = logging.getLogger(__name__)
+
+# The usage recorded by this process since its last write of the totals, by scope and subject ID.
+_pending_totals: dict[tuple[str, str], tuple[str, TokenUsageDC]] = {}
+_totals_lock = threading.Lock()
+_totals_flusher: threading.Thread | None = None
+_totals_stopped = threading.Event()
+
+
+def add_usage(org_id: str, subjects: list[tuple[str, str]], usage: TokenUsageDC) -> None:
+    """
+    Add usage to the totals of each subject, without blocking the request. The usage of the process is added up
+    per subject in memory and written every USAGE_TOTALS_FLUSH_INTERVAL_SECONDS, with one server-side increment
+    per subject, so a busy org or chatbot takes at most one write per process and interval.
+    Usage not yet written is lost if the process crashes, and written at a graceful shutdown.
+
+    :param org_id: The org the usage belongs to.
+    :param subjects: The scope and ID of each subject to attribute the usage to, like ('chat', chat_id).
+    :param usage: The usage to add.
+    """
+    global _totals_flusher
+
+    with _totals_lock:
+        for scope, subject_id in subjects:
+            _, pending_usage = _pending_totals.setdefault((scope, subject_id),
+                                                          (org_id, TokenUsageDC(scope, subject_id)))
+            pending_usage.add(usage)
+
+        if _totals_flusher is not None:
+            return
+
+        _totals_flusher = threading.Thread(target=_run_totals_flusher, name='usage-totals-flusher', daemon=True)
+        _totals_flusher.start()
+
+    register_shutdown_hook('usage-totals', _stop_totals_flusher)
+
+
+def get_by_scope(org_id: str | None, scope: str, limit: int) -> list[TokenUsageDC]:
+    """
+    Get the subjects of a scope that used the most tokens, from their totals.
+    The totals lag the recorded usage by up to USAGE_TOTALS_FLUSH_INTERVAL_SECONDS per process.
+
+    :param org_id: The org to get the usage of, or None for every org.
+    :param scope: The scope of the subjects, like 'chat'.
+    :param limit: The maximum number of subjects to get.
+    :return: The usage of each subject, most tokens first.
+    """
+    query = USAGE_TOTALS.where(filter=fs.FieldFilter('scope', '==', scope))
+    if org_id is not None:
+        query = query.where(filter=fs.FieldFilter(FIELD_ORG_ID, '==', org_id))
+    query = query.order_by('total_tokens', direction=fs.Query.DESCENDING).limit(limit)
+
+    with span('firestore.query', 'firestore', collection='UsageTotal'):
+        total_snaps = query.get()
+
+    usages = []
+    for total_snap in total_snaps:
+        total_dict = total_snap.to_dict()
+        usages.append(TokenUsageDC(scope=scope, subject_id=total_dict['subject_id'],
+                                   **{field: total_dict.get(field, 0) for field in _COUNTER_FIELDS}))
+
+    return usages
+
+
+def flush_totals() -> None:
+    """
+    Add the usage recorded by this process since the last flush to the totals of its subjects,
+    with one increment per subject. Usage that failed to be written is kept for the next flush.
+    """
+    with _totals_lock:
+        if not _pending_totals:
+            return
+
+        flushing = dict(_pending_totals)
+        _pending_totals.clear()
+
+    items = list(flushing.items())
+    for start in range(0, len(items), FIRESTORE_GET_ALL_CHUNK_SIZE):
+        chunk = items[start:start + FIRESTORE_GET_ALL_CHUNK_SIZE]
+        try:
+            with span('firestore.increment', 'firestore', collection='UsageTotal', count=len(chunk)):
+                batch = db.batch()
+                for (scope, subject_id), (org_id, usage) in chunk:
+                    total_dict = {field: fs.Increment(getattr(usage, field)) for field in _COUNTER_FIELDS}
+                    total_dict.update({
+                        FIELD_ORG_ID: org_id,
+                        'scope': scope,
+                        'subject_id': subject_id,
+                        'last_used_time': fs.SERVER_TIMESTAMP
+                    })
+                    batch.set(USAGE_TOTALS.document(f'{scope}:{subject_id}'), total_dict, merge=True)
+
+                batch.commit()
+        except Exception as ex:
+            logger.warning(f'Failed to write the usage totals of {len(chunk)} subjects, retrying next flush: {ex}')
+            with _totals_lock:
+                for key, (org_id, usage) in chunk:
+                    _, pending_usage = _pending_totals.setdefault(key, (org_id, TokenUsageDC(*key)))
+                    pending_usage.add(usage)
+
+
+def _run_totals_flusher() -> None:
+    """Flush the totals every interval until stopped."""
+    while not _totals_stopped.wait(USAGE_TOTALS_FLUSH_INTERVAL_SECONDS):
+        try:
+            flush_totals()
+        except Exception as ex:
+            logger.error(f'Unexpected error flushing the usage totals: {ex}')
+
+
+def _stop_totals_flusher() -> None:
+    """Stop the flusher and write the totals one last time."""
+    _totals_stopped.set()
+    flush_totals()
@@ -0,0 +1,345 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, TypeVar
+
+from repository.base_repo import GenericRepo
+from shared.globals.constants import FIRESTORE_GET_ALL_CHUNK_SIZE
+from shared.lifecycle import register_shutdown_hook
+from shared.models.security.user_context import UserContext
+from shared.tracing import span
+
+T_Read = TypeVar('T_Read')
+
+BUFFERS: dict[str, 'WriteBehindBuffer'] = {}
+"""Every write-behind buffer created in the process, by name, so their stats can be reported together."""
+
+logger = logging.getLogger(__name__)
+
+# Number of recent flushes remembered to tell whether a read overlapped the flush of a specific document.
+# A read that overlapped more flushes than this is conservatively retried.
+_RECENT_FLUSHES_SIZE = 64
+# Number of optimistic reads before a read is made while holding back flushes, so reads spanning several documents
+# cannot be retried forever under steady appends.
+_READ_THROUGH_MAX_ATTEMPTS = 3
+
+
+class WriteBehindBuffer(object):
+    """
+    Buffers appends to an array field of the documents of a repo and writes them in the background.
+    Appends to the same document are coalesced, and every document with pending appends is written with one
+    batched read and commit per flush. A flush happens every flush_interval_seconds, or as soon as max_pending
+    elements are waiting, and once more when the process shuts down.
+
+    Appends are acknowledged before they are durable: a crash can lose up to one flush interval of appends,
+    and other instances do not see them until they are flushed. Reads in this process see them through read_through.
+    Only the documents that failed to be written are retried, one document per write so a document that cannot be
+    written does not hold back the others, and their elements are dropped after max_retries failed flushes.
+
+    :param name: A unique name for the buffer, used in logs and when reporting stats.
+    :param repo: The repo of the documents.
+    :param array_field_name: The name of the array field that elements are appended to.
+    :param flush_interval_seconds: The maximum number of seconds an append waits before it is flushed.
+    :param max_pending: The number of pending elements that triggers a flush before the interval is over.
+    :param max_retries: The number of times the elements of a document are retried before they are dropped.
+    """
+
+    def __init__(self,
+                 name: str,
+                 repo: GenericRepo,
+                 array_field_name: str,
+                 flush_interval_seconds: float,
+                 max_pending: int,
+                 max_retries: int):
+        self.name = name
+        self.repo = repo
+        self.array_field_name = array_field_name
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+
+        self._pending: dict[str, tuple[UserContext, list[str]]] = {}
+        self._pending_count = 0
+        self._flushing: dict[str, threading.Event] = {}
+        # The number of failed flushes of each document whose elements are waiting to be retried.
+        self._retries: dict[str, int] = {}
+        self._flush_seq = 0
+        self._recent_flushes: deque[tuple[int, frozenset[str]]] = deque(maxlen=_RECENT_FLUSHES_SIZE)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_requested = threading.Event()
+        self._stopped = threading.Event()
+        self._flusher_thread: threading.Thread | None = None
+
+        self._appended = 0
+        self._flushes = 0
+        self._flushed = 0
+        self._failed_flushes = 0
+        self._dropped = 0
+        self._flush_seconds_total = 0.0
+        self._flush_seconds_max = 0.0
+        self._last_flush_seconds = 0.0
+
+        BUFFERS[name] = self
+
+    def append(self, ctx: UserContext, doc_id: str, new_elements: list[str]) -> None:
+        """
+        Queue new elements to be appended to the array field of a document.
+        The access of the user context to the document is checked when the elements are flushed.
+
+        :param ctx: The user context for the request.
+        :param doc_id: The ID of the document.
+        :param new_elements: The elements to append.
+        """
+        self._start_flusher()
+
+        with self._lock:
+            entry = self._pending.get(doc_id)
+            if entry is None:
+                self._pending[doc_id] = (ctx, list(new_elements))
+            else:
+                entry[1].extend(new_elements)
+
+            self._pending_count += len(new_elements)
+            self._appended += len(new_elements)
+            should_flush = self._pending_count >= self.max_pending
+
+        if should_flush:
+            self._flush_requested.set()
+
+    def read_through(self,
+                     read: Callable[[], T_Read],
+                     doc_id: str | None = None) -> tuple[T_Read, dict[str, list[str]]]:
+        """
+        Read from the database together with the elements still pending in this buffer, as one consistent view.
+        The read is repeated if a flush of the document overlapped it, since the read may or may not include the
+        flushed elements. Reads of several documents (doc_id None) are repeated if any flush overlapped them.
+        After _READ_THROUGH_MAX_ATTEMPTS overlapped reads, the read is made while no flush can start.
+
+        :param read: The function reading the document(s) from the database.
+        :param doc_id: The ID of the document being read, or None if the read spans several documents.
+        :return: The result of the read and the pending elements by document ID (only the given document, if any).
+        """
+        for _ in range(_READ_THROUGH_MAX_ATTEMPTS):
+            with self._lock:
+                flush_done = self._flushing.get(doc_id) if doc_id is not None else \
+                    next(iter(self._flushing.values()), None)
+                flush_seq = self._flush_seq
+
+            if flush_done is not None:
+                flush_done.wait()
+                continue
+
+            result = read()
+
+            with self._lock:
+                if not self._flushed_since(flush_seq, doc_id):
+                    return result, self._pending_for(doc_id)
+
+        # Holding the flush lock waits for the running flush, if any, and keeps the next one from starting.
+        with self._flush_lock:
+            result = read()
+            with self._lock:
+                return result, self._pending_for(doc_id)
+
+    def pending(self, doc_id: str) -> list[str]:
+        """
+        Get the elements still waiting to be flushed for a document, without reading the database.
+
+        :param doc_id: The ID of the document.
+        :return: A copy of the pending elements, in append order.
+        """
+        with self._lock:
+            entry = self._pending.get(doc_id)
+            return list(entry[1]) if entry is not None else []
+
+    def flush(self) -> None:
+        """
+        Write every pending element to the database now. Only one flush runs at a time.
+        The elements of documents that failed to be written are put back in front of the newer pending elements
+        for the next flush, until they failed max_retries times.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+
+                flushing, self._pending = self._pending, {}
+                self._pending_count = 0
+                flush_done = threading.Event()
+                self._flush_seq += 1
+                self._recent_flushes.append((self._flush_seq, frozenset(flushing)))
+                for doc_id in flushing:
+                    self._flushing[doc_id] = flush_done
+
+                retrying = {doc_id: entry for doc_id, entry in flushing.items() if doc_id in self._retries}
+                first_tries = {doc_id: entry for doc_id, entry in flushing.items() if doc_id not in self._retries}
+
+            start = time.perf_counter()
+            skipped_doc_ids: list[str] = []
+            failed_doc_ids: list[str] = []
+            given_up_doc_ids: list[str] = []
+            try:
+                # Flushes on the flusher thread have no current span, so their writes are grouped in a trace of their own
+                # instead of one trace per RPC.
+                with span('write_behind.flush', buffer=self.name, count=len(flushing)):
+                    for entries, chunk_size in ((first_tries, FIRESTORE_GET_ALL_CHUNK_SIZE), (retrying, 1)):
+                        if entries:
+                            skipped, failed = self.repo.add_elements_batch(self.array_field_name, entries, chunk_size)
+                            skipped_doc_ids += skipped
+                            failed_doc_ids += failed
+            finally:
+                flush_seconds = time.perf_counter() - start
+                with self._lock:
+                    # Failed elements are pending again before the flush is marked done, so reads never miss them.
+                    requeued = {}
+                    for doc_id in failed_doc_ids:
+                        retries = self._retries.get(doc_id, 0) + 1
+                        if retries > self.max_retries:
+                            given_up_doc_ids.append(doc_id)
+                        else:
+                            self._retries[doc_id] = retries
+                            requeued[doc_id] = flushing[doc_id]
+
+                    for doc_id in flushing:
+                        del self._flushing[doc_id]
+                        if doc_id not in requeued:
+                            self._retries.pop(doc_id, None)
+
+                    self._requeue(requeued)
+
+                flush_done.set()
+
+            with self._lock:
+                written_doc_ids = flushing.keys() - set(skipped_doc_ids) - set(failed_doc_ids)
+                dropped_count = sum(len(flushing[doc_id][1]) for doc_id in skipped_doc_ids + given_up_doc_ids)
+                self._flushes += 1
+                self._failed_flushes += bool(failed_doc_ids)
+                self._flushed += sum(len(flushing[doc_id][1]) for doc_id in written_doc_ids)
+                self._dropped += dropped_count
+                self._last_flush_seconds = flush_seconds
+                self._flush_seconds_total += flush_seconds
+                self._flush_seconds_max = max(self._flush_seconds_max, flush_seconds)
+
+            if requeued:
+                logger.error(f"Failed to flush the elements of {len(requeued)} {self.repo.doc_type_name} documents "
+                             f"of '{self.name}', retrying later: {list(requeued)}")
+            if given_up_doc_ids:
+                logger.error(f"Dropped the elements of {len(given_up_doc_ids)} {self.repo.doc_type_name} documents "
+                             f"of '{self.name}' after {self.max_retries} retries: {given_up_doc_ids}")
+            if skipped_doc_ids:
+                logger.warning(f"Dropped the elements of '{self.name}' for missing or inaccessible "
+                               f"{self.repo.doc_type_name} documents: {skipped_doc_ids}")
+
+    def stop(self) -> None:
+        """Stop the background flusher and flush the remaining elements."""
+        self._stopped.set()
+        self._flush_requested.set()
+        if self._flusher_thread is not None:
+            self._flusher_thread.join()
+
+        self.flush()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Get the queue depth and flush statistics of the buffer.
+
+        :return: A dictionary of counters, the current queue depth and the flush latencies in seconds.
+        """
+        with self._lock:
+            return {
+                'name': self.name,
+                'queue_depth': self._pending_count,
+                'pending_documents': len(self._pending),
+                'flushing_documents': len(self._flushing),
+                'retrying_documents': len(self._retries),
+                'appended': self._appended,
+                'flushed': self._flushed,
+                'dropped': self._dropped,
+                'flushes': self._flushes,
+                'failed_flushes': self._failed_flushes,
+                'last_flush_seconds': self._last_flush_seconds,
+                'max_flush_seconds': self._flush_seconds_max,
+                'avg_flush_seconds': self._flush_seconds_total / self._flushes if self._flushes else 0.0
+            }
+
+    def _start_flusher(self) -> None:
+        """Start the background flusher on first use, and flush the buffer at shutdown."""
+        if self._flusher_thread is not None:
+            return
+
+        with self._lock:
+            if self._flusher_thread is not None:
+                return
+
+            self._flusher_thread = threading.Thread(target=self._run_flusher, name=f'{self.name}-flusher', daemon=True)
+            self._flusher_thread.start()
+
+        register_shutdown_hook(f'write-behind:{self.name}', self.stop)
+
+    def _run_flusher(self) -> None:
+        """Flush the buffer every interval, or sooner when it fills up, until stopped."""
+        while not self._stopped.is_set():
+            self._flush_requested.wait(self.flush_interval_seconds)
+            self._flush_requested.clear()
+            try:
+                self.flush()
+            except Exception as ex:
+                logger.error(f"Unexpected error flushing '{self.name}': {ex}")
+
+    def _requeue(self, requeued: dict[str, tuple[UserContext, list[str]]]) -> None:
+        """
+        Put the elements of documents that failed to flush back in front of the elements appended since.
+        Must be called while holding the lock.
+
+        :param requeued: The elements that failed to flush, by document ID.
+        """
+        if not requeued:
+            return
+
+        for doc_id, (ctx, elements) in self._pending.items():
+            requeued_entry = requeued.get(doc_id)
+            requeued[doc_id] = (ctx, requeued_entry[1] + elements if requeued_entry is not None else elements)
+
+        self._pending = requeued
+        self._pending_count = sum(len(elements) for _, elements in requeued.values())
+
+    def _pending_for(self, doc_id: str | None) -> dict[str, list[str]]:
+        """
+        Copy the pending elements of a document, or of every document. Must be called while holding the lock.
+
+        :param doc_id: The ID of the document, or None for every document.
+        :return: The pending elements by document ID.
+        """
+        if doc_id is None:
+            return {pending_doc_id: list(elements) for pending_doc_id, (_, elements) in self._pending.items()}
+
+        entry = self._pending.get(doc_id)
+        return {doc_id: list(entry[1])} if entry is not None else {}
+
+    def _flushed_since(self, flush_seq: int, doc_id: str | None) -> bool:
+        """
+        Check whether a flush started after the given flush sequence number, for the document if given.
+        Must be called while holding the lock.
+
+        :param flush_seq: The flush sequence number observed before a read.
+        :param doc_id: The ID of the document that was read, or None for any document.
+        :return: True if the read may have overlapped a flush.
+        """
+        if self._flush_seq == flush_seq:
+            return False
+
+        if doc_id is None or self._flush_seq - flush_seq > len(self._recent_flushes):
+            return True
+
+        return any(doc_id in doc_ids for seq, doc_ids in self._recent_flushes if seq > flush_seq)
+
+
+def get_all_buffer_stats() -> list[dict[str, Any]]:
+    """
+    Get the statistics of every write-behind buffer in the process.
+
+    :return: A list with the stats of each buffer.
+    """
+    return [buffer.stats() for buffer in list(BUFFERS.values())]
@@ -0,0 +1,163 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+CACHES: dict[str, 'LRUTTLCache'] = {}
+"""Every cache created in the process, by name, so their stats can be reported together."""
+
+_MISSING = object()
+
+
+class LRUTTLCache(object):
+    """
+    Thread-safe, size-bounded least recently used cache whose entries also expire after a time to live.
+
+    Read-through callers take a generation before reading the source and pass it to put, so a value read before
+    an invalidation of its key, or a clear, is not cached after it. The cache remembers the generation of the last
+    max_size invalidated keys, and refuses puts older than the invalidations it forgot.
+
+    :param name: A unique name for the cache, used when reporting stats.
+    :param max_size: The maximum number of entries before the least recently used entry is evicted.
+    :param ttl_seconds: The number of seconds an entry stays valid after it is put in the cache.
+    """
+
+    def __init__(self, name: str, max_size: int, ttl_seconds: float):
+        self.name = name
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        # The generation of the last invalidation of each recently invalidated key, oldest first.
+        self._invalidated_at: OrderedDict[Hashable, int] = OrderedDict()
+        # Puts from before this generation are refused: the cache was cleared, or forgot an invalidation, since.
+        self._min_put_generation = 0
+        self._stale_puts = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+        CACHES[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get a value from the cache, marking it as recently used.
+
+        :param key: The key of the entry.
+        :param default: The value returned when the key is missing or expired.
+        :return: The cached value, or the default.
+        """
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self._misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def generation(self) -> int:
+        """
+        Get the current generation of the cache, to take before reading a value that will be put.
+
+        :return: The generation.
+        """
+        with self._lock:
+            return self._generation
+
+    def put(self, key: Hashable, value: Any, generation: int | None = None) -> bool:
+        """
+        Put a value in the cache, evicting the least recently used entry if the cache is full.
+
+        :param key: The key of the entry.
+        :param value: The value to cache.
+        :param generation: Optional generation taken before the value was read. The value is not cached
+                           if its key was invalidated, or the cache cleared, since.
+        :return: True if the value was cached, False if it was stale.
+        """
+        with self._lock:
+            if generation is not None and (generation < self._min_put_generation or
+                                           self._invalidated_at.get(key, -1) > generation):
+                self._stale_puts += 1
+                return False
+
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+            return True
+
+    def invalidate(self, key: Hashable) -> bool:
+        """
+        Remove an entry from the cache, and refuse puts of the key read before now.
+
+        :param key: The key of the entry.
+        :return: True if an entry was removed, False otherwise.
+        """
+        with self._lock:
+            self._generation += 1
+            self._invalidated_at[key] = self._generation
+            self._invalidated_at.move_to_end(key)
+            if len(self._invalidated_at) > self.max_size:
+                _, forgotten_generation = self._invalidated_at.popitem(last=False)
+                self._min_put_generation = forgotten_generation + 1
+
+            if self._entries.pop(key, _MISSING) is _MISSING:
+                return False
+
+            self._invalidations += 1
+            return True
+
+    def clear(self) -> None:
+        """Remove every entry from the cache, and refuse puts of values read before now."""
+        with self._lock:
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+            self._generation += 1
+            self._min_put_generation = self._generation
+            self._invalidated_at.clear()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Get the usage statistics of the cache.
+
+        :return: A dictionary of counters, the current size and the hit rate of the cache.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'name': self.name,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'invalidations': self._invalidations,
+                'stale_puts': self._stale_puts,
+                'hit_rate': self._hits / lookups if lookups else 0.0
+            }
+
+
+def get_all_cache_stats() -> list[dict[str, Any]]:
+    """
+    Get the usage statistics of every cache in the process.
+
+    :return: A list with the stats of each cache.
+    """
+    return [cache.stats() for cache in list(CACHES.values())]
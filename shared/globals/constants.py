@@ -29,11 +29,111 @@ FIELD_UPDATE_USER: str = 'update_user'
 
 FIELD_EMPTY_SELECT: str = 'non_existing_field'
 
+FIRESTORE_IO_MAX_WORKERS: int = 8
+FIRESTORE_GET_ALL_CHUNK_SIZE: int = 100
+# Attempts of an array append whose document was changed by another writer between its read and its write.
+FIRESTORE_ARRAY_UPDATE_MAX_ATTEMPTS: int = 5
+
+REPO_CACHE_MAX_SIZE: int = 1024
+REPO_CACHE_TTL_SECONDS: float = 60
+REPO_CACHE_LISTENERS_ENABLED: bool = True
+REPO_CACHE_LISTENED_TTL_SECONDS: float = 60 * 60
+REPO_CACHE_LISTENER_CHECK_SECONDS: float = 30
+
 MAX_OUTPUT_TOKENS: int = 256
 
+LLM_MAX_IN_FLIGHT: int = 16
+LLM_MAX_QUEUE_SIZE: int = 64
+LLM_MAX_QUEUE_WAIT_SECONDS: float = 10
+# Per process rate limits of the LLM calls, None to not limit them. The limits apply to each worker process,
+# so set them to the provider quota divided by the number of processes across every instance.
+LLM_MODEL_REQUESTS_PER_MINUTE: float | None = None
+LLM_MODEL_BURST: float = 10
+LLM_ORG_REQUESTS_PER_MINUTE: float | None = None
+LLM_ORG_BURST: float = 5
+LLM_ORG_MAX_CONCURRENCY: int = 8
+LLM_ORG_WEIGHT: float = 1
+# How often the scheduler forgets the policies and full token buckets of the orgs without running or waiting calls.
+LLM_ORG_STATE_SWEEP_SECONDS: float = 60
+
+CHAT_RESPONSE_CACHE_MAX_SIZE: int = 2048
+CHAT_RESPONSE_CACHE_TTL_SECONDS: float = 60 * 60
+CHAT_RESPONSE_CACHE_MAX_TEMPERATURE: float = 0.6
+
+SEMANTIC_CACHE_ENABLED: bool = True
+SEMANTIC_CACHE_SIMILARITY_THRESHOLD: float = 0.92
+SEMANTIC_CACHE_TTL_SECONDS: float = 5 * 60
+SEMANTIC_CACHE_MAX_ENTRIES: int = 128
+SEMANTIC_CACHE_MAX_NAMESPACES: int = 1024
+
+AGENT_MEMORY_MAX_TOKENS: int = 2048
+AGENT_MEMORY_CACHE_MAX_SIZE: int = 1024
+AGENT_MEMORY_CACHE_TTL_SECONDS: float = 10 * 60
+
+TOOL_MEMORY_MAX_VALUES: int = 4096
+TOOL_MEMORY_MAX_VALUE_LENGTH: int = 256
+TOOL_MEMORY_MAX_SPAN_TOKENS: int = 8
+
+# Wait for the insert of a new chat before answering. The background insert only saves one Firestore round trip
+# of a request waiting on the model, and a chat whose insert fails after the answer is lost.
+CHAT_START_DURABLE_INSERT: bool = True
+CHAT_INSERT_MAX_ATTEMPTS: int = 4
+CHAT_INSERT_RETRY_BACKOFF_SECONDS: float = 0.25
+CHAT_HISTORY_WRITE_BEHIND: bool = False
+CHAT_HISTORY_FLUSH_INTERVAL_SECONDS: float = 0.25
+CHAT_HISTORY_MAX_PENDING: int = 500
+CHAT_HISTORY_MAX_FLUSH_RETRIES: int = 5
+
+# Marshal the responses of the fast_marshal_with endpoints with compiled models, and encode them with orjson.
+# Off by default: the compiled marshalling covers the field types the models use, not every flask_restx field option.
+FAST_JSON_RESPONSES: bool = False
+
+IDEMPOTENCY_KEY_HEADER: str = 'Idempotency-Key'
+IDEMPOTENCY_KEY_MAX_LENGTH: int = 255
+IDEMPOTENCY_TTL_SECONDS: float = 24 * 60 * 60
+IDEMPOTENCY_MAX_KEYS: int = 10000
+IDEMPOTENCY_WAIT_SECONDS: float = 120
+IDEMPOTENCY_POLL_SECONDS: float = 0.5
+IDEMPOTENCY_LEASE_SECONDS: float = 150
+
+COMPRESSION_ENCODINGS: tuple[str, ...] = ('br', 'gzip')
+COMPRESSION_MIN_SIZE: int = 1024
+COMPRESSION_LEVEL: int = 6
+
+TRACING_ENABLED: bool = True
+# Where finished traces are exported, in the Zipkin v2 JSON format: '' (nowhere), 'log' or 'zipkin' (TRACE_ZIPKIN_URL).
+TRACE_EXPORTER: str = ''
+TRACE_ZIPKIN_URL: str = 'http://localhost:9411/api/v2/spans'
+TRACE_EXPORT_QUEUE_SIZE: int = 10000
+TRACE_EXPORT_BATCH_SIZE: int = 100
+TRACE_MAX_SPANS_PER_TRACE: int = 1000
+
+METRICS_MAX_SERIES: int = 2000
+
+# Each process adds up the usage of every subject and writes it to the subject's total this often, so the totals
+# take at most one write per process and interval, however busy the subject.
+USAGE_TOTALS_FLUSH_INTERVAL_SECONDS: float = 10
+USAGE_REPORT_MAX_LIMIT: int = 100
+# Token counts are estimated from text lengths for the model responses that do not report them.
+LLM_CHARS_PER_TOKEN: int = 4
+
+# Production server settings, read by gunicorn.conf.py. Environment variables of the same names override them.
+SERVER_WORKER_CLASS: str = 'gthread'
+SERVER_WORKERS: int = 1
+SERVER_THREADS: int = 32
+SERVER_TIMEOUT_SECONDS: int = 120
+SERVER_GRACEFUL_TIMEOUT_SECONDS: int = 25
+LLM_DRAIN_TIMEOUT_SECONDS: float = 15
+
+WARMUP_BUDGET_SECONDS: float = 20
+WARMUP_HOT_CHATBOTS: int = 100
+WARMUP_TOOL_INDEX: bool = True
+
 # TODO: Need to use Google Secret Manager in GCP to store creds like this.
 PROJECT_ID: str = ''
 FIREBASE_API_KEY: str = ''
+# Bearer token of the metrics scraper. Signed in OWNER users can read the metrics without it.
+METRICS_TOKEN: str = ''
 
 OWNER_ID: str = ''
 DEBUG_OWNER_ID: str = ''
@@ -20,3 +20,10 @@ class ChatbotTemperaments(Enum):
     FUN = 2
     LOOSE = 3
     WILD = 4
+
+
+class UsageScopes(Enum):
+    ORG = 'org'
+    ASSISTANT = 'assistant'
+    CHATBOT = 'chatbot'
+    CHAT = 'chat'
@@ -0,0 +1,58 @@
+import atexit
+import logging
+import threading
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+_shutdown_hooks: dict[str, Callable[[], None]] = {}
+_shutdown_lock = threading.Lock()
+_shut_down = False
+
+
+def register_shutdown_hook(name: str, hook: Callable[[], None]) -> None:
+    """
+    Register a function to run once when the process shuts down, for example to flush buffered writes.
+    Hooks run in reverse registration order, so later components shut down before the ones they depend on.
+    Registering a hook again under the same name replaces it.
+
+    :param name: A unique name for the hook, used in logs.
+    :param hook: The function to run. It takes no arguments.
+    """
+    with _shutdown_lock:
+        _shutdown_hooks.pop(name, None)
+        _shutdown_hooks[name] = hook
+
+
+def unregister_shutdown_hook(name: str) -> None:
+    """
+    Remove a shutdown hook, if registered.
+
+    :param name: The name the hook was registered under.
+    """
+    with _shutdown_lock:
+        _shutdown_hooks.pop(name, None)
+
+
+def run_shutdown_hooks() -> None:
+    """
+    Run every registered shutdown hook once. Called at interpreter exit, and may be called earlier by a server
+    that wants to shut down gracefully. A failing hook is logged and does not prevent the others from running.
+    """
+    global _shut_down
+
+    with _shutdown_lock:
+        if _shut_down:
+            return
+
+        _shut_down = True
+        hooks = list(_shutdown_hooks.items())
+
+    for name, hook in reversed(hooks):
+        try:
+            hook()
+        except Exception as ex:
+            logger.error(f"Shutdown hook '{name}' failed: {ex}")
+
+
+atexit.register(run_shutdown_hooks)
@@ -0,0 +1,179 @@
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
+from shared.globals.constants import METRICS_MAX_SERIES
+
+METRICS: dict[str, 'Counter | Histogram'] = {}
+"""Every metric created in the process, by name, so they can be exposed together."""
+
+DEFAULT_BUCKETS: tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+"""Latency buckets in seconds, from cache hits to slow LLM calls."""
+
+OVERFLOW_LABEL_VALUE: str = '_other'
+"""Label value of the series that new label combinations are folded into once a metric has METRICS_MAX_SERIES."""
+
+
+@dataclass(slots=True)
+class MetricFamily:
+    """
+    A metric and its samples, as exposed in the Prometheus text format.
+    Each sample is a name suffix (like '_bucket'), its labels and its value.
+    """
+    name: str
+    metric_type: str
+    description: str
+    samples: list[tuple[str, dict[str, str], float]] = field(default_factory=list)
+
+
+class Counter(object):
+    """
+    Thread-safe counter of a value that only increases, with one series per combination of label values.
+
+    :param name: The name of the metric, ending with '_total' by convention.
+    :param description: What the metric counts.
+    :param label_names: The names of the labels of the metric.
+    """
+
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+        METRICS[name] = self
+
+    def inc(self, label_values: tuple[str, ...] = (), amount: float = 1.0) -> None:
+        """
+        :param label_values: The values of the labels, in the order of the label names.
+        :param amount: The amount to add.
+        """
+        with self._lock:
+            label_values = _bounded_label_values(self._values, label_values)
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def collect(self) -> MetricFamily:
+        with self._lock:
+            values = list(self._values.items())
+
+        return MetricFamily(self.name, 'counter', self.description, [
+            ('', dict(zip(self.label_names, label_values)), value) for label_values, value in values
+        ])
+
+
+class Histogram(object):
+    """
+    Thread-safe histogram of observed values, like latencies, with one series per combination of label values.
+    Observing a value is a bisect and a few additions, so it is cheap enough for every request.
+
+    :param name: The name of the metric.
+    :param description: What the metric observes.
+    :param label_names: The names of the labels of the metric.
+    :param buckets: The upper bounds of the buckets, in increasing order.
+    """
+
+    def __init__(self,
+                 name: str,
+                 description: str,
+                 label_names: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+
+        # Per series: the count of each bucket (not cumulative, the last one is +Inf), and the sum of values.
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+        METRICS[name] = self
+
+    def observe(self, value: float, label_values: tuple[str, ...] = ()) -> None:
+        """
+        :param value: The observed value.
+        :param label_values: The values of the labels, in the order of the label names.
+        """
+        bucket_index = bisect_left(self.buckets, value)
+        with self._lock:
+            label_values = _bounded_label_values(self._series, label_values)
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = ([0] * (len(self.buckets) + 1), [0.0])
+
+            series[0][bucket_index] += 1
+            series[1][0] += value
+
+    def collect(self) -> MetricFamily:
+        with self._lock:
+            series = [(label_values, list(bucket_counts), value_sum[0])
+                      for label_values, (bucket_counts, value_sum) in self._series.items()]
+
+        family = MetricFamily(self.name, 'histogram', self.description)
+        for label_values, bucket_counts, value_sum in series:
+            labels = dict(zip(self.label_names, label_values))
+            cumulative_count = 0
+            for upper_bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative_count += bucket_count
+                family.samples.append(('_bucket', {**labels, 'le': _format_value(upper_bound)}, cumulative_count))
+
+            family.samples.append(('_sum', labels, value_sum))
+            family.samples.append(('_count', labels, cumulative_count))
+
+        return family
+
+
+def render_metrics(collectors: Iterable[Callable[[], list[MetricFamily]]] = ()) -> str:
+    """
+    Render every metric of the process, and the metrics of the given collectors,
+    in the Prometheus text exposition format (version 0.0.4).
+
+    :param collectors: Functions that snapshot other statistics as metric families when called.
+    :return: The metrics as text.
+    """
+    families = [metric.collect() for metric in list(METRICS.values())]
+    for collector in collectors:
+        families.extend(collector())
+
+    lines = []
+    for family in families:
+        lines.append(f'# HELP {family.name} {_escape(family.description, quotes=False)}')
+        lines.append(f'# TYPE {family.name} {family.metric_type}')
+        for suffix, labels, value in family.samples:
+            label_text = ','.join(f'{name}="{_escape(str(label_value))}"' for name, label_value in labels.items())
+            lines.append(f'{family.name}{suffix}{{{label_text}}} {_format_value(value)}' if label_text
+                         else f'{family.name}{suffix} {_format_value(value)}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def _bounded_label_values(series: dict[tuple[str, ...], object], label_values: tuple[str, ...]) -> tuple[str, ...]:
+    """
+    Fold a new combination of label values into an overflow series once a metric has too many series,
+    so unbounded label values (like org IDs) cannot grow the memory of the process without limit.
+    Must be called while holding the lock of the metric.
+
+    :param series: The series of the metric, by label values.
+    :param label_values: The label values of the new observation.
+    :return: The label values to record the observation under.
+    """
+    if label_values in series or len(series) < METRICS_MAX_SERIES:
+        return label_values
+
+    return (OVERFLOW_LABEL_VALUE,) * len(label_values)
+
+
+def _escape(text: str, quotes: bool = True) -> str:
+    text = text.replace('\\', '\\\\').replace('\n', '\\n')
+    return text.replace('"', '\\"') if quotes else text
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+
+    return repr(float(value))
@@ -11,6 +11,8 @@ from requests.exceptions import JSONDecodeError
 from shared.globals.constants import DEFAULT_HEADERS
 from shared.models.ai.agents.tools.utils.assistful_api_operation import AssistfulAPIOperation
 from shared.models.ai.assistful_prompts import RESPONSE_PREFIX
+from shared.models.ai.tool_memory import ToolMemory
+from shared.tracing import span
 
 
 class AssistfulNLATool(StructuredTool):
@@ -21,7 +23,7 @@ class AssistfulNLATool(StructuredTool):
     api_operation: Optional[AssistfulAPIOperation] = None
     """Hold on to API Operation details for later access."""
 
-    tool_memory: Optional[list[str]] = None
+    tool_memory: Optional[ToolMemory] = None
     """Shared memory of tool output for reference in a chain that runs multiple tools."""
 
     @classmethod
@@ -54,7 +56,7 @@ class AssistfulNLATool(StructuredTool):
             cls,
             user_query: str,
             api_operation: AssistfulAPIOperation,
-            tool_memory: Optional[set[str]] = None,
+            tool_memory: Optional[ToolMemory] = None,
             headers: Optional[dict] = None,
     ) -> "AssistfulNLATool":
         """
@@ -62,12 +64,17 @@ class AssistfulNLATool(StructuredTool):
 
         :param user_query: The original user query that prompted the tool creation.
         :param api_operation: Instance of AssistfulAPIOperation class representing the API operation to be performed.
-        :param tool_memory: Optional memory to be written to by the tool after execution.
+        :param tool_memory: Optional memory shared by the tools of a chain, for checking arguments against.
+                            The user query is indexed into it.
         :param headers: Optional headers to be included in the request.
         :return: An instance of the AssistfulNLATool class initialized with the provided parameters.
         """
         name, description = AssistfulNLATool._get_name_and_description_from_api_operation(api_operation)
 
+        if tool_memory is None:
+            tool_memory = ToolMemory()
+        tool_memory.index_query(user_query)
+
         args_schema_model, fields_dict = AssistfulNLATool._generate_args_schema_objects(api_operation)
         tool_func = AssistfulNLATool._generate_tool_func(api_operation, fields_dict, user_query, tool_memory, headers)
 
@@ -145,7 +152,7 @@ class AssistfulNLATool(StructuredTool):
             api_operation: AssistfulAPIOperation,
             fields_dict: dict[str, dict],
             user_query: Optional[str] = None,
-            tool_memory: Optional[set[str]] = None,
+            tool_memory: Optional[ToolMemory] = None,
             headers: Optional[dict] = None
     ) -> Callable[[dict[str, Any]], str]:
         def tool_func(**args) -> str:
@@ -166,22 +173,23 @@ class AssistfulNLATool(StructuredTool):
         user_query: str,
         args: dict[str, Any],
         fields_dict: dict[str, dict],
-        tool_memory: set[str]
+        tool_memory: Optional[ToolMemory]
     ) -> None:
         if not user_query or not args or not any(args) or not fields_dict or not any(fields_dict):
             return
 
-        if not tool_memory:
-            tool_memory = set()
+        if tool_memory is None:
+            tool_memory = ToolMemory()
+        tool_memory.index_query(user_query)
 
         # Do we need to worry about nested required fields?
         missing_fields = []
         required_fields: set = {key for key, field in fields_dict.items() if field.get('required')}
         for key, value in args.items():
             # The LLM fills in required fields with random garbage when not provided by the user.
-            # Adding a check for if the value is not in the user query, prevents LLM hallucinated arguments.
-            value_str = str(value)
-            if key in required_fields and value_str not in user_query and value_str not in tool_memory:
+            # Adding a check for if the value is not in the user query or earlier tool outputs,
+            # prevents LLM hallucinated arguments.
+            if key in required_fields and value not in tool_memory:
                 missing_fields.append(key)
 
         if any(missing_fields):
@@ -201,16 +209,20 @@ class AssistfulNLATool(StructuredTool):
             url = url.replace(f'{{{path_param}}}', args[path_param])
 
         try:
-            if api_operation.method == HTTPVerb.GET:
-                response = get(url, data=dumps(args), params={}, headers=headers)
-            elif api_operation.method == HTTPVerb.POST:
-                response = post(url, data=dumps(args), params={}, headers=headers)
-            elif api_operation.method == HTTPVerb.PUT:
-                response = put(url, data=dumps(args), params={}, headers=headers)
-            elif api_operation.method == HTTPVerb.PATCH:
-                response = patch(url, data=dumps(args), params={}, headers=headers)
-            elif api_operation.method == HTTPVerb.DELETE:
-                response = delete(url, data=dumps(args), params={}, headers=headers)
+            with span('tool.api_operation', 'tool', operation_id=api_operation.operation_id,
+                      method=HTTPVerb(api_operation.method).value) as tool_span:
+                if api_operation.method == HTTPVerb.GET:
+                    response = get(url, data=dumps(args), params={}, headers=headers)
+                elif api_operation.method == HTTPVerb.POST:
+                    response = post(url, data=dumps(args), params={}, headers=headers)
+                elif api_operation.method == HTTPVerb.PUT:
+                    response = put(url, data=dumps(args), params={}, headers=headers)
+                elif api_operation.method == HTTPVerb.PATCH:
+                    response = patch(url, data=dumps(args), params={}, headers=headers)
+                elif api_operation.method == HTTPVerb.DELETE:
+                    response = delete(url, data=dumps(args), params={}, headers=headers)
+
+                tool_span.set_attribute('status_code', response.status_code)
 
             response_json = response.json()
             response.raise_for_status()
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from typing import Any
+
+from langchain.tools.openapi.utils.openapi_utils import OpenAPISpec
+from openapi_schema_pydantic import Reference, Schema
+from pydantic import PrivateAttr
+
+
+class AssistfulOpenAPISpec(OpenAPISpec):
+    """
+    OpenAPISpec that memoizes resolved `$ref` schemas.
+
+    Building tools for a spec resolves the same component schemas once per operation (and once per property),
+    so lookups are cached per spec instance. References that point at other references are followed to the
+    root schema, and circular reference chains raise a ValueError instead of looping forever.
+    """
+
+    _resolved_schemas: dict[str, Schema] = PrivateAttr(default_factory=dict)
+    _ref_cache_hits: int = PrivateAttr(default=0)
+    _ref_cache_misses: int = PrivateAttr(default=0)
+
+    def get_referenced_schema(self, ref: Reference) -> Schema:
+        """Get the root schema for a reference, following nested references, or err."""
+        ref_name = ref.ref.split('/')[-1]
+        resolved_schema = self._resolved_schemas.get(ref_name)
+        if resolved_schema is not None:
+            self._ref_cache_hits += 1
+            return resolved_schema
+
+        self._ref_cache_misses += 1
+        resolved_schema = self._resolve_schema_chain(ref_name)
+        self._resolved_schemas[ref_name] = resolved_schema
+        return resolved_schema
+
+    def _get_root_referenced_schema(self, ref: Reference) -> Schema:
+        """Get the root reference or err."""
+        return self.get_referenced_schema(ref)
+
+    def ref_cache_info(self) -> dict[str, Any]:
+        """Get hit/miss statistics for the resolved reference cache."""
+        return {
+            'hits': self._ref_cache_hits,
+            'misses': self._ref_cache_misses,
+            'size': len(self._resolved_schemas)
+        }
+
+    def _resolve_schema_chain(self, ref_name: str) -> Schema:
+        """Follow a chain of component references to a concrete schema, detecting cycles."""
+        schemas = self._schemas_strict
+        chain = [ref_name]
+        while True:
+            if ref_name not in schemas:
+                raise ValueError(f'No schema found for {ref_name}')
+
+            schema = schemas[ref_name]
+            if not isinstance(schema, Reference):
+                return schema
+
+            ref_name = schema.ref.split('/')[-1]
+            if ref_name in chain:
+                raise ValueError(f"Circular schema reference: {' -> '.join(chain + [ref_name])}")
+
+            cached_schema = self._resolved_schemas.get(ref_name)
+            if cached_schema is not None:
+                return cached_schema
+
+            chain.append(ref_name)
@@ -0,0 +1,69 @@
+import time
+from typing import Optional, Any
+from uuid import UUID
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.schema import BaseMessage, LLMResult
+
+from shared.models.data_class.token_usage_dc import TokenUsageDC
+
+
+class TokenUsageCallbackHandler(BaseCallbackHandler):
+    """
+    Totals the token usage and latency of the LLM calls made by a chain or a chat model call,
+    from the 'token_usage' the models report in their LLM output.
+    """
+
+    def __init__(self):
+        self.usage = TokenUsageDC()
+        self._call_starts: dict[UUID, float] = {}
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: list[list[BaseMessage]],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any
+    ) -> Any:
+        self._call_starts[run_id] = time.monotonic()
+
+    def on_llm_start(
+        self,
+        serialized: dict[str, Any],
+        prompts: list[str],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any
+    ) -> Any:
+        self._call_starts[run_id] = time.monotonic()
+
+    def on_llm_end(
+        self,
+        response: LLMResult,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any
+    ) -> Any:
+        token_usage = (response.llm_output or {}).get('token_usage') or {}
+        self.usage.calls += 1
+        self.usage.prompt_tokens += token_usage.get('prompt_tokens', 0)
+        self.usage.completion_tokens += token_usage.get('completion_tokens', 0)
+        self.usage.total_tokens += token_usage.get('total_tokens', 0)
+
+        call_start = self._call_starts.pop(run_id, None)
+        if call_start is not None:
+            self.usage.llm_seconds += time.monotonic() - call_start
+
+    def on_llm_error(
+        self,
+        error: BaseException | KeyboardInterrupt,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any
+    ) -> Any:
+        self._call_starts.pop(run_id, None)
@@ -0,0 +1,65 @@
+from typing import Optional, Any
+from uuid import UUID
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.tools.openapi.utils.openapi_utils import HTTPVerb
+
+from shared.models.ai.agents.tools.assistful_nla_tool import AssistfulNLATool
+
+
+class ToolUsageCallbackHandler(BaseCallbackHandler):
+    """
+    Records the HTTP methods of the API operations run by the tools of an agent,
+    to tell whether an agent run only read data.
+
+    :param tools: The tools available to the agent.
+    """
+
+    def __init__(self, tools: list[AssistfulNLATool]):
+        self.tool_methods: dict[str, HTTPVerb | None] = {
+            tool.name: HTTPVerb(tool.api_operation.method) if tool.api_operation else None
+            for tool in tools
+        }
+        self.methods_used: list[HTTPVerb | None] = []
+        self.failed = False
+
+    def on_tool_start(
+        self,
+        serialized: dict[str, Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any
+    ) -> Any:
+        self.methods_used.append(self.tool_methods.get(serialized.get('name')))
+
+    def on_tool_end(
+        self,
+        output: str,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any
+    ) -> Any:
+        # Tool outputs start with the HTTP status of the API response, see AssistfulNLATool.
+        if not str(output).startswith('Status: 2'):
+            self.failed = True
+
+    def on_tool_error(
+        self,
+        error: BaseException | KeyboardInterrupt,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any
+    ) -> Any:
+        self.failed = True
+
+    @property
+    def only_read_operations(self) -> bool:
+        """
+        :return: True if at least one tool ran, every tool succeeded, and every tool ran a GET operation.
+        """
+        return not self.failed and any(self.methods_used) and \
+            all(method == HTTPVerb.GET for method in self.methods_used)
@@ -0,0 +1,150 @@
+import threading
+from functools import cache
+from typing import Optional, Any, List, Dict
+
+from google.oauth2 import service_account
+from langchain.callbacks.manager import CallbackManagerForLLMRun
+from langchain.chat_models import ChatVertexAI
+from langchain.chat_models.vertexai import _get_question, _parse_chat_history, _parse_examples, is_codey_model
+from langchain.pydantic_v1 import root_validator
+from langchain.schema import BaseMessage, ChatResult, ChatGeneration, AIMessage
+
+from shared.globals.constants import LLM_CHARS_PER_TOKEN
+from shared.globals.objects import FIREBASE_CREDS
+from shared.models.ai.scheduling.llm_scheduler import LLM_SCHEDULER
+from shared.tracing import span
+
+# Vertex AI model clients by model name, project and location, shared by every instance of the chat model.
+_clients: dict[tuple[str, Any, Any], Any] = {}
+_clients_lock = threading.Lock()
+
+
+class AssistfulChatVertexAI(ChatVertexAI):
+    """
+    Vertex AI chat model whose calls go through the process-wide LLM scheduler,
+    so they are limited in concurrency and rate per model and per org.
+    Every call is traced as an 'llm.generate' span, including the time it waited for a slot,
+    and reports its token usage in the 'token_usage' of the LLM output, like the OpenAI models of LangChain.
+    """
+
+    org_id: Optional[str] = None
+    """The org the calls are made for, used to rate limit each org separately."""
+
+    @root_validator()
+    def validate_environment(cls, values: Dict) -> Dict:
+        """
+        Like ChatVertexAI.validate_environment, but the Vertex AI client of each model is created once per process.
+        Creating a client fetches the model from Vertex AI, which every request would pay for otherwise,
+        since a chat model is created per request for the sampling parameters of its chatbot.
+        """
+        client_key = (values['model_name'], values.get('project'), values.get('location'))
+        with _clients_lock:
+            client = _clients.get(client_key)
+            if client is None:
+                cls._try_init_vertexai(values)
+                from vertexai.preview.language_models import ChatModel, CodeChatModel
+
+                model_class = CodeChatModel if is_codey_model(values['model_name']) else ChatModel
+                client = _clients[client_key] = model_class.from_pretrained(values['model_name'])
+
+        values['client'] = client
+        return values
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        stream: Optional[bool] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        with span('llm.generate', 'llm', model=self.model_name, org_id=self.org_id) as llm_span:
+            with LLM_SCHEDULER.slot(self.model_name, self.org_id) as queue_seconds:
+                llm_span.set_attribute('queue_seconds', round(queue_seconds, 4))
+                result = self._generate_with_token_usage(messages, stop, run_manager, stream, **kwargs)
+
+            token_usage = result.llm_output['token_usage']
+            llm_span.set_attribute('prompt_tokens', token_usage['prompt_tokens'])
+            llm_span.set_attribute('completion_tokens', token_usage['completion_tokens'])
+            llm_span.set_attribute('estimated_tokens', result.llm_output['estimated_tokens'])
+            return result
+
+    def _generate_with_token_usage(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]],
+        run_manager: Optional[CallbackManagerForLLMRun],
+        stream: Optional[bool],
+        **kwargs: Any,
+    ) -> ChatResult:
+        """
+        Generate the next turn of the conversation like ChatVertexAI._generate, but keep the token counts
+        of the Vertex AI response, which ChatVertexAI discards. Token counts are estimated from text lengths
+        when the response does not report them, like for streamed responses.
+        """
+        token_metadata = {}
+        if stream if stream is not None else self.streaming:
+            result = super()._generate(messages, stop=stop, run_manager=run_manager, stream=stream, **kwargs)
+        else:
+            question = _get_question(messages)
+            history = _parse_chat_history(messages[:-1])
+            params = self._prepare_params(stop=stop, **kwargs)
+            examples = kwargs.get('examples', None)
+            if examples:
+                params['examples'] = _parse_examples(examples)
+
+            response = self._start_chat(history, params).send_message(question.content)
+            result = ChatResult(generations=[ChatGeneration(message=AIMessage(content=response.text))])
+
+            prediction_response = getattr(response, 'raw_prediction_response', None)
+            metadata = getattr(prediction_response, 'metadata', None) or {}
+            token_metadata = metadata.get('tokenMetadata') or {}
+
+        prompt_tokens = token_metadata.get('inputTokenCount', {}).get('totalTokens')
+        completion_tokens = token_metadata.get('outputTokenCount', {}).get('totalTokens')
+        estimated_tokens = prompt_tokens is None or completion_tokens is None
+        if estimated_tokens:
+            prompt_tokens = estimate_tokens(''.join(str(message.content) for message in messages))
+            completion_tokens = estimate_tokens(''.join(generation.text for generation in result.generations))
+
+        result.llm_output = {
+            'token_usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens
+            },
+            'model_name': self.model_name,
+            'estimated_tokens': estimated_tokens
+        }
+        return result
+
+    def _combine_llm_outputs(self, llm_outputs: List[Optional[dict]]) -> dict:
+        token_usage = {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+        estimated_tokens = False
+        for llm_output in llm_outputs:
+            if llm_output is None:
+                continue
+
+            for key, value in llm_output['token_usage'].items():
+                token_usage[key] += value
+            estimated_tokens = estimated_tokens or llm_output['estimated_tokens']
+
+        return {'token_usage': token_usage, 'model_name': self.model_name, 'estimated_tokens': estimated_tokens}
+
+
+@cache
+def get_credentials() -> Any:
+    """
+    :return: The service account credentials of the Vertex AI calls, parsed once per process.
+    """
+    return service_account.Credentials.from_service_account_info(FIREBASE_CREDS)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens of a text from its length, for responses that do not report token counts.
+
+    :param text: The text.
+    :return: The estimated number of tokens, at least 1 for a non-empty text.
+    """
+    return -(-len(text) // LLM_CHARS_PER_TOKEN)
@@ -0,0 +1,494 @@
+import logging
+import math
+import threading
+import time
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator
+
+from werkzeug.exceptions import TooManyRequests
+
+from shared.globals.constants import LLM_MAX_IN_FLIGHT, LLM_MAX_QUEUE_SIZE, LLM_MAX_QUEUE_WAIT_SECONDS, \
+    LLM_MODEL_REQUESTS_PER_MINUTE, LLM_MODEL_BURST, LLM_ORG_REQUESTS_PER_MINUTE, LLM_ORG_BURST, \
+    LLM_ORG_MAX_CONCURRENCY, LLM_ORG_WEIGHT, LLM_ORG_STATE_SWEEP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class LLMOrgPolicy:
+    """
+    The share of the LLM scheduler an org gets.
+
+    :param max_concurrency: The maximum number of calls of the org running at once.
+    :param weight: The relative number of calls of the org admitted per round when orgs compete for slots.
+    """
+    max_concurrency: int
+    weight: float
+
+
+DEFAULT_ORG_POLICY = LLMOrgPolicy(max_concurrency=LLM_ORG_MAX_CONCURRENCY, weight=LLM_ORG_WEIGHT)
+
+
+class TokenBucket(object):
+    """
+    Token bucket rate limiter. Tokens refill continuously at a fixed rate up to a burst capacity.
+    Not thread-safe on its own, it is guarded by the lock of the scheduler.
+
+    :param rate_per_second: The number of tokens added per second.
+    :param capacity: The maximum number of tokens, which is the largest burst allowed.
+    """
+
+    __slots__ = ('rate_per_second', 'capacity', '_tokens', '_updated_at')
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    def time_until(self, tokens: float, now: float) -> float:
+        """
+        :param tokens: The number of tokens needed.
+        :param now: The current monotonic time.
+        :return: The number of seconds until the tokens are available, 0 if they are available now.
+        """
+        self._refill(now)
+        if self._tokens >= tokens:
+            return 0.0
+
+        return (tokens - self._tokens) / self.rate_per_second if self.rate_per_second > 0 else math.inf
+
+    def consume(self, tokens: float, now: float) -> None:
+        """
+        :param tokens: The number of tokens to take, which must be available.
+        :param now: The current monotonic time.
+        """
+        self._refill(now)
+        self._tokens -= tokens
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+
+
+class LLMCallRejectedError(TooManyRequests):
+    """Raised when an LLM call cannot be scheduled in time. Answered with 429 Too Many Requests and Retry-After."""
+
+    def __init__(self, reason: str, description: str, retry_after_seconds: float):
+        super().__init__(description, retry_after=max(1, math.ceil(retry_after_seconds)))
+        self.reason = reason
+
+
+class _Waiter(object):
+    __slots__ = ('model', 'org_id', 'enqueued_at', 'admitted', 'event')
+
+    def __init__(self, model: str, org_id: str | None, enqueued_at: float):
+        self.model = model
+        self.org_id = org_id
+        self.enqueued_at = enqueued_at
+        self.admitted = False
+        self.event = threading.Event()
+
+
+class LLMScheduler(object):
+    """
+    Process-wide admission control for outbound LLM calls.
+    A call runs once a slot is free among max_in_flight, and once the token buckets of its model and its org
+    have a token, if rate limits are set, so the process stays under the provider quota and no single org can use
+    all of it.
+    Calls that cannot start within max_queue_wait_seconds, or that arrive when max_queue_size calls are already
+    waiting, are rejected right away with 429 instead of piling up until the provider starts failing every call.
+
+    Waiting calls are queued per org, and free slots are shared between orgs with deficit round robin:
+    an org earns its policy weight in credit when its turn starts, and each admitted call spends one.
+    An org at its concurrency cap, or out of tokens, is passed over without earning credit until it can run again.
+    So an org sending many calls only delays the others by its share, whatever the length of its own queue.
+    The policy of each org comes from org_policy_resolver, which defaults to DEFAULT_ORG_POLICY for every org.
+    The policies and token buckets of orgs without running or waiting calls are forgotten every
+    LLM_ORG_STATE_SWEEP_SECONDS, once their buckets refilled, so the scheduler does not grow with every org ever seen.
+
+    :param max_in_flight: The maximum number of LLM calls running at once.
+    :param max_queue_size: The maximum number of calls waiting for a slot.
+    :param max_queue_wait_seconds: The maximum number of seconds a call waits before it is rejected.
+    :param model_requests_per_minute: The sustained rate of calls per model, or None to not limit it.
+    :param model_burst: The number of calls per model that can start at once after a quiet period.
+    :param org_requests_per_minute: The sustained rate of calls per org, or None to not limit it.
+    :param org_burst: The number of calls per org that can start at once after a quiet period.
+    """
+
+    def __init__(self,
+                 max_in_flight: int,
+                 max_queue_size: int,
+                 max_queue_wait_seconds: float,
+                 model_requests_per_minute: float | None,
+                 model_burst: float,
+                 org_requests_per_minute: float | None,
+                 org_burst: float):
+        self.max_in_flight = max_in_flight
+        self.max_queue_size = max_queue_size
+        self.max_queue_wait_seconds = max_queue_wait_seconds
+        self.model_requests_per_minute = model_requests_per_minute
+        self.model_burst = model_burst
+        self.org_requests_per_minute = org_requests_per_minute
+        self.org_burst = org_burst
+
+        self.org_policy_resolver: Callable[[str], LLMOrgPolicy] = lambda org_id: DEFAULT_ORG_POLICY
+
+        self._lock = threading.Lock()
+        # Notified when the last running or waiting call leaves, for drain.
+        self._idle = threading.Condition(self._lock)
+        # Waiting calls per org, in the round robin order of the orgs. Orgs without waiting calls are removed.
+        self._org_queues: OrderedDict[str | None, deque[_Waiter]] = OrderedDict()
+        self._org_deficits: dict[str | None, float] = {}
+        self._org_in_flight: dict[str | None, int] = {}
+        self._org_policies: dict[str | None, LLMOrgPolicy] = {}
+        self._turn_org_id: str | None = None
+        self._queue_size = 0
+        self._in_flight = 0
+        self._model_buckets: dict[str, TokenBucket] = {}
+        self._org_buckets: dict[str, TokenBucket] = {}
+        self._next_sweep_at = time.monotonic() + LLM_ORG_STATE_SWEEP_SECONDS
+
+        self._admitted = 0
+        self._completed = 0
+        self._rejected: dict[str, int] = {}
+        self._queue_seconds_total = 0.0
+        self._queue_seconds_max = 0.0
+        self._call_seconds_total = 0.0
+        self._call_seconds_max = 0.0
+
+    @contextmanager
+    def slot(self, model: str, org_id: str | None) -> Iterator[float]:
+        """
+        Wait for a slot to make an LLM call, and hold it while the block runs.
+
+        :param model: The name of the model being called.
+        :param org_id: The org the call is made for, or None if the call is not made for an org.
+        :return: The number of seconds the call waited for the slot.
+        :raises LLMCallRejectedError: If the call cannot start in time.
+        """
+        queue_seconds = self.acquire(model, org_id)
+        start = time.monotonic()
+        try:
+            yield queue_seconds
+        finally:
+            self.release(org_id, time.monotonic() - start)
+
+    def acquire(self, model: str, org_id: str | None) -> float:
+        """
+        Wait for a slot to make an LLM call. Every successful acquire must be followed by a release.
+
+        :param model: The name of the model being called.
+        :param org_id: The org the call is made for, or None if the call is not made for an org.
+        :return: The number of seconds the call waited.
+        :raises LLMCallRejectedError: If the call cannot start in time.
+        """
+        now = time.monotonic()
+        deadline = now + self.max_queue_wait_seconds
+        waiter = _Waiter(model, org_id, now)
+
+        policy = self._resolve_org_policy(org_id)
+
+        with self._lock:
+            if now >= self._next_sweep_at:
+                self._sweep_idle_orgs(now)
+
+            self._admit_or_reject(waiter, now)
+            self._org_policies[org_id] = policy
+            retry_in = self._dispatch(now)
+
+        while not waiter.admitted:
+            now = time.monotonic()
+            timeout = deadline - now if retry_in is None else min(deadline - now, retry_in)
+            if timeout > 0:
+                waiter.event.wait(timeout)
+
+            with self._lock:
+                if waiter.admitted:
+                    break
+
+                now = time.monotonic()
+                retry_in = self._dispatch(now)
+                if not waiter.admitted and now >= deadline:
+                    self._dequeue(waiter)
+                    rate_limit_wait = self._rate_limit_wait(waiter, now)
+                    reason = 'rate_limited' if rate_limit_wait > 0 else 'queue_timeout'
+                    self._reject(reason, f'LLM calls are {reason.replace("_", " ")}, try again later',
+                                 max(rate_limit_wait, self.max_queue_wait_seconds / 2))
+
+        queue_seconds = time.monotonic() - waiter.enqueued_at
+        with self._lock:
+            self._queue_seconds_total += queue_seconds
+            self._queue_seconds_max = max(self._queue_seconds_max, queue_seconds)
+
+        return queue_seconds
+
+    def release(self, org_id: str | None, call_seconds: float = 0.0) -> None:
+        """
+        Free the slot of a finished LLM call and admit the next waiting call.
+
+        :param org_id: The org the call was made for.
+        :param call_seconds: The duration of the call, for the latency metrics.
+        """
+        with self._lock:
+            self._in_flight -= 1
+            self._org_in_flight[org_id] -= 1
+            if not self._org_in_flight[org_id]:
+                del self._org_in_flight[org_id]
+            self._completed += 1
+            self._call_seconds_total += call_seconds
+            self._call_seconds_max = max(self._call_seconds_max, call_seconds)
+            self._dispatch(time.monotonic())
+            if not self._in_flight and not self._queue_size:
+                self._idle.notify_all()
+
+    def drain(self, timeout_seconds: float) -> bool:
+        """
+        Wait for the running and waiting LLM calls to finish, for a graceful shutdown.
+        New calls are still admitted while draining, since the requests making them are in flight too.
+
+        :param timeout_seconds: The maximum number of seconds to wait.
+        :return: Whether every call finished in time.
+        """
+        deadline = time.monotonic() + timeout_seconds
+        with self._lock:
+            # Waiting calls that time out leave without a release, so check again every now and then.
+            while self._in_flight or self._queue_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(f'Stopped draining with {self._in_flight} LLM calls running '
+                                   f'and {self._queue_size} waiting')
+                    return False
+
+                self._idle.wait(min(remaining, 0.1))
+
+        return True
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Get the queue depth, admission counters and latencies of the scheduler.
+
+        :return: A dictionary of the current state, counters and latencies in seconds.
+        """
+        with self._lock:
+            return {
+                'in_flight': self._in_flight,
+                'max_in_flight': self.max_in_flight,
+                'queue_depth': self._queue_size,
+                'max_queue_size': self.max_queue_size,
+                'orgs_waiting': len(self._org_queues),
+                'orgs_in_flight': len(self._org_in_flight),
+                'admitted': self._admitted,
+                'completed': self._completed,
+                'rejected': dict(self._rejected),
+                'avg_queue_seconds': self._queue_seconds_total / self._admitted if self._admitted else 0.0,
+                'max_queue_seconds': self._queue_seconds_max,
+                'avg_call_seconds': self._call_seconds_total / self._completed if self._completed else 0.0,
+                'max_call_seconds': self._call_seconds_max
+            }
+
+    def _admit_or_reject(self, waiter: _Waiter, now: float) -> None:
+        """
+        Queue a new call, unless the queue is full or its rate limit cannot let it start in time.
+        Must be called while holding the lock.
+
+        :param waiter: The new call.
+        :param now: The current monotonic time.
+        :raises LLMCallRejectedError: If the call is rejected.
+        """
+        if self._queue_size >= self.max_queue_size:
+            self._reject('queue_full', 'Too many LLM calls are waiting, try again later', self.max_queue_wait_seconds)
+
+        # Calls already waiting for the same model or org take the tokens first.
+        org_queue = self._org_queues.get(waiter.org_id, ())
+        queued_for_model = sum(1 for queue in self._org_queues.values() for queued in queue
+                               if queued.model == waiter.model)
+        queued_for_org = len(org_queue)
+        rate_limit_wait = max(self._model_bucket_wait(waiter.model, 1 + queued_for_model, now),
+                              self._org_bucket_wait(waiter.org_id, 1 + queued_for_org, now))
+        if rate_limit_wait > self.max_queue_wait_seconds:
+            self._reject('rate_limited', 'LLM calls are rate limited, try again later', rate_limit_wait)
+
+        if waiter.org_id not in self._org_queues:
+            self._org_queues[waiter.org_id] = deque()
+            self._org_deficits[waiter.org_id] = 0.0
+
+        self._org_queues[waiter.org_id].append(waiter)
+        self._queue_size += 1
+
+    def _dispatch(self, now: float) -> float | None:
+        """
+        Admit waiting calls while slots are free. Must be called while holding the lock.
+
+        :param now: The current monotonic time.
+        :return: The number of seconds until a rate limited call may be admitted, or None if none is rate limited.
+        """
+        retry_in = None
+        while self._in_flight < self.max_in_flight and self._org_queues:
+            waiter, retry_in = self._next_waiter(now)
+            if waiter is None:
+                break
+
+            self._dequeue(waiter)
+            if self.model_requests_per_minute is not None:
+                self._model_bucket(waiter.model).consume(1, now)
+            if self.org_requests_per_minute is not None and waiter.org_id is not None:
+                self._org_bucket(waiter.org_id).consume(1, now)
+
+            self._in_flight += 1
+            self._org_in_flight[waiter.org_id] = self._org_in_flight.get(waiter.org_id, 0) + 1
+            self._admitted += 1
+            waiter.admitted = True
+            waiter.event.set()
+
+        return retry_in
+
+    def _next_waiter(self, now: float) -> tuple[_Waiter | None, float | None]:
+        """
+        Pick the next call to admit with deficit round robin over the org queues.
+        The org at the front of the round earns its weight in credit when its turn starts,
+        and keeps the turn while it has credit and a call that can run. Then it moves to the back of the round.
+        Must be called while holding the lock.
+
+        :param now: The current monotonic time.
+        :return: The call to admit, or None and the number of seconds until a rate limited call may be admitted.
+        """
+        # Enough turns for the org with the lowest weight to earn one call of credit.
+        min_weight = min(self._org_policy(org_id).weight for org_id in self._org_queues)
+        max_turns = len(self._org_queues) * (math.ceil(1 / min_weight) + 1) if min_weight > 0 else len(self._org_queues)
+
+        retry_in = None
+        for _ in range(max_turns):
+            org_id, org_queue = next(iter(self._org_queues.items()))
+            waiter = org_queue[0]
+            policy = self._org_policy(org_id)
+
+            rate_limit_wait = self._rate_limit_wait(waiter, now)
+            can_run = rate_limit_wait == 0 and self._org_in_flight.get(org_id, 0) < policy.max_concurrency
+            if rate_limit_wait > 0:
+                retry_in = rate_limit_wait if retry_in is None else min(retry_in, rate_limit_wait)
+
+            if can_run:
+                if self._turn_org_id != org_id:
+                    self._turn_org_id = org_id
+                    self._org_deficits[org_id] += policy.weight
+
+                if self._org_deficits[org_id] >= 1:
+                    self._org_deficits[org_id] -= 1
+                    return waiter, None
+
+            self._turn_org_id = None
+            self._org_queues.move_to_end(org_id)
+
+        return None, retry_in
+
+    def _org_policy(self, org_id: str | None) -> LLMOrgPolicy:
+        return self._org_policies.get(org_id, DEFAULT_ORG_POLICY)
+
+    def _resolve_org_policy(self, org_id: str | None) -> LLMOrgPolicy:
+        """
+        Get the scheduling policy of an org from the resolver, outside the lock since it may read the database.
+
+        :param org_id: The org, or None for calls not made for an org.
+        :return: The policy of the org, or the default policy if it cannot be resolved.
+        """
+        if org_id is None:
+            return DEFAULT_ORG_POLICY
+
+        try:
+            return self.org_policy_resolver(org_id)
+        except Exception as ex:
+            logger.warning(f"Failed to resolve the LLM scheduling policy of org '{org_id}', using the default: {ex}")
+            return DEFAULT_ORG_POLICY
+
+    def _rate_limit_wait(self, waiter: _Waiter, now: float) -> float:
+        """
+        :param waiter: A waiting call.
+        :param now: The current monotonic time.
+        :return: The number of seconds until the model and org of the call both have a token.
+        """
+        return max(self._model_bucket_wait(waiter.model, 1, now), self._org_bucket_wait(waiter.org_id, 1, now))
+
+    def _model_bucket_wait(self, model: str, tokens: float, now: float) -> float:
+        if self.model_requests_per_minute is None:
+            return 0.0
+
+        return self._model_bucket(model).time_until(tokens, now)
+
+    def _org_bucket_wait(self, org_id: str | None, tokens: float, now: float) -> float:
+        if self.org_requests_per_minute is None or org_id is None:
+            return 0.0
+
+        return self._org_bucket(org_id).time_until(tokens, now)
+
+    def _sweep_idle_orgs(self, now: float) -> None:
+        """
+        Forget the policies of the orgs without running or waiting calls, and their token buckets once refilled,
+        since a new bucket starts full too. Must be called while holding the lock.
+
+        :param now: The current monotonic time.
+        """
+        self._next_sweep_at = now + LLM_ORG_STATE_SWEEP_SECONDS
+        for org_id in list(self._org_policies):
+            if org_id not in self._org_queues and org_id not in self._org_in_flight:
+                del self._org_policies[org_id]
+
+        for org_id, bucket in list(self._org_buckets.items()):
+            if org_id not in self._org_policies and bucket.time_until(bucket.capacity, now) == 0:
+                del self._org_buckets[org_id]
+
+    def _dequeue(self, waiter: _Waiter) -> None:
+        """
+        Remove a call from its org queue, and the org from the round when it has no more waiting calls.
+        An org leaving the round loses its credit, so credit cannot be saved up while idle.
+        Must be called while holding the lock.
+
+        :param waiter: The waiting call.
+        """
+        org_queue = self._org_queues[waiter.org_id]
+        org_queue.remove(waiter)
+        self._queue_size -= 1
+        if not org_queue:
+            del self._org_queues[waiter.org_id]
+            del self._org_deficits[waiter.org_id]
+            if self._turn_org_id == waiter.org_id:
+                self._turn_org_id = None
+
+    def _reject(self, reason: str, description: str, retry_after_seconds: float) -> None:
+        """
+        Count a rejected call and raise the rejection. Must be called while holding the lock.
+
+        :raises LLMCallRejectedError: Always.
+        """
+        self._rejected[reason] = self._rejected.get(reason, 0) + 1
+        raise LLMCallRejectedError(reason, description, retry_after_seconds)
+
+    def _model_bucket(self, model: str) -> TokenBucket:
+        bucket = self._model_buckets.get(model)
+        if bucket is None:
+            bucket = TokenBucket(self.model_requests_per_minute / 60, self.model_burst)
+            self._model_buckets[model] = bucket
+
+        return bucket
+
+    def _org_bucket(self, org_id: str) -> TokenBucket:
+        bucket = self._org_buckets.get(org_id)
+        if bucket is None:
+            bucket = TokenBucket(self.org_requests_per_minute / 60, self.org_burst)
+            self._org_buckets[org_id] = bucket
+
+        return bucket
+
+
+LLM_SCHEDULER = LLMScheduler(
+    LLM_MAX_IN_FLIGHT,
+    LLM_MAX_QUEUE_SIZE,
+    LLM_MAX_QUEUE_WAIT_SECONDS,
+    LLM_MODEL_REQUESTS_PER_MINUTE,
+    LLM_MODEL_BURST,
+    LLM_ORG_REQUESTS_PER_MINUTE,
+    LLM_ORG_BURST
+)
+"""The scheduler shared by every LLM call of the process."""
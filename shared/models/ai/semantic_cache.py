@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable
+
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+
+from shared.tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class SemanticCacheHit:
+    query: str
+    answer: str
+    similarity: float
+
+
+class SemanticCache(object):
+    """
+    Thread-safe cache of answers to natural language queries, looked up by the similarity of query embeddings,
+    so paraphrased queries can share an answer. Entries are kept per namespace (for example per user and assistant),
+    expire after a time to live, and the least recently used entries and namespaces are evicted when full.
+
+    :param name: A name for the cache, used in logs and when reporting stats.
+    :param embeddings: The model used to embed queries.
+    :param similarity_threshold: The minimum cosine similarity between two queries to share an answer.
+    :param ttl_seconds: The number of seconds an answer stays valid after it is put in the cache.
+    :param max_entries: The maximum number of entries per namespace.
+    :param max_namespaces: The maximum number of namespaces.
+    """
+
+    def __init__(self,
+                 name: str,
+                 embeddings: Embeddings,
+                 similarity_threshold: float,
+                 ttl_seconds: float,
+                 max_entries: int,
+                 max_namespaces: int):
+        self.name = name
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_namespaces = max_namespaces
+
+        # Per namespace and query: (expires at, unit-length embedding, answer), least recently used first.
+        self._namespaces: OrderedDict[Hashable, OrderedDict[str, tuple[float, np.ndarray, str]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._puts = 0
+        self._skips = 0
+
+    def embed(self, query: str) -> np.ndarray:
+        """
+        Embed a query, normalized to unit length so cosine similarity is a dot product.
+
+        :param query: The query to embed.
+        :return: The embedding of the query.
+        """
+        embedding = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def lookup(self, namespace: Hashable, query: str, query_embedding: np.ndarray) -> SemanticCacheHit | None:
+        """
+        Find the cached answer of the most similar query in the namespace, if similar enough.
+        The best similarity found is recorded on the current span, hit or miss.
+
+        :param namespace: The namespace to look in.
+        :param query: The query, for logging.
+        :param query_embedding: The embedding of the query, from embed.
+        :return: The cache hit, or None if no cached query is similar enough.
+        """
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            self._remove_expired(namespace, entries)
+
+            best_query, best_similarity = None, -1.0
+            if entries:
+                cached_queries = list(entries)
+                similarities = np.stack([entries[cached_query][1] for cached_query in cached_queries]) @ query_embedding
+                best_index = int(np.argmax(similarities))
+                best_query, best_similarity = cached_queries[best_index], float(similarities[best_index])
+
+            lookup_span = current_span()
+            if lookup_span is not None and best_query is not None:
+                lookup_span.set_attribute('similarity', round(best_similarity, 3))
+
+            if best_query is None or best_similarity < self.similarity_threshold:
+                self._misses += 1
+                logger.info(f"Semantic cache '{self.name}' miss for query {query!r}: "
+                            f'best similarity {best_similarity:.3f} to {best_query!r}')
+                return None
+
+            entries.move_to_end(best_query)
+            self._hits += 1
+            answer = entries[best_query][2]
+
+        logger.info(f"Semantic cache '{self.name}' hit for query {query!r}: "
+                    f'similarity {best_similarity:.3f} to {best_query!r}')
+        return SemanticCacheHit(query=best_query, answer=answer, similarity=best_similarity)
+
+    def put(self, namespace: Hashable, query: str, query_embedding: np.ndarray, answer: str) -> None:
+        """
+        Cache the answer to a query, evicting the least recently used entry of the namespace if it is full.
+
+        :param namespace: The namespace of the entry.
+        :param query: The query.
+        :param query_embedding: The embedding of the query, from embed.
+        :param answer: The answer to cache.
+        """
+        with self._lock:
+            entries = self._namespaces.setdefault(namespace, OrderedDict())
+            self._namespaces.move_to_end(namespace)
+            while len(self._namespaces) > self.max_namespaces:
+                self._namespaces.popitem(last=False)
+
+            entries[query] = (time.monotonic() + self.ttl_seconds, query_embedding, answer)
+            entries.move_to_end(query)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+            self._puts += 1
+
+        logger.info(f"Semantic cache '{self.name}' stored the answer for query {query!r}")
+
+    def skip(self, query: str, reason: str) -> None:
+        """
+        Record that the answer to a query was not cached.
+
+        :param query: The query.
+        :param reason: Why the answer was not cached.
+        """
+        with self._lock:
+            self._skips += 1
+
+        logger.info(f"Semantic cache '{self.name}' did not store the answer for query {query!r}: {reason}")
+
+    def clear(self) -> None:
+        """Remove every entry from the cache."""
+        with self._lock:
+            self._namespaces.clear()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Get the usage statistics of the cache.
+
+        :return: A dictionary of counters, the current size and the hit rate of the cache.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'name': self.name,
+                'namespaces': len(self._namespaces),
+                'size': sum(len(entries) for entries in self._namespaces.values()),
+                'hits': self._hits,
+                'misses': self._misses,
+                'puts': self._puts,
+                'skips': self._skips,
+                'hit_rate': self._hits / lookups if lookups else 0.0
+            }
+
+    def _remove_expired(self, namespace: Hashable, entries: OrderedDict | None) -> None:
+        """
+        Remove the expired entries of a namespace, and the namespace if it is left empty.
+        Must be called while holding the lock.
+
+        :param namespace: The namespace.
+        :param entries: The entries of the namespace, if any.
+        """
+        if entries is None:
+            return
+
+        now = time.monotonic()
+        for expired_query in [query for query, entry in entries.items() if entry[0] <= now]:
+            del entries[expired_query]
+
+        if not entries:
+            del self._namespaces[namespace]
@@ -0,0 +1,126 @@
+import re
+from collections import OrderedDict
+from json import loads
+from typing import Any, Iterator
+
+from shared.globals.constants import TOOL_MEMORY_MAX_VALUES, TOOL_MEMORY_MAX_VALUE_LENGTH, TOOL_MEMORY_MAX_SPAN_TOKENS
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+_END = object()
+
+
+class ToolMemory(object):
+    """
+    Memory of the values an agent saw while answering a query: the words of the query, and the values
+    in the responses of the tools it ran. Tools check their required arguments against it, since the LLM fills
+    required arguments with made up values when the user did not give them.
+
+    Checking a value costs the same no matter how much data the tools returned. Queries are indexed by their spans
+    of normalized words, so a value is looked up instead of searched for in the query. Tool values are deduplicated,
+    values too long to be an argument are skipped, and the values of the oldest tool responses are evicted first
+    once the memory is full. The memory belongs to one agent run, so it is not thread-safe.
+
+    :param max_values: The maximum number of tool values to remember.
+    :param max_value_length: The maximum length of a tool value to remember.
+    :param max_span_tokens: The maximum number of words of the query spans to index. Longer values
+                            are searched for in the normalized query instead.
+    """
+
+    def __init__(self,
+                 max_values: int = TOOL_MEMORY_MAX_VALUES,
+                 max_value_length: int = TOOL_MEMORY_MAX_VALUE_LENGTH,
+                 max_span_tokens: int = TOOL_MEMORY_MAX_SPAN_TOKENS):
+        self.max_values = max_values
+        self.max_value_length = max_value_length
+        self.max_span_tokens = max_span_tokens
+
+        # Tool values, least recently seen first. The values are the keys, the dict is only used as an ordered set.
+        self._values: OrderedDict[str, None] = OrderedDict()
+        # Per indexed query: the query normalized to its words separated by spaces.
+        self._queries: dict[str, str] = {}
+        self._query_spans: set[str] = set()
+
+    def __contains__(self, value: Any) -> bool:
+        """
+        :param value: A value, like an argument of a tool.
+        :return: Whether the value was in a tool response, or its words are in an indexed query.
+        """
+        value_str = str(value)
+        if value_str in self._values:
+            return True
+
+        value_tokens = self._tokenize(value_str)
+        if not value_tokens:
+            # Values without words, like punctuation, can only be found in the raw queries.
+            return any(value_str in query for query in self._queries)
+        if len(value_tokens) <= self.max_span_tokens:
+            return ' '.join(value_tokens) in self._query_spans
+
+        normalized_value = ' '.join(value_tokens)
+        return any(normalized_value in normalized_query for normalized_query in self._queries.values())
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def index_query(self, user_query: str) -> None:
+        """
+        Index the spans of words of a query. Queries that were already indexed are skipped.
+
+        :param user_query: The query.
+        """
+        if not user_query or user_query in self._queries:
+            return
+
+        tokens = self._tokenize(user_query)
+        self._queries[user_query] = ' '.join(tokens)
+        for start in range(len(tokens)):
+            for end in range(start + 1, min(start + self.max_span_tokens, len(tokens)) + 1):
+                self._query_spans.add(' '.join(tokens[start:end]))
+
+    def add_output(self, json_str: str) -> int:
+        """
+        Remember the lowest level values of a JSON tool response, evicting the values of older responses when full.
+
+        :param json_str: The JSON tool response.
+        :return: The number of values remembered.
+        """
+        added = 0
+        for value in self.get_lowest_level_values(loads(json_str), self.max_value_length):
+            self._values[value] = None
+            self._values.move_to_end(value)
+            added += 1
+            # Values past the capacity would only evict the values of this response.
+            if added >= self.max_values:
+                break
+
+        while len(self._values) > self.max_values:
+            self._values.popitem(last=False)
+
+        return added
+
+    @staticmethod
+    def get_lowest_level_values(data: Any, max_value_length: int | None = None) -> Iterator[str]:
+        """
+        Walk a parsed JSON document without recursion, so deeply nested responses cannot overflow the stack.
+
+        :param data: The parsed JSON document.
+        :param max_value_length: Optional maximum length of the values to yield. Longer values are skipped.
+        :return: The values of the document that are not objects or arrays, as strings, in document order.
+        """
+        stack: list[Iterator[Any]] = [iter((data,))]
+        while stack:
+            item = next(stack[-1], _END)
+            if item is _END:
+                stack.pop()
+            elif isinstance(item, dict):
+                stack.append(iter(item.values()))
+            elif isinstance(item, list):
+                stack.append(iter(item))
+            else:
+                value = str(item)
+                if max_value_length is None or len(value) <= max_value_length:
+                    yield value
+
+    @staticmethod
+    def _tokenize(text: str) -> list[str]:
+        return _TOKEN_PATTERN.findall(text.lower())
@@ -1,15 +1,21 @@
 from abc import ABC, abstractmethod
+from functools import cache
 from typing import Any
 
 from firebase_admin.firestore import firestore as fs
 from marshmallow import Schema, EXCLUDE
 
+from shared.models.serializable import Serializable
 
-class BaseDTO(ABC):
+
+class BaseDTO(Serializable, ABC):
     """
     Abstract base class for Data Transfer Objects.
+    Derived classes declare their fields in __slots__, which are serialized by to_dict().
     """
 
+    __slots__ = ()
+
     @staticmethod
     @abstractmethod
     def id_name() -> str:
@@ -33,11 +39,12 @@ class BaseDTOFactory(ABC):
 
     @staticmethod
     @abstractmethod
-    def create_from_doc(doc_snapshot: fs.DocumentSnapshot) -> Any:
+    def create_from_doc(doc_snapshot: fs.DocumentSnapshot, trusted: bool = False) -> Any:
         """
         Create an instance of the derived class from a given DocumentSnapshot.
 
         :param doc_snapshot: The DocumentSnapshot object to create the instance from.
+        :param trusted: Whether the document was written by this API, so schema validation can be skipped.
         :return: An instance of the derived class created from the DocumentSnapshot.
         """
         pass
@@ -62,3 +69,52 @@ class BaseDTOFactory(ABC):
 
         dto = schema.load(doc_dict, partial=True, unknown=EXCLUDE)
         return dto
+
+    @staticmethod
+    def trusted_doc_to_object(
+            dto_type: type,
+            schema_type: type[Schema],
+            doc_snapshot: fs.DocumentSnapshot,
+            id_name: str
+    ) -> Any | None:
+        """
+        Converts a Google Cloud Firestore DocumentSnapshot into a DTO without running schema validation.
+        Only the fields declared on the schema are passed to the DTO, like loading with unknown=EXCLUDE.
+        This is only safe for documents written by this API.
+
+        :param dto_type: The DTO class to create.
+        :param schema_type: The Marshmallow Schema class that declares the DTO fields.
+        :param doc_snapshot: The DocumentSnapshot to convert.
+        :param id_name: The name of the key to store the document ID.
+        :return: The DTO created from the DocumentSnapshot. If doc_snapshot is None, None is returned.
+        """
+        if doc_snapshot is None:
+            return None
+
+        doc_dict = doc_snapshot.to_dict()
+        dto_kwargs = {name: doc_dict[name] for name in get_schema_field_names(schema_type) if name in doc_dict}
+        dto_kwargs[id_name] = doc_snapshot.id
+
+        return dto_type(**dto_kwargs)
+
+
+@cache
+def get_schema(schema_type: type[Schema]) -> Schema:
+    """
+    Get a shared instance of a Marshmallow Schema. Schemas hold no per-load state, so one instance can be reused.
+
+    :param schema_type: The Marshmallow Schema class.
+    :return: The shared Schema instance.
+    """
+    return schema_type()
+
+
+@cache
+def get_schema_field_names(schema_type: type[Schema]) -> tuple[str, ...]:
+    """
+    Get the names of the fields declared on a Marshmallow Schema.
+
+    :param schema_type: The Marshmallow Schema class.
+    :return: The declared field names.
+    """
+    return tuple(schema_type._declared_fields)
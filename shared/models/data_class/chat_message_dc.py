@@ -1,7 +1,9 @@
 from dataclasses import dataclass
 
+from shared.models.serializable import Serializable
 
-@dataclass
-class ChatMessageDC(object):
+
+@dataclass(slots=True)
+class ChatMessageDC(Serializable):
     sender: str = None
     message: str = None
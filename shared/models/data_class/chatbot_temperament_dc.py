@@ -1,9 +1,12 @@
 from typing import Any
 
 from shared.globals.enums import ChatbotTemperaments
+from shared.models.serializable import Serializable
 
 
-class ChatbotTemperamentDC(object):
+class ChatbotTemperamentDC(Serializable):
+    __slots__ = ('temperament', 'temperature', 'top_k', 'top_p')
+
     def __init__(self,
                  temperament: ChatbotTemperaments | str = None,
                  temperature: float = None,
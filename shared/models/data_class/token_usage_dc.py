@@ -0,0 +1,21 @@
+from dataclasses import dataclass
+
+from shared.models.serializable import Serializable
+
+
+@dataclass(slots=True)
+class TokenUsageDC(Serializable):
+    scope: str = None
+    subject_id: str = None
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    llm_seconds: float = 0.0
+
+    def add(self, other: 'TokenUsageDC') -> None:
+        self.calls += other.calls
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.total_tokens += other.total_tokens
+        self.llm_seconds += other.llm_seconds
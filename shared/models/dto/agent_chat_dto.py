@@ -0,0 +1,59 @@
+from firebase_admin.firestore import firestore as fs
+from marshmallow import Schema, fields, post_load
+
+from shared.models.base_dto import BaseDTOFactory, BaseDTO, get_schema
+
+
+class AgentChatDTO(BaseDTO):
+    """Class representing the conversation memory of an agent chat.
+
+    :param chat_id: The ID of the agent chat.
+    :type chat_id: str
+    :param initiator_id: The ID of the one who initiated the chat.
+    :type initiator_id: str
+    :param history: The most recent messages of the chat, alternating between the user and the agent.
+    :type history: list[str]
+    """
+
+    __slots__ = ('chat_id', 'initiator_id', 'history')
+
+    @staticmethod
+    def id_name() -> str:
+        return 'chat_id'
+
+    def id_value(self) -> str:
+        return self.chat_id
+
+    def __init__(self,
+                 chat_id: str = None,
+                 initiator_id: str = None,
+                 history: list[str] = None):
+        self.chat_id = chat_id
+        self.initiator_id = initiator_id
+        self.history = history
+
+
+class AgentChatDTOFactory(BaseDTOFactory):
+    """
+    Creates AgentChatDTO objects from DocumentSnapshots.
+    """
+
+    @staticmethod
+    def create_from_doc(doc_snapshot: fs.DocumentSnapshot, trusted: bool = False) -> AgentChatDTO | None:
+        if trusted:
+            return BaseDTOFactory.trusted_doc_to_object(AgentChatDTO, AgentChatSchema, doc_snapshot,
+                                                        AgentChatDTO.id_name())
+
+        return BaseDTOFactory.doc_to_object(get_schema(AgentChatSchema), doc_snapshot, AgentChatDTO.id_name())
+
+
+class AgentChatSchema(Schema):
+    """Schema for the AgentChat model"""
+
+    chat_id = fields.Str()
+    initiator_id = fields.Str()
+    history = fields.List(fields.Str())
+
+    @post_load
+    def make_agent_chat(self, data, **_kwargs):
+        return AgentChatDTO(**data)
@@ -1,7 +1,7 @@
 from firebase_admin.firestore import firestore as fs
 from marshmallow import Schema, fields, post_load
 
-from shared.models.base_dto import BaseDTOFactory, BaseDTO
+from shared.models.base_dto import BaseDTOFactory, BaseDTO, get_schema
 
 
 class AssistantDTO(BaseDTO):
@@ -13,6 +13,8 @@ class AssistantDTO(BaseDTO):
     :type context: str
     """
 
+    __slots__ = ('assistant_id', 'context')
+
     @staticmethod
     def id_name() -> str:
         return 'assistant_id'
@@ -33,8 +35,11 @@ class AssistantDTOFactory(BaseDTOFactory):
     """
 
     @staticmethod
-    def create_from_doc(doc_snapshot: fs.DocumentSnapshot) -> AssistantDTO | None:
-        return BaseDTOFactory.doc_to_object(AssistantSchema(), doc_snapshot, AssistantDTO.id_name())
+    def create_from_doc(doc_snapshot: fs.DocumentSnapshot, trusted: bool = False) -> AssistantDTO | None:
+        if trusted:
+            return BaseDTOFactory.trusted_doc_to_object(AssistantDTO, AssistantSchema, doc_snapshot, AssistantDTO.id_name())
+
+        return BaseDTOFactory.doc_to_object(get_schema(AssistantSchema), doc_snapshot, AssistantDTO.id_name())
 
 
 class AssistantSchema(Schema):
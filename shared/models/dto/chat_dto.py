@@ -1,12 +1,16 @@
+from typing import TYPE_CHECKING
+
 from firebase_admin.firestore import firestore as fs
-from langchain.schema import BaseMessage, SystemMessage, HumanMessage, AIMessage
 from marshmallow import Schema, fields, post_load
 
 from shared.globals.enums import ChatbotTemperaments
-from shared.models.base_dto import BaseDTOFactory, BaseDTO
+from shared.models.base_dto import BaseDTOFactory, BaseDTO, get_schema
 from shared.models.data_class.chat_message_dc import ChatMessageDC
 from shared.models.data_class.chatbot_temperament_dc import ChatbotTemperamentDC
 
+if TYPE_CHECKING:
+    from langchain.schema import BaseMessage
+
 
 class ChatDTO(ChatbotTemperamentDC, BaseDTO):
     """Class representing a Chat.
@@ -25,6 +29,8 @@ class ChatDTO(ChatbotTemperamentDC, BaseDTO):
     :type history: list[str]
     """
 
+    __slots__ = ('chat_id', 'initiator_id', 'respondent_id', 'sender', 'message', 'history')
+
     @staticmethod
     def id_name() -> str:
         return 'chat_id'
@@ -68,7 +74,9 @@ class ChatDTO(ChatbotTemperamentDC, BaseDTO):
             for i, message in enumerate(self.history[1:])
         ]
 
-    def messages_langchain(self) -> list[BaseMessage]:
+    def messages_langchain(self) -> list['BaseMessage']:
+        from langchain.schema import SystemMessage, HumanMessage, AIMessage
+
         return [
             SystemMessage(content=message) if i == 0 else
             HumanMessage(content=message) if i % 2 != 0 else
@@ -89,8 +97,11 @@ class ChatDTOFactory(BaseDTOFactory):
     """
 
     @staticmethod
-    def create_from_doc(doc_snapshot: fs.DocumentSnapshot) -> ChatDTO | None:
-        return BaseDTOFactory.doc_to_object(ChatSchema(), doc_snapshot, ChatDTO.id_name())
+    def create_from_doc(doc_snapshot: fs.DocumentSnapshot, trusted: bool = False) -> ChatDTO | None:
+        if trusted:
+            return BaseDTOFactory.trusted_doc_to_object(ChatDTO, ChatSchema, doc_snapshot, ChatDTO.id_name())
+
+        return BaseDTOFactory.doc_to_object(get_schema(ChatSchema), doc_snapshot, ChatDTO.id_name())
 
 
 class ChatSchema(Schema):
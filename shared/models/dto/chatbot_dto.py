@@ -2,7 +2,7 @@ from firebase_admin.firestore import firestore as fs
 from marshmallow import Schema, fields, post_load
 
 from shared.globals.enums import ChatbotTemperaments
-from shared.models.base_dto import BaseDTOFactory, BaseDTO
+from shared.models.base_dto import BaseDTOFactory, BaseDTO, get_schema
 from shared.models.data_class.chatbot_temperament_dc import ChatbotTemperamentDC
 
 
@@ -13,8 +13,12 @@ class ChatbotDTO(ChatbotTemperamentDC, BaseDTO):
     :type chatbot_id: str
     :param context: The context of the chatbot.
     :type context: str
+    :param cache_responses: Whether identical chat openings may be answered from the response cache.
+    :type cache_responses: bool
     """
 
+    __slots__ = ('chatbot_id', 'context', 'cache_responses')
+
     @staticmethod
     def id_name() -> str:
         return 'chatbot_id'
@@ -28,9 +32,11 @@ class ChatbotDTO(ChatbotTemperamentDC, BaseDTO):
                  temperament: ChatbotTemperaments | str = None,
                  temperature: float = None,
                  top_k: int = None,
-                 top_p: float = None):
+                 top_p: float = None,
+                 cache_responses: bool = None):
         self.chatbot_id = chatbot_id
         self.context = context
+        self.cache_responses = cache_responses
 
         super().__init__(temperament, temperature, top_k, top_p)
 
@@ -41,8 +47,11 @@ class ChatbotDTOFactory(BaseDTOFactory):
     """
 
     @staticmethod
-    def create_from_doc(doc_snapshot: fs.DocumentSnapshot) -> ChatbotDTO | None:
-        return BaseDTOFactory.doc_to_object(ChatbotSchema(), doc_snapshot, ChatbotDTO.id_name())
+    def create_from_doc(doc_snapshot: fs.DocumentSnapshot, trusted: bool = False) -> ChatbotDTO | None:
+        if trusted:
+            return BaseDTOFactory.trusted_doc_to_object(ChatbotDTO, ChatbotSchema, doc_snapshot, ChatbotDTO.id_name())
+
+        return BaseDTOFactory.doc_to_object(get_schema(ChatbotSchema), doc_snapshot, ChatbotDTO.id_name())
 
 
 class ChatbotSchema(Schema):
@@ -56,6 +65,8 @@ class ChatbotSchema(Schema):
     top_k = fields.Integer()
     top_p = fields.Float()
 
+    cache_responses = fields.Boolean()
+
     @post_load
     def make_chatbot(self, data, **_kwargs):
         return ChatbotDTO(**data)
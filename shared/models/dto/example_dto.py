@@ -1,7 +1,7 @@
 from firebase_admin.firestore import firestore as fs
 from marshmallow import Schema, fields, post_load
 
-from shared.models.base_dto import BaseDTOFactory, BaseDTO
+from shared.models.base_dto import BaseDTOFactory, BaseDTO, get_schema
 
 
 class ExampleDTO(BaseDTO):
@@ -13,6 +13,8 @@ class ExampleDTO(BaseDTO):
     :type details: str
     """
 
+    __slots__ = ('example_id', 'details')
+
     @staticmethod
     def id_name() -> str:
         return 'example_id'
@@ -33,8 +35,11 @@ class ExampleDTOFactory(BaseDTOFactory):
     """
 
     @staticmethod
-    def create_from_doc(doc_snapshot: fs.DocumentSnapshot) -> ExampleDTO | None:
-        return BaseDTOFactory.doc_to_object(ExampleSchema(), doc_snapshot, ExampleDTO.id_name())
+    def create_from_doc(doc_snapshot: fs.DocumentSnapshot, trusted: bool = False) -> ExampleDTO | None:
+        if trusted:
+            return BaseDTOFactory.trusted_doc_to_object(ExampleDTO, ExampleSchema, doc_snapshot, ExampleDTO.id_name())
+
+        return BaseDTOFactory.doc_to_object(get_schema(ExampleSchema), doc_snapshot, ExampleDTO.id_name())
 
 
 class ExampleSchema(Schema):
@@ -2,7 +2,7 @@ from firebase_admin.firestore import firestore as fs
 from marshmallow import Schema, fields, post_load
 
 from shared.globals.constants import FIELD_ORG_ID
-from shared.models.base_dto import BaseDTOFactory, BaseDTO
+from shared.models.base_dto import BaseDTOFactory, BaseDTO, get_schema
 
 
 class OrgDTO(BaseDTO):
@@ -12,8 +12,14 @@ class OrgDTO(BaseDTO):
     :type org_id: str
     :param org_name: The name of the organization.
     :type org_name: str
+    :param llm_max_concurrency: The maximum number of LLM calls of the organization running at once.
+    :type llm_max_concurrency: int
+    :param llm_weight: The share of LLM calls admitted for the organization when organizations compete.
+    :type llm_weight: float
     """
 
+    __slots__ = ('org_id', 'org_name', 'llm_max_concurrency', 'llm_weight')
+
     @staticmethod
     def id_name() -> str:
         return FIELD_ORG_ID
@@ -23,9 +29,13 @@ class OrgDTO(BaseDTO):
 
     def __init__(self,
                  org_id: str = None,
-                 org_name: str = None):
+                 org_name: str = None,
+                 llm_max_concurrency: int = None,
+                 llm_weight: float = None):
         self.org_id = org_id
         self.org_name = org_name
+        self.llm_max_concurrency = llm_max_concurrency
+        self.llm_weight = llm_weight
 
 
 class OrgDTOFactory(BaseDTOFactory):
@@ -34,8 +44,11 @@ class OrgDTOFactory(BaseDTOFactory):
     """
 
     @staticmethod
-    def create_from_doc(doc_snapshot: fs.DocumentSnapshot) -> OrgDTO | None:
-        return BaseDTOFactory.doc_to_object(OrgSchema(), doc_snapshot, OrgDTO.id_name())
+    def create_from_doc(doc_snapshot: fs.DocumentSnapshot, trusted: bool = False) -> OrgDTO | None:
+        if trusted:
+            return BaseDTOFactory.trusted_doc_to_object(OrgDTO, OrgSchema, doc_snapshot, OrgDTO.id_name())
+
+        return BaseDTOFactory.doc_to_object(get_schema(OrgSchema), doc_snapshot, OrgDTO.id_name())
 
 
 class OrgSchema(Schema):
@@ -44,6 +57,9 @@ class OrgSchema(Schema):
     org_id = fields.Str()
     org_name = fields.Str()
 
+    llm_max_concurrency = fields.Integer()
+    llm_weight = fields.Float()
+
     @post_load
     def make_org(self, data, **_kwargs):
         return OrgDTO(**data)
@@ -1,7 +1,7 @@
 from firebase_admin.firestore import firestore as fs
 from marshmallow import Schema, fields, post_load
 
-from shared.models.base_dto import BaseDTOFactory, BaseDTO
+from shared.models.base_dto import BaseDTOFactory, BaseDTO, get_schema
 
 
 class ToolDTO(BaseDTO):
@@ -13,6 +13,8 @@ class ToolDTO(BaseDTO):
     :type api_operation: str
     """
 
+    __slots__ = ('tool_id', 'api_operation')
+
     @staticmethod
     def id_name() -> str:
         return 'tool_id'
@@ -33,8 +35,11 @@ class ToolDTOFactory(BaseDTOFactory):
     """
 
     @staticmethod
-    def create_from_doc(doc_snapshot: fs.DocumentSnapshot) -> ToolDTO | None:
-        return BaseDTOFactory.doc_to_object(ToolSchema(), doc_snapshot, ToolDTO.id_name())
+    def create_from_doc(doc_snapshot: fs.DocumentSnapshot, trusted: bool = False) -> ToolDTO | None:
+        if trusted:
+            return BaseDTOFactory.trusted_doc_to_object(ToolDTO, ToolSchema, doc_snapshot, ToolDTO.id_name())
+
+        return BaseDTOFactory.doc_to_object(get_schema(ToolSchema), doc_snapshot, ToolDTO.id_name())
 
 
 class ToolSchema(Schema):
@@ -11,7 +11,8 @@ class ChatbotControls:
     class Models:
         chatbot_post_request = _namespace.model('ChatbotPostRequest', {
             'context': fields.String(required=True, description='The context for the new chatbot. Can determine the self-identity of the chatbot.'),
-            'temperament': fields.String(description='Determines the level of variety in chatbot messages. Options are TAME, FUN, LOOSE, and WILD. The default value is FUN.')
+            'temperament': fields.String(description='Determines the level of variety in chatbot messages. Options are TAME, FUN, LOOSE, and WILD. The default value is FUN.'),
+            'cache_responses': fields.Boolean(description='Whether identical chat openings may be answered from a response cache instead of the model. Ignored for temperaments with a high variety. The default value is false.')
         })
 
         chatbot_id_response = _namespace.model('ChatbotIdResponse', {
@@ -20,5 +21,6 @@ class ChatbotControls:
 
         chatbot_response = _namespace.model('ChatbotResponse', {
             ChatbotDTO.id_name(): fields.String(readonly=True, description='The chatbot identifier'),
-            'temperament': fields.String(readonly=True, description='Determines the level of variety in chatbot messages.')
+            'temperament': fields.String(readonly=True, description='Determines the level of variety in chatbot messages.'),
+            'cache_responses': fields.Boolean(readonly=True, description='Whether identical chat openings may be answered from a response cache.')
         })
@@ -0,0 +1,7 @@
+from flask_restx import Namespace
+
+_namespace = Namespace('metrics', description='Service metrics for monitoring')
+
+
+class MetricsControls:
+    namespace = _namespace
@@ -8,9 +8,11 @@ class ScrapControls:
 
     class Models:
         scrap_response = _namespace.model('ScrapResponse', {
+            'chat_id': fields.String(readonly=True, description='The agent chat that remembers the query'),
             'query_response': fields.String(readonly=True, description='The response from scrapping the query'),
         })
 
         scrap_post_request = _namespace.model('ScrapPostRequest', {
-            'query': fields.String(required=True, description='The query to scrap with')
+            'query': fields.String(required=True, description='The query to scrap with'),
+            'chat_id': fields.String(description='The agent chat to continue, or a new one if not given')
         })
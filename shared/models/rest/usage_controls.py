@@ -0,0 +1,18 @@
+from flask_restx import Namespace, fields
+
+_namespace = Namespace('usage', description='LLM usage reporting')
+
+
+class UsageControls:
+    namespace = _namespace
+
+    class Models:
+        usage_response = _namespace.model('UsageResponse', {
+            'scope': fields.String(readonly=True, description='The scope of the subject: org, assistant, chatbot or chat'),
+            'subject_id': fields.String(readonly=True, description='The identifier of the org, assistant, chatbot or chat'),
+            'calls': fields.Integer(readonly=True, description='The number of LLM calls made for the subject'),
+            'prompt_tokens': fields.Integer(readonly=True, description='The number of prompt tokens sent to the LLM'),
+            'completion_tokens': fields.Integer(readonly=True, description='The number of completion tokens received from the LLM'),
+            'total_tokens': fields.Integer(readonly=True, description='The number of prompt and completion tokens'),
+            'llm_seconds': fields.Float(readonly=True, description='The total duration of the LLM calls in seconds')
+        })
@@ -0,0 +1,318 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import wraps
+from typing import Any, Callable, Iterator
+
+from shared.globals.constants import APP_NAME, TRACING_ENABLED, TRACE_EXPORTER, TRACE_ZIPKIN_URL, \
+    TRACE_EXPORT_QUEUE_SIZE, TRACE_EXPORT_BATCH_SIZE, TRACE_MAX_SPANS_PER_TRACE
+from shared.lifecycle import register_shutdown_hook
+
+logger = logging.getLogger(__name__)
+
+_current_span: ContextVar['Span | None'] = ContextVar('current_span', default=None)
+_span_listeners: list[Callable[['Span'], None]] = []
+
+
+class _Trace(object):
+    """The finished spans of a trace, and the time spent in each span category."""
+
+    __slots__ = ('trace_id', 'spans', 'category_seconds')
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: list[Span] = []
+        self.category_seconds: dict[str, float] = {}
+
+
+class Span(object):
+    """
+    A timed operation within a trace. Spans started while another span is current become its children.
+
+    :param name: The name of the operation, like 'firestore.get'.
+    :param category: Optional phase of the request the span belongs to, like 'firestore' or 'llm',
+                     summarized in the Server-Timing header.
+    :param parent: The parent span, or None to start a new trace.
+    :param attributes: Attributes of the operation, exported as tags.
+    """
+
+    __slots__ = ('name', 'category', 'parent', 'attributes', 'span_id', 'start_time', 'duration', '_start', '_trace')
+
+    def __init__(self, name: str, category: str | None, parent: 'Span | None', attributes: dict[str, Any]):
+        self.name = name
+        self.category = category
+        self.parent = parent
+        self.attributes = attributes
+        self.span_id = os.urandom(8).hex()
+        self.start_time = time.time()
+        self.duration: float | None = None
+        self._start = time.perf_counter()
+        self._trace = parent._trace if parent is not None else _Trace(os.urandom(16).hex())
+
+    @property
+    def trace_id(self) -> str:
+        return self._trace.trace_id
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def elapsed(self) -> float:
+        """
+        :return: The number of seconds since the span started, or its duration if it ended.
+        """
+        return self.duration if self.duration is not None else time.perf_counter() - self._start
+
+    def category_seconds(self) -> dict[str, float]:
+        """
+        Get the time spent in each span category of the trace so far. Nested spans of the same category
+        are only counted once, through their outermost span.
+
+        :return: The number of seconds by category.
+        """
+        return dict(self._trace.category_seconds)
+
+    def end(self) -> None:
+        """End the span, notify the span listeners, and export the trace if the span is its root."""
+        self.duration = time.perf_counter() - self._start
+
+        trace = self._trace
+        if self.category is not None and not self._has_ancestor_category():
+            trace.category_seconds[self.category] = trace.category_seconds.get(self.category, 0.0) + self.duration
+
+        if len(trace.spans) < TRACE_MAX_SPANS_PER_TRACE:
+            trace.spans.append(self)
+
+        for listener in _span_listeners:
+            try:
+                listener(self)
+            except Exception as ex:
+                logger.warning(f"Span listener failed for span '{self.name}': {ex}")
+
+        if self.parent is None and _exporter is not None:
+            _exporter.export(trace.spans)
+
+    def to_zipkin(self) -> dict[str, Any]:
+        """
+        :return: The span in the Zipkin v2 JSON format.
+        """
+        zipkin_span = {
+            'traceId': self.trace_id,
+            'id': self.span_id,
+            'name': self.name,
+            'timestamp': int(self.start_time * 1_000_000),
+            'duration': int((self.duration or 0.0) * 1_000_000),
+            'localEndpoint': {'serviceName': APP_NAME},
+            'tags': {key: str(value) for key, value in self.attributes.items() if value is not None}
+        }
+        if self.parent is not None:
+            zipkin_span['parentId'] = self.parent.span_id
+        if self.category is not None:
+            zipkin_span['tags']['category'] = self.category
+
+        return zipkin_span
+
+    def _has_ancestor_category(self) -> bool:
+        parent = self.parent
+        while parent is not None:
+            if parent.category == self.category:
+                return True
+            parent = parent.parent
+
+        return False
+
+
+class _NoopSpan(object):
+    """Stands in for a span when tracing is disabled."""
+
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+@contextmanager
+def span(name: str, category: str | None = None, **attributes: Any) -> Iterator[Span | _NoopSpan]:
+    """
+    Time the block as a span, child of the current span if any. Exceptions are recorded as an error attribute.
+
+    :param name: The name of the operation.
+    :param category: Optional phase of the request the span belongs to, summarized in the Server-Timing header.
+    :param attributes: Attributes of the operation.
+    :return: The span, to add attributes to.
+    """
+    if not TRACING_ENABLED:
+        yield _NOOP_SPAN
+        return
+
+    new_span = Span(name, category, _current_span.get(), attributes)
+    token = _current_span.set(new_span)
+    try:
+        yield new_span
+    except BaseException as ex:
+        new_span.set_attribute('error', type(ex).__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        new_span.end()
+
+
+def traced(name: str | None = None, category: str | None = None) -> Callable:
+    """
+    Decorator that times every call of the function as a span.
+
+    :param name: The name of the span. Defaults to the qualified name of the function.
+    :param category: Optional phase of the request the span belongs to.
+    :return: The decorator.
+    """
+
+    def outer_func(func_to_wrap):
+        span_name = name or func_to_wrap.__qualname__
+
+        @wraps(func_to_wrap)
+        def inner_func(*args, **kwargs):
+            with span(span_name, category):
+                return func_to_wrap(*args, **kwargs)
+
+        return inner_func
+
+    return outer_func
+
+
+def current_span() -> Span | None:
+    """
+    :return: The span of the current context, or None.
+    """
+    return _current_span.get()
+
+
+def start_span(name: str, category: str | None = None, **attributes: Any) -> tuple[Span | None, Any]:
+    """
+    Start a span that is ended separately with end_span, for spans that cannot wrap a block,
+    like one spanning the before and teardown hooks of a request.
+
+    :param name: The name of the operation.
+    :param category: Optional phase of the request the span belongs to.
+    :param attributes: Attributes of the operation.
+    :return: The span, or None if tracing is disabled, and the token to pass to end_span.
+    """
+    if not TRACING_ENABLED:
+        return None, None
+
+    new_span = Span(name, category, _current_span.get(), attributes)
+    return new_span, _current_span.set(new_span)
+
+
+def end_span(started_span: Span | None, token: Any) -> None:
+    """
+    End a span started with start_span and restore the previous current span.
+
+    :param started_span: The span returned by start_span.
+    :param token: The token returned by start_span.
+    """
+    if started_span is None:
+        return
+
+    _current_span.reset(token)
+    started_span.end()
+
+
+def submit_traced(executor: Executor, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+    """
+    Submit a function to an executor with a copy of the current context, so the spans it starts are children
+    of the current span instead of new traces. Pool threads do not inherit the context of the submitting thread.
+
+    :param executor: The executor to run the function on.
+    :param func: The function to run.
+    :param args: The positional arguments of the function.
+    :param kwargs: The keyword arguments of the function.
+    :return: The future of the function call.
+    """
+    return executor.submit(copy_context().run, func, *args, **kwargs)
+
+
+def add_span_listener(listener: Callable[[Span], None]) -> None:
+    """
+    Register a function called with every span when it ends, for example to record metrics.
+    Listeners run on the thread that ends the span, so they must be fast and thread-safe.
+
+    :param listener: The function to call.
+    """
+    _span_listeners.append(listener)
+
+
+class _LogExporter(object):
+    """Writes each finished trace to the log as a Zipkin v2 JSON array."""
+
+    def export(self, spans: list[Span]) -> None:
+        logger.info(json.dumps([finished_span.to_zipkin() for finished_span in spans]))
+
+
+class _ZipkinExporter(object):
+    """
+    Posts finished spans to a Zipkin compatible collector from a background thread, in batches.
+    Spans are dropped when the queue is full, so a slow collector never slows down requests.
+
+    :param url: The URL of the collector, like http://localhost:9411/api/v2/spans.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.dropped = 0
+        self._queue: queue.Queue[dict[str, Any] | None] = queue.Queue(maxsize=TRACE_EXPORT_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+        self._thread.start()
+        register_shutdown_hook('trace-exporter', self.stop)
+
+    def export(self, spans: list[Span]) -> None:
+        for finished_span in spans:
+            try:
+                self._queue.put_nowait(finished_span.to_zipkin())
+            except queue.Full:
+                self.dropped += 1
+
+    def stop(self) -> None:
+        """Post the queued spans and stop the background thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        import requests
+
+        stopped = False
+        while not stopped:
+            batch = [self._queue.get()]
+            while len(batch) < TRACE_EXPORT_BATCH_SIZE and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            stopped = None in batch
+            batch = [zipkin_span for zipkin_span in batch if zipkin_span is not None]
+            if not batch:
+                continue
+
+            try:
+                requests.post(self.url, json=batch, timeout=5)
+            except Exception as ex:
+                logger.warning(f'Failed to export {len(batch)} spans to {self.url}: {ex}')
+
+
+def _create_exporter() -> _LogExporter | _ZipkinExporter | None:
+    if not TRACING_ENABLED:
+        return None
+    if TRACE_EXPORTER == 'log':
+        return _LogExporter()
+    if TRACE_EXPORTER == 'zipkin':
+        return _ZipkinExporter(TRACE_ZIPKIN_URL)
+
+    return None
+
+
+_exporter = _create_exporter()